@@ -0,0 +1,200 @@
+"""Priority-aware admission control for API requests.
+
+Each worker admits at most ADMISSION_MAX_CONCURRENCY requests at once, which
+defaults to its DB pool capacity since every request may hold a connection.
+Routes fall into three classes:
+
+- critical: front-desk check-ins. They may use every slot, and the last
+  ADMISSION_RESERVED_CRITICAL slots are theirs alone.
+- normal: everything not listed below.
+- low: heavy admin reads and full-table exports. At most
+  ADMISSION_LOW_MAX_CONCURRENCY run at once, and they give up queueing sooner.
+
+A request without a free slot waits in its class's queue. Freed slots go to
+critical waiters first, then normal, then low. A request that finds its
+queue full, or waits longer than its timeout, gets 503 with Retry-After.
+Health and metrics endpoints are never queued.
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Deque, Dict
+from prometheus_client import Counter, Gauge, Histogram
+import structlog
+from database import connection_budget
+
+logger = structlog.get_logger()
+
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+PRIORITIES = (CRITICAL, NORMAL, LOW)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(
+    os.getenv("ADMISSION_MAX_CONCURRENCY") or connection_budget()["per_worker"] or 10
+)
+ADMISSION_RESERVED_CRITICAL = int(os.getenv("ADMISSION_RESERVED_CRITICAL", "2"))
+ADMISSION_LOW_MAX_CONCURRENCY = int(os.getenv("ADMISSION_LOW_MAX_CONCURRENCY", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_LOW_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_LOW_QUEUE_TIMEOUT", "1"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+CRITICAL_PATHS = {
+    "/checkin",
+    "/checkin/by-name",
+    "/checkin-by-barcode",
+    "/family/checkin",
+    "/kiosk/checkin",
+}
+LOW_PATHS = {
+    "/members",
+    "/admin/checkins/range",
+    "/admin/checkins/stats",
+    "/admin/analytics/heatmap",
+    "/admin/analytics/cohorts",
+    "/admin/dashboard",
+    "/directory/snapshot",
+}
+EXEMPT_PATHS = {"/livez", "/readyz", "/health", "/metrics"}
+
+ADMISSION_IN_FLIGHT = Gauge('admission_in_flight', 'Requests currently admitted', ['priority'])
+ADMISSION_QUEUE_DEPTH = Gauge('admission_queue_depth', 'Requests waiting for admission', ['priority'])
+ADMISSION_SHED = Counter('admission_shed_total', 'Requests rejected with 503', ['priority', 'reason'])
+ADMISSION_WAIT = Histogram(
+    'admission_wait_seconds',
+    'Time requests waited for admission',
+    ['priority'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+def classify(path: str) -> str:
+    if path in CRITICAL_PATHS:
+        return CRITICAL
+    if path in LOW_PATHS:
+        return LOW
+    return NORMAL
+
+class Shed(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionController:
+    """Slot accounting for one worker's event loop (not thread-safe by design)"""
+
+    def __init__(
+        self,
+        capacity: int = ADMISSION_MAX_CONCURRENCY,
+        reserved_critical: int = ADMISSION_RESERVED_CRITICAL,
+        low_limit: int = ADMISSION_LOW_MAX_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+    ):
+        self.capacity = capacity
+        self.reserved_critical = min(reserved_critical, capacity - 1)
+        self.low_limit = low_limit
+        self.max_queue = max_queue
+        self.in_flight: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+
+    def _has_room(self, priority: str) -> bool:
+        total = sum(self.in_flight.values())
+        if priority == CRITICAL:
+            return total < self.capacity
+        if total >= self.capacity - self.reserved_critical:
+            return False
+        return priority != LOW or self.in_flight[LOW] < self.low_limit
+
+    def _admit(self, priority: str):
+        self.in_flight[priority] += 1
+        ADMISSION_IN_FLIGHT.labels(priority=priority).inc()
+
+    def _queued_ahead(self, priority: str) -> bool:
+        for p in PRIORITIES:
+            if self.waiters[p]:
+                return True
+            if p == priority:
+                return False
+        return False
+
+    async def acquire(self, priority: str, timeout: float):
+        """Take a slot, queueing up to `timeout` seconds; raises Shed instead"""
+        if not self._queued_ahead(priority) and self._has_room(priority):
+            self._admit(priority)
+            return
+        queue = self.waiters[priority]
+        if len(queue) >= self.max_queue:
+            raise Shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        ADMISSION_QUEUE_DEPTH.labels(priority=priority).inc()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise Shed("timeout")
+        except asyncio.CancelledError:
+            # Client went away; hand back a slot granted just before the cancel
+            if waiter.done() and not waiter.cancelled():
+                self.release(priority)
+            raise
+        finally:
+            if waiter in queue:
+                queue.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(priority=priority).dec()
+
+    def release(self, priority: str):
+        self.in_flight[priority] -= 1
+        ADMISSION_IN_FLIGHT.labels(priority=priority).dec()
+        self._wake()
+
+    def _wake(self):
+        # Highest priority first; a class that can't be admitted doesn't block lower ones
+        for priority in PRIORITIES:
+            queue = self.waiters[priority]
+            while queue and self._has_room(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._admit(priority)
+                waiter.set_result(None)
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; the slot is held until the response body is fully sent"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        priority = classify(scope["path"])
+        timeout = ADMISSION_LOW_QUEUE_TIMEOUT if priority == LOW else ADMISSION_QUEUE_TIMEOUT
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await self.controller.acquire(priority, timeout)
+        except Shed as e:
+            ADMISSION_SHED.labels(priority=priority, reason=e.reason).inc()
+            logger.warning("Request shed", path=scope["path"], priority=priority, reason=e.reason)
+            await _send_busy(send)
+            return
+        ADMISSION_WAIT.labels(priority=priority).observe(loop.time() - start)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority)
+
+async def _send_busy(send):
+    body = b'{"detail":"Server is busy, please retry shortly"}'
+    await send({"type": "http.response.start", "status": 503, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(ADMISSION_RETRY_AFTER).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
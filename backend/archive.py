@@ -0,0 +1,219 @@
+"""Cold storage for old check-ins.
+
+Check-ins older than ARCHIVE_AFTER_MONTHS are moved out of Postgres into
+zstd-compressed Parquet files laid out as
+
+    {ARCHIVE_DIR}/checkins/location_id=<uuid>/<YYYY-MM>.parquet
+
+Rows are sorted by member_id then timestamp inside each file so member
+history reads can skip row groups. The archive boundary is stored in
+checkin_archive_state and advanced in the same transaction that deletes
+the archived rows, so readers only take archived rows below the committed
+boundary and never count a check-in twice.
+"""
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytz
+from sqlalchemy import text
+from portable import UTCDateTime
+import structlog
+
+logger = structlog.get_logger()
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "18"))
+
+# Advisory lock key so only one archive job runs at a time
+ARCHIVE_LOCK_ID = 7420_0002
+
+SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("member_id", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+])
+
+# Directory partitioning adds location_id when reading
+DATASET_SCHEMA = SCHEMA.append(pa.field("location_id", pa.string()))
+
+def checkins_dir() -> str:
+    return os.path.join(ARCHIVE_DIR, "checkins")
+
+def archive_cutoff(now: Optional[datetime] = None) -> datetime:
+    """First day (UTC) of the month ARCHIVE_AFTER_MONTHS before `now`"""
+    now = now or datetime.now(pytz.UTC)
+    months = now.year * 12 + (now.month - 1) - ARCHIVE_AFTER_MONTHS
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=pytz.UTC)
+
+def get_boundary(conn) -> Optional[datetime]:
+    """Committed archive boundary: every check-in before it lives in Parquet"""
+    return conn.execute(
+        text("SELECT boundary FROM checkin_archive_state WHERE id = 1").columns(boundary=UTCDateTime)
+    ).scalar()
+
+def _dataset() -> Optional[ds.Dataset]:
+    if not os.path.isdir(checkins_dir()):
+        return None
+    return ds.dataset(checkins_dir(), format="parquet", schema=DATASET_SCHEMA, partitioning=ds.partitioning(
+        pa.schema([("location_id", pa.string())]), flavor="hive"
+    ))
+
+def _write_month(location_id: str, month: str, table: pa.Table) -> int:
+    directory = os.path.join(checkins_dir(), f"location_id={location_id}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{month}.parquet")
+
+    if os.path.exists(path):
+        # A previous run may have written this month but failed before its
+        # delete committed; skip rows that are already archived.
+        existing = pq.read_table(path, schema=SCHEMA)
+        new_rows = pc.invert(pc.is_in(table["id"], value_set=existing["id"]))
+        table = pa.concat_tables([existing, table.filter(new_rows)])
+
+    table = table.sort_by([("member_id", "ascending"), ("timestamp", "ascending")])
+    # Dot-prefixed so dataset discovery ignores it until the rename
+    tmp_path = os.path.join(directory, f".{month}.parquet.tmp")
+    pq.write_table(table, tmp_path, compression="zstd", row_group_size=64 * 1024)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+    return table.num_rows
+
+def run_archive(engine, cutoff: Optional[datetime] = None) -> dict:
+    """Move check-ins older than `cutoff` into Parquet and delete them from Postgres"""
+    cutoff = cutoff or archive_cutoff()
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ARCHIVE_LOCK_ID})
+        boundary = get_boundary(conn)
+        if boundary is not None and cutoff <= boundary:
+            return {"archived": 0, "boundary": boundary}
+
+        # One month at a time keeps memory bounded
+        months = conn.execute(text("""
+            SELECT DISTINCT location_id, to_char(timestamp AT TIME ZONE 'UTC', 'YYYY-MM') AS month
+            FROM checkins
+            WHERE timestamp < :cutoff
+            ORDER BY month
+        """), {"cutoff": cutoff}).fetchall()
+
+        archived = 0
+        for location_id, month in months:
+            month_start = datetime.strptime(month, "%Y-%m").replace(tzinfo=pytz.UTC)
+            rows = conn.execute(text("""
+                SELECT id, member_id, timestamp
+                FROM checkins
+                WHERE location_id = :location_id
+                  AND timestamp >= :month_start
+                  AND timestamp < LEAST(:cutoff, :month_start + interval '1 month')
+            """), {"location_id": location_id, "month_start": month_start, "cutoff": cutoff}).fetchall()
+            table = pa.table({
+                "id": [str(r.id) for r in rows],
+                "member_id": [str(r.member_id) for r in rows],
+                "timestamp": [r.timestamp for r in rows],
+            }, schema=SCHEMA)
+            _write_month(str(location_id), month, table)
+            archived += len(rows)
+
+        # Rollup triggers skip these deletes so analytics keep archived counts
+        conn.execute(text("SET LOCAL checkins.archiving = 'on'"))
+        conn.execute(text("DELETE FROM checkins WHERE timestamp < :cutoff"), {"cutoff": cutoff})
+        conn.execute(text("""
+            INSERT INTO checkin_archive_state (id, boundary) VALUES (1, :cutoff)
+            ON CONFLICT (id) DO UPDATE SET boundary = EXCLUDED.boundary
+        """), {"cutoff": cutoff})
+
+    logger.info("Check-ins archived", archived=archived, boundary=cutoff.isoformat())
+    return {"archived": archived, "boundary": cutoff}
+
+def count_by_bucket(
+    boundary: Optional[datetime],
+    location_id: uuid.UUID,
+    timezone: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    group_by: str
+) -> Dict[datetime, int]:
+    """Archived check-in counts keyed by local bucket start, like date_trunc(timezone(...))"""
+    dataset = _dataset()
+    if dataset is None or boundary is None or start_utc >= boundary:
+        return {}
+    table = dataset.to_table(columns=["timestamp"], filter=(
+        (ds.field("location_id") == str(location_id))
+        & (ds.field("timestamp") >= start_utc)
+        & (ds.field("timestamp") <= end_utc)
+        & (ds.field("timestamp") < boundary)
+    ))
+    return _local_bucket_counts(table, timezone, group_by)
+
+def hourly_counts(boundary: Optional[datetime], location_id: uuid.UUID, timezone: str) -> Dict[datetime, int]:
+    """Every archived check-in counted by local hour, keyed like checkin_hourly_rollup.local_hour"""
+    dataset = _dataset()
+    if dataset is None or boundary is None:
+        return {}
+    table = dataset.to_table(columns=["timestamp"], filter=(
+        (ds.field("location_id") == str(location_id)) & (ds.field("timestamp") < boundary)
+    ))
+    return _local_bucket_counts(table, timezone, "hour")
+
+def _local_bucket_counts(table: pa.Table, timezone: str, unit: str) -> Dict[datetime, int]:
+    if table.num_rows == 0:
+        return {}
+    # Same instants viewed in the location's timezone, then as naive wall-clock times
+    local = pc.local_timestamp(table["timestamp"].cast(pa.timestamp("us", tz=timezone)))
+    # floor_temporal units match date_trunc's; weeks start on Monday in both
+    buckets = pc.floor_temporal(local, unit=unit, week_starts_monday=True)
+    counts = pc.value_counts(buckets)
+    return {
+        item["values"].as_py(): item["counts"].as_py()
+        for item in counts
+    }
+
+def count_rows(boundary: Optional[datetime], location_id: uuid.UUID) -> int:
+    dataset = _dataset()
+    if dataset is None or boundary is None:
+        return 0
+    return dataset.count_rows(filter=(
+        (ds.field("location_id") == str(location_id)) & (ds.field("timestamp") < boundary)
+    ))
+
+def member_timestamps(boundary: Optional[datetime], member_id: uuid.UUID) -> List[datetime]:
+    """All archived check-in times for a member, oldest first"""
+    dataset = _dataset()
+    if dataset is None or boundary is None:
+        return []
+    table = dataset.to_table(columns=["timestamp"], filter=(
+        (ds.field("member_id") == str(member_id)) & (ds.field("timestamp") < boundary)
+    ))
+    return sorted(table["timestamp"].to_pylist())
+
+def member_days(
+    boundary: Optional[datetime],
+    location_id: uuid.UUID,
+    timezone: str,
+    member_ids: List[str]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Archived check-ins as (index into member_ids, local day number) arrays.
+
+    Day numbers count days since 1970-01-01 in the location's timezone.
+    Check-ins of members not in `member_ids` are dropped.
+    """
+    dataset = _dataset()
+    if dataset is None or boundary is None:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    table = dataset.to_table(columns=["member_id", "timestamp"], filter=(
+        (ds.field("location_id") == str(location_id)) & (ds.field("timestamp") < boundary)
+    ))
+    local = pc.local_timestamp(table["timestamp"].cast(pa.timestamp("us", tz=timezone)))
+    days = pc.cast(pc.cast(local, pa.date32()), pa.int32())
+    members = pc.index_in(table["member_id"], value_set=pa.array(member_ids, type=pa.string()))
+    known = pc.is_valid(members)
+    return (
+        members.filter(known).to_numpy().astype(np.int64),
+        days.filter(known).to_numpy().astype(np.int64),
+    )
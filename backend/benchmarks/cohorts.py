@@ -0,0 +1,124 @@
+"""Cohort retention report cost at gym-chain scale.
+
+    cd backend && python benchmarks/cohorts.py --members 100000 --checkins 10000000
+
+Generates members who joined over the last three years and check-ins spread
+between each member's join day and today, with a long tail of members who
+stop coming. It times cohorts.compute on those arrays (the part that scales
+with check-ins) and, against the per-member alternative, a plain Python loop
+over a sample of members extrapolated to all of them.
+
+--db-checkins also loads that many rows into in-memory SQLite (DATABASE_URL
+defaults to sqlite://) and times the full report, queries included. SQLite converts each
+timestamp to local time in a Python function, which dominates that number;
+Postgres does it natively.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pytz
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import cohorts
+import database
+import models
+
+def synthetic(members: int, checkins: int, today: int, rng: np.random.Generator):
+    join_days = today - rng.integers(0, 3 * 365, members)
+    # Each member trains until a random last day; a third drop out within weeks
+    tenure = today - join_days
+    last_days = join_days + (tenure * rng.power(0.6, members)).astype(np.int64)
+    checkin_members = rng.integers(0, members, checkins)
+    span = last_days[checkin_members] - join_days[checkin_members] + 1
+    checkin_days = join_days[checkin_members] + (rng.random(checkins) * span).astype(np.int64)
+    return join_days, checkin_members, checkin_days
+
+def python_loop(join_days, checkin_members, checkin_days, today: int, sample: int) -> float:
+    """Seconds for per-member month sets, as a member-at-a-time report would build them"""
+    order = np.argsort(checkin_members, kind="stable")
+    bounds = np.searchsorted(checkin_members[order], np.arange(sample + 1))
+    start = time.perf_counter()
+    for member in range(sample):
+        joined = cohorts.EPOCH_DAY + timedelta(days=int(join_days[member]))
+        days = {
+            cohorts.EPOCH_DAY + timedelta(days=int(d))
+            for d in checkin_days[order[bounds[member]:bounds[member + 1]]]
+        }
+        months = {(d.year - joined.year) * 12 + d.month - joined.month for d in days}
+        _ = len(days) / max((today - join_days[member] + 1) / 7, 1), months
+    return time.perf_counter() - start
+
+def load_database(members: int, checkins: int, rng: np.random.Generator) -> models.Location:
+    database.create_sqlite_schema()
+    with Session(database.engine) as db:
+        location = db.query(models.Location).first()
+        household = models.Household(email="bench@example.com")
+        db.add(household)
+        db.commit()
+        location_id, household_id = location.id, household.id
+    now = datetime.now(pytz.UTC)
+    member_ids = [uuid.uuid4() for _ in range(members)]
+    joined = rng.integers(0, 3 * 365 * 24, members)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Member), [{
+            "id": member_ids[i],
+            "household_id": household_id,
+            "location_id": location_id,
+            "name": f"Member {i}",
+            "created_at": now - timedelta(hours=int(joined[i])),
+        } for i in range(members)])
+        owners = rng.integers(0, members, checkins)
+        ages = (joined[owners] * rng.random(checkins)).astype(np.int64)
+        conn.execute(insert(models.Checkin), [{
+            "id": uuid.uuid4(),
+            "member_id": member_ids[owners[i]],
+            "location_id": location_id,
+            "timestamp": now - timedelta(hours=int(ages[i])),
+        } for i in range(checkins)])
+    with Session(database.engine) as db:
+        return db.get(models.Location, location_id)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--checkins", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--loop-sample", type=int, default=5_000)
+    parser.add_argument("--db-checkins", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    today = cohorts.day_number(date.today())
+    arrays = synthetic(args.members, args.checkins, today, rng)
+    print(f"{args.members:,} members, {args.checkins:,} check-ins, {args.months} cohorts")
+
+    runs = []
+    for _ in range(3):
+        start = time.perf_counter()
+        report = cohorts.compute(*arrays, today, args.months)
+        runs.append(time.perf_counter() - start)
+    print(f"numpy compute      {min(runs) * 1000:>10.0f} ms")
+    sample = min(args.loop_sample, args.members)
+    loop = python_loop(*arrays, today, sample) * args.members / sample
+    print(f"python loop (est.) {loop * 1000:>10.0f} ms  ({sample:,} members timed)")
+    oldest = report[0]
+    print(f"cohort {oldest['cohort']}: {oldest['members']} members, retention {oldest['milestones']}")
+
+    if args.db_checkins:
+        location = load_database(args.members, args.db_checkins, rng)
+        with Session(database.engine) as db:
+            start = time.perf_counter()
+            cohorts.cohort_report(db, location, date.today(), args.months)
+            print(f"full report, {args.db_checkins:,} SQLite check-ins "
+                  f"{(time.perf_counter() - start) * 1000:>8.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Build time and size of the kiosk member-directory snapshot.
+
+    cd backend && python benchmarks/directory_snapshot.py --sizes 10000,100000
+
+Loads synthetic members into in-memory SQLite (DATABASE_URL=sqlite://), then
+times a cold snapshot (query + NDJSON encode + gzip), its encode share
+alone, and a warm hit from the per-worker cache. Sizes are reported raw
+and gzipped, next to the plain JSON array the member list endpoint would send.
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytz
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+import database
+import directory
+import fastjson
+import models
+
+def load_members(count: int):
+    location_id = uuid.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+    households = [{"id": uuid.uuid4(), "email": f"family{i}@example.com"} for i in range(max(count // 3, 1))]
+    members = [{
+        "id": uuid.uuid4(),
+        "household_id": households[i % len(households)]["id"],
+        "location_id": location_id,
+        "name": f"Member {i} Example",
+        "barcode": str(100000000000 + i),
+        "created_at": start + timedelta(minutes=i),
+    } for i in range(count)]
+    with database.engine.begin() as conn:
+        conn.execute(delete(models.Member))
+        conn.execute(delete(models.Household))
+        conn.execute(insert(models.Household), households)
+        conn.execute(insert(models.Member), members)
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    args = parser.parse_args()
+
+    database.create_sqlite_schema()
+    print(f"{'members':>8} {'cold ms':>9} {'encode ms':>10} {'warm ms':>8} {'ndjson':>12} {'gzip':>12} {'json list':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        load_members(size)
+        member_directory = directory.MemberDirectory(database.engine)
+        with Session(database.engine) as db:
+            version = directory.current_version(db)
+            body, cold = timed(lambda: member_directory.snapshot(db, version))
+            _, warm = timed(lambda: member_directory.snapshot(db, version))
+            rows = db.execute(select(*directory.entry_columns())).all()
+            list_rows = db.execute(fastjson.member_select()).all()
+        _, encode = timed(lambda: directory.encode_snapshot(version, rows))
+        json_list = b"".join(fastjson.encode_array(fastjson.member_dict(row) for row in list_rows))
+        print(f"{size:>8} {cold:>9.1f} {encode:>10.1f} {warm:>8.3f} "
+              f"{len(gzip.decompress(body)):>12,} {len(body):>12,} {len(json_list):>12,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Check-in insert throughput and hot lookup latency for the current indexes.
+
+    cd backend && python benchmarks/indexes.py            # before
+    python manage.py migrate
+    python benchmarks/indexes.py                          # after
+
+Inserts run inside a transaction that is rolled back, so the database is
+left unchanged. Lookups sample existing active members.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from sqlalchemy import text
+from database import engine
+
+LOOKUPS = {
+    "barcode": text("SELECT id FROM members WHERE barcode = :barcode AND deleted_at IS NULL"),
+    "family": text("SELECT id, name FROM members WHERE household_id = :household_id AND deleted_at IS NULL"),
+    "family+name": text("SELECT id FROM members WHERE household_id = :household_id AND name = :name AND deleted_at IS NULL"),
+    "name": text("SELECT id FROM members WHERE lower(trim(name)) = lower(:name) AND deleted_at IS NULL"),
+    "range count": text("SELECT count(*) FROM checkins WHERE timestamp >= :start AND timestamp < :end"),
+}
+
+def bench_inserts(conn, member_ids, rows: int, batch: int) -> float:
+    now = datetime.now(pytz.UTC)
+    trans = conn.begin()
+    try:
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            conn.execute(
+                text("INSERT INTO checkins (id, member_id, timestamp) VALUES (:id, :member_id, :timestamp)"),
+                [{"id": uuid.uuid4(), "member_id": random.choice(member_ids),
+                  "timestamp": now + timedelta(seconds=offset + i)} for i in range(min(batch, rows - offset))]
+            )
+        return rows / (time.perf_counter() - start)
+    finally:
+        trans.rollback()
+
+def bench_lookup(conn, stmt, params_list) -> list:
+    samples = []
+    for params in params_list:
+        start = time.perf_counter()
+        conn.execute(stmt, params).fetchall()
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        members = conn.execute(text(
+            "SELECT id, household_id, name, barcode FROM members WHERE deleted_at IS NULL LIMIT 5000"
+        )).fetchall()
+        if not members:
+            sys.exit("No active members to benchmark against")
+        conn.commit()
+
+        print(f"insert: {bench_inserts(conn, [m.id for m in members], args.rows, args.batch):.0f} checkins/s")
+
+        now = datetime.now(pytz.UTC)
+        picks = [random.choice(members) for _ in range(args.lookups)]
+        params = {
+            "barcode": [{"barcode": m.barcode} for m in picks],
+            "family": [{"household_id": m.household_id} for m in picks],
+            "family+name": [{"household_id": m.household_id, "name": m.name} for m in picks],
+            "name": [{"name": m.name} for m in picks],
+            "range count": [{"start": now - timedelta(days=random.randint(1, 365)), "end": now}
+                            for _ in range(max(args.lookups // 10, 1))],
+        }
+        for label, stmt in LOOKUPS.items():
+            samples = bench_lookup(conn, stmt, params[label])
+            print(f"{label:12s} p50={statistics.median(samples) * 1000:.3f}ms "
+                  f"p95={samples[int(len(samples) * 0.95) - 1] * 1000:.3f}ms")
+        conn.rollback()
+
+if __name__ == "__main__":
+    main()
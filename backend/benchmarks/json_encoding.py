@@ -0,0 +1,84 @@
+"""CPU time and payload size of the member list encoders.
+
+    cd backend && python benchmarks/json_encoding.py --sizes 10000,100000
+
+Compares the default path (ORM objects -> MemberOut.model_validate ->
+jsonable_encoder -> json.dumps, as FastAPI does) with the fast path
+(column rows -> orjson, chunked as streamed), then compresses the fast
+output with gzip and, if installed, brotli. Rows are synthetic, so no
+database is needed (DATABASE_URL only has to be set for the imports).
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+import fastjson
+import models
+
+def make_members(count: int):
+    location_id = uuid.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+    households = [models.Household(id=uuid.uuid4(), email=f"family{i}@example.com") for i in range(max(count // 3, 1))]
+    members = []
+    for i in range(count):
+        members.append(models.Member(
+            id=uuid.uuid4(),
+            household=households[i % len(households)],
+            household_id=households[i % len(households)].id,
+            location_id=location_id,
+            name=f"Member {i} Example",
+            barcode=str(100000000000 + i),
+            active=True,
+            created_at=start + timedelta(minutes=i),
+            deleted_at=None,
+        ))
+    return members
+
+def as_rows(members):
+    """Tuples in member_select() column order, as the fast path receives them"""
+    return [tuple(getattr(m, key) for key in fastjson.MEMBER_KEYS) for m in members]
+
+def cpu(fn):
+    start = time.process_time()
+    result = fn()
+    return result, time.process_time() - start
+
+def default_path(members) -> bytes:
+    content = jsonable_encoder([models.MemberOut.model_validate(m) for m in members])
+    return JSONResponse(content=content).body
+
+def fast_path(rows) -> bytes:
+    return b"".join(fastjson.encode_array(fastjson.member_dict(row) for row in rows))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'encoder':<22} {'cpu ms':>9} {'bytes':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        members = make_members(size)
+        rows = as_rows(members)
+
+        default_body, default_cpu = cpu(lambda: default_path(members))
+        fast_body, fast_cpu = cpu(lambda: fast_path(rows))
+        results = [("default (pydantic)", default_cpu, len(default_body)), ("fast (orjson)", fast_cpu, len(fast_body))]
+        for coding in ("gzip", "br"):
+            if coding == "br" and fastjson.brotli is None:
+                continue
+            body, seconds = cpu(lambda: fastjson.compress(coding, fast_body))
+            results.append((f"fast + {coding}", fast_cpu + seconds, len(body)))
+
+        for name, seconds, length in results:
+            print(f"{size:>8} {name:<22} {seconds * 1000:>9.1f} {length:>12,}")
+
+if __name__ == "__main__":
+    main()
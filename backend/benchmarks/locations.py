@@ -0,0 +1,117 @@
+"""Per-location query latency as locations are added.
+
+    cd backend && python benchmarks/locations.py --checkins-per-location 50000
+
+For each step (1, 2, 4, 8 locations) synthetic locations, members and
+check-ins are inserted, then the location-scoped admin queries are timed
+for the first location. Everything runs in one transaction that is rolled
+back, so the database is left unchanged. Latency should stay flat as
+locations are added because every index used leads with location_id.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from sqlalchemy import text
+from database import engine
+
+QUERIES = {
+    "today": text("""
+        SELECT c.id FROM checkins c JOIN members m ON m.id = c.member_id
+        WHERE c.location_id = :location_id AND c.timestamp >= :day_start
+        ORDER BY c.timestamp DESC
+    """),
+    "range by day": text("""
+        SELECT date_trunc('day', timezone(:tz, timestamp)) AS d, count(*)
+        FROM checkins
+        WHERE location_id = :location_id AND timestamp >= :start AND timestamp <= :end
+        GROUP BY d
+    """),
+    "heatmap": text("""
+        SELECT extract(isodow FROM local_hour), extract(hour FROM local_hour), sum(count)
+        FROM checkin_hourly_rollup
+        WHERE location_id = :location_id AND local_hour >= :local_start
+        GROUP BY 1, 2
+    """),
+    "members": text("""
+        SELECT id FROM members WHERE location_id = :location_id ORDER BY created_at DESC LIMIT 500
+    """),
+}
+
+def add_location(conn, index: int, checkins: int, members: int) -> uuid.UUID:
+    location_id = uuid.uuid4()
+    conn.execute(text(
+        "INSERT INTO locations (id, slug, name, timezone) VALUES (:id, :slug, :name, 'America/Toronto')"
+    ), {"id": location_id, "slug": f"bench-{location_id.hex[:8]}", "name": f"Bench {index}"})
+    household_id = uuid.uuid4()
+    conn.execute(text("INSERT INTO households (id, email) VALUES (:id, :email)"),
+                 {"id": household_id, "email": f"bench-{household_id.hex}@example.com"})
+    conn.execute(text("""
+        INSERT INTO members (id, household_id, location_id, name, active, created_at)
+        SELECT gen_random_uuid(), :household_id, :location_id, 'Bench ' || g, true, now() - g * interval '1 hour'
+        FROM generate_series(1, :members) g
+    """), {"household_id": household_id, "location_id": location_id, "members": members})
+    conn.execute(text("""
+        INSERT INTO checkins (id, member_id, location_id, timestamp)
+        SELECT gen_random_uuid(), m.id, :location_id, now() - (g * interval '7 minutes')
+        FROM generate_series(1, :checkins) g
+        CROSS JOIN LATERAL (
+            SELECT id FROM members WHERE location_id = :location_id OFFSET (g % :members) LIMIT 1
+        ) m
+    """), {"location_id": location_id, "checkins": checkins, "members": members})
+    return location_id
+
+def time_queries(conn, location_id, repeats: int) -> dict:
+    tz = pytz.timezone("America/Toronto")
+    now = datetime.now(tz)
+    params = {
+        "location_id": location_id,
+        "tz": "America/Toronto",
+        "day_start": now.replace(hour=0, minute=0, second=0, microsecond=0),
+        "start": now - timedelta(days=365),
+        "end": now,
+        "local_start": (now - timedelta(days=365)).replace(tzinfo=None),
+    }
+    results = {}
+    for label, stmt in QUERIES.items():
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            conn.execute(stmt, params).fetchall()
+            samples.append(time.perf_counter() - start)
+        results[label] = statistics.median(samples) * 1000
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkins-per-location", type=int, default=50000)
+    parser.add_argument("--members-per-location", type=int, default=500)
+    parser.add_argument("--steps", default="1,2,4,8")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            locations = []
+            for target in [int(x) for x in args.steps.split(",")]:
+                while len(locations) < target:
+                    locations.append(add_location(
+                        conn, len(locations), args.checkins_per_location, args.members_per_location
+                    ))
+                conn.execute(text("ANALYZE checkins"))
+                conn.execute(text("ANALYZE members"))
+                timings = time_queries(conn, locations[0], args.repeats)
+                print(f"{target} location(s): " + "  ".join(f"{k}={v:.2f}ms" for k, v in timings.items()))
+        finally:
+            trans.rollback()
+
+if __name__ == "__main__":
+    main()
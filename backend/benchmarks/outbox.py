@@ -0,0 +1,74 @@
+"""Check-in latency as outbox consumers are added, and worker drain throughput.
+
+    cd backend && python benchmarks/outbox.py --consumers 0,1,4,16 --checkins 500
+
+Runs the API in-process against in-memory SQLite (DATABASE_URL=sqlite://) and
+times POST /checkin with N slow consumers registered. The consumers only run
+in the worker, so request latency should not move with N; the drain rate is
+what pays for them. Each consumer sleeps --consumer-ms per batch to stand in
+for real side-effect work.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ALLOWED_HOSTS", "testserver")
+os.environ["OUTBOX_WORKER_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+import database
+import models
+import outbox
+
+def slow_consumer(seconds: float):
+    def handle(events):
+        time.sleep(seconds)
+    return handle
+
+def register_members(client: TestClient, count: int):
+    for i in range(count):
+        response = client.post("/member", json={"email": f"bench{i}@example.com", "name": f"Bench Member{i}"})
+        response.raise_for_status()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consumers", default="0,1,4,16")
+    parser.add_argument("--checkins", type=int, default=500)
+    parser.add_argument("--consumer-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    database.create_sqlite_schema()
+    import main as app_main
+    app_main.limiter.enabled = False
+    client = TestClient(app_main.app)
+    register_members(client, args.checkins)
+
+    print(f"{'consumers':>9} {'p50 ms':>8} {'p95 ms':>8} {'drain events/s':>15}")
+    for count in (int(c) for c in args.consumers.split(",")):
+        with database.engine.begin() as conn:
+            conn.execute(delete(models.Checkin))
+            conn.execute(delete(models.OutboxEvent))
+
+        latencies = []
+        for i in range(args.checkins):
+            start = time.perf_counter()
+            response = client.post("/checkin", json={"email": f"bench{i}@example.com"})
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+        consumers = {f"c{n}": slow_consumer(args.consumer_ms / 1000) for n in range(count)}
+        worker = outbox.OutboxWorker(database.engine, consumers)
+        start = time.perf_counter()
+        drained = worker.drain()
+        rate = drained / (time.perf_counter() - start)
+
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(f"{count:>9} {statistics.median(latencies):>8.2f} {p95:>8.2f} {rate:>15,.0f}")
+
+if __name__ == "__main__":
+    main()
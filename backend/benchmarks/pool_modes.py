@@ -0,0 +1,60 @@
+"""Compare request-path latency under each DB_POOL_MODE.
+
+    cd backend && python benchmarks/pool_modes.py --concurrency 16 --requests 2000
+
+Point DATABASE_URL at Postgres for the queue mode and pass --pgbouncer-url
+for the pgbouncer mode. Each simulated request checks out a connection,
+runs a member lookup and a check-in existence query, and returns it.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from database import DATABASE_URL, engine_options
+
+LOOKUP = text("SELECT id FROM members WHERE barcode = :barcode AND deleted_at IS NULL LIMIT 1")
+EXISTS = text("SELECT 1 FROM checkins WHERE member_id = :member_id AND timestamp >= now() - interval '12 hours' LIMIT 1")
+
+def simulated_request(engine) -> float:
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        member_id = conn.execute(LOOKUP, {"barcode": "000000000000"}).scalar()
+        if member_id is not None:
+            conn.execute(EXISTS, {"member_id": member_id})
+        else:
+            conn.execute(text("SELECT 1"))
+    return time.perf_counter() - start
+
+def run(mode: str, url: str, concurrency: int, requests: int):
+    engine = create_engine(url, **engine_options(mode))
+    simulated_request(engine)  # connect once before timing
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = sorted(pool.map(lambda _: simulated_request(engine), range(requests)))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{mode:10s} p50={statistics.median(samples) * 1000:.2f}ms "
+          f"p95={p95 * 1000:.2f}ms throughput={requests / elapsed:.0f} req/s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--pgbouncer-url", default=os.getenv("PGBOUNCER_URL"))
+    args = parser.parse_args()
+
+    run("queue", DATABASE_URL, args.concurrency, args.requests)
+    if args.pgbouncer_url:
+        run("pgbouncer", args.pgbouncer_url, args.concurrency, args.requests)
+    else:
+        print("pgbouncer  skipped (set --pgbouncer-url or PGBOUNCER_URL)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-request cost of the sampling profiler middleware.
+
+    cd backend && python benchmarks/profiler_overhead.py --requests 20000
+
+Drives a small ASGI app directly (no server, no database) through ASGI
+calls. It compares the bare app with the app behind ProfilerMiddleware,
+first disarmed and then armed in slow-request mode. In slow-request mode
+every request is sampled but none is kept. --work-us sets the CPU each
+request burns, standing in for a handler.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiling
+
+def make_app(work_seconds: float):
+    async def app(scope, receive, send):
+        end = time.perf_counter() + work_seconds
+        while time.perf_counter() < end:
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+    return app
+
+async def drive(app, count: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/members", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / count * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--work-us", type=float, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app(args.work_us / 1e6)
+    disarmed = profiling.SamplingProfiler()
+    armed = profiling.SamplingProfiler()
+    armed.arm(slow_ms=60_000)
+    variants = [
+        ("bare app", app),
+        ("middleware, disarmed", profiling.ProfilerMiddleware(app, disarmed)),
+        ("middleware, armed", profiling.ProfilerMiddleware(app, armed)),
+    ]
+
+    print(f"{'variant':<22} {'us/request':>11} {'overhead us':>12}")
+    baseline = None
+    for name, variant in variants:
+        runs = [asyncio.run(drive(variant, args.requests)) for _ in range(args.repeats)]
+        per_request = statistics.median(runs)
+        baseline = per_request if baseline is None else baseline
+        print(f"{name:<22} {per_request:>11.2f} {per_request - baseline:>12.2f}")
+
+if __name__ == "__main__":
+    main()
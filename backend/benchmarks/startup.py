@@ -0,0 +1,52 @@
+"""Measure API startup: process spawn to first 200 response.
+
+    cd backend && python benchmarks/startup.py --runs 5
+
+Requires DATABASE_URL pointing at a migrated database.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def time_to_first_ok(port: int, path: str, timeout: float) -> float:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"No 200 from {path} within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/metrics")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    samples = [time_to_first_ok(args.port, args.path, args.timeout) for _ in range(args.runs)]
+    print(f"startup to first 200 ({args.path}) over {args.runs} runs: "
+          f"median={statistics.median(samples) * 1000:.0f}ms "
+          f"min={min(samples) * 1000:.0f}ms max={max(samples) * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
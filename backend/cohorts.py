@@ -0,0 +1,171 @@
+"""Join-month cohort retention and training frequency.
+
+Members are grouped by the local month they joined. For each cohort we count
+the members who trained at least once in each calendar month since joining
+(offset 0 is the join month), and each member's training days per week since
+joining.
+
+Inputs are pulled in bulk: one row per member and one per member-day with a
+check-in, live and archived. Everything after that is NumPy array work, so a
+report costs two queries and a Parquet scan however many members there are.
+Results only change with the calendar, so the endpoint caches them per
+location and local day.
+"""
+from datetime import date
+from typing import List, Tuple
+import numpy as np
+from sqlalchemy import Integer, cast, extract, func, select
+from sqlalchemy.orm import Session
+import archive
+import models
+import portable
+
+MAX_COHORT_MONTHS = 36
+RETENTION_MILESTONES = (1, 3, 6)
+
+# Training days per week; a member falls in the first bin whose upper edge exceeds theirs
+FREQUENCY_EDGES = (0.25, 1, 2, 3)
+FREQUENCY_LABELS = ("<0.25", "0.25-1", "1-2", "2-3", "3+")
+
+# Rows per fetch when streaming check-in days out of the database
+FETCH_CHUNK = 100_000
+
+EPOCH_DAY = date(1970, 1, 1)
+
+def day_number(day: date) -> int:
+    return (day - EPOCH_DAY).days
+
+def month_number(days: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 for day numbers since 1970-01-01"""
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+def _local_day(column, timezone: str):
+    """Local calendar day of a UTC timestamp column, as days since 1970-01-01"""
+    return cast(extract("epoch", portable.local_trunc("day", column, timezone)) / 86400, Integer)
+
+def load(db: Session, location: models.Location) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(join day per member, member index per check-in day, check-in day) arrays"""
+    # Oldest members first, so members created mid-report only append indexes
+    member_order = (models.Member.created_at, models.Member.id)
+    in_location = models.Member.location_id == location.id
+    members = db.execute(
+        select(models.Member.id, _local_day(models.Member.created_at, location.timezone))
+        .where(in_location)
+        .order_by(*member_order)
+    ).all()
+    member_ids = [str(member_id) for member_id, _ in members]
+    join_days = np.fromiter((day for _, day in members), dtype=np.int64, count=len(members))
+
+    ranked = select(
+        models.Member.id.label("member_id"),
+        (func.row_number().over(order_by=member_order) - 1).label("idx")
+    ).where(in_location).subquery()
+    live = db.execute(
+        select(ranked.c.idx, _local_day(models.Checkin.timestamp, location.timezone))
+        .join(ranked, ranked.c.member_id == models.Checkin.member_id)
+        .where(models.Checkin.location_id == location.id)
+        .distinct()
+        .execution_options(yield_per=FETCH_CHUNK)
+    )
+    chunks = [np.array(chunk, dtype=np.int64).reshape(-1, 2) for chunk in live.partitions()]
+    live_days = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+
+    archived_members, archived_days = archive.member_days(
+        archive.get_boundary(db), location.id, location.timezone, member_ids
+    )
+    checkin_members = np.concatenate([live_days[:, 0], archived_members])
+    checkin_days = np.concatenate([live_days[:, 1], archived_days])
+    # A member created between the two queries has no join day
+    known = checkin_members < len(join_days)
+    return join_days, checkin_members[known], checkin_days[known]
+
+def compute(
+    join_days: np.ndarray,
+    checkin_members: np.ndarray,
+    checkin_days: np.ndarray,
+    today: int,
+    months: int
+) -> List[dict]:
+    """Retention and frequency for the `months` newest join cohorts, this month included.
+
+    `join_days` has one local day number per member; `checkin_members` and
+    `checkin_days` pair a member index with a local day they trained
+    (duplicates allowed).
+    """
+    current_month = int(month_number(np.array([today]))[0])
+    first_month = current_month - months + 1
+    member_cohort = month_number(join_days) - first_month
+    in_window = (member_cohort >= 0) & (member_cohort < months)
+    sizes = np.bincount(member_cohort[in_window], minlength=months)
+
+    # Training days on or after joining, for members in the window
+    keep = in_window[checkin_members]
+    members, days = checkin_members[keep], checkin_days[keep]
+    keep = (days >= join_days[members]) & (days <= today)
+    members, days = members[keep], days[keep]
+
+    # One entry per member-day, sorted by member then day
+    first_day = int(days.min()) if len(days) else 0
+    span = today - first_day + 1
+    member_days = np.unique(members * span + (days - first_day))
+    members = member_days // span
+    days = member_days % span + first_day
+
+    # Month offsets never decrease within a member, so distinct (member, offset)
+    # pairs are wherever the pair key changes
+    offsets = month_number(days) - month_number(join_days[members])
+    pair_keys = members * months + offsets
+    first_in_month = np.ones(len(pair_keys), dtype=bool)
+    first_in_month[1:] = pair_keys[1:] != pair_keys[:-1]
+    active = np.bincount(
+        member_cohort[members[first_in_month]] * months + offsets[first_in_month],
+        minlength=months * months
+    ).reshape(months, months)
+    # Cohort c has reached offset k once c + k is no later than this month
+    reached = (np.arange(months)[:, None] + np.arange(months)[None, :]) < months
+    with np.errstate(divide="ignore", invalid="ignore"):
+        retention = np.where(reached & (sizes[:, None] > 0), active / sizes[:, None], np.nan)
+
+    weeks = np.maximum((today - join_days + 1) / 7, 1)
+    frequency = np.bincount(members, minlength=len(join_days)) / weeks
+    cohort_of_member = member_cohort[in_window]
+    frequency = frequency[in_window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_frequency = np.bincount(cohort_of_member, weights=frequency, minlength=months) / sizes
+    distribution = np.bincount(
+        cohort_of_member * len(FREQUENCY_LABELS) + np.digitize(frequency, FREQUENCY_EDGES),
+        minlength=months * len(FREQUENCY_LABELS)
+    ).reshape(months, len(FREQUENCY_LABELS))
+
+    def rate(value: float):
+        return None if np.isnan(value) else round(float(value), 4)
+
+    cohorts = []
+    for c in range(months):
+        reached_offsets = int(reached[c].sum())
+        cohorts.append({
+            "cohort": str(np.datetime64(first_month + c, "M")),
+            "members": int(sizes[c]),
+            "active": active[c, :reached_offsets].tolist(),
+            "retention": [rate(r) for r in retention[c, :reached_offsets]],
+            "milestones": {
+                str(k): rate(retention[c, k]) if k < months else None
+                for k in RETENTION_MILESTONES
+            },
+            "weekly_frequency": {
+                "mean": None if sizes[c] == 0 else round(float(mean_frequency[c]), 2),
+                "distribution": dict(zip(FREQUENCY_LABELS, distribution[c].tolist())),
+            },
+        })
+    return cohorts
+
+def cohort_report(db: Session, location: models.Location, as_of: date, months: int) -> dict:
+    join_days, checkin_members, checkin_days = load(db, location)
+    return {
+        "location": location.slug,
+        "timezone": location.timezone,
+        "as_of": as_of.isoformat(),
+        "milestones": list(RETENTION_MILESTONES),
+        "frequency_bins": list(FREQUENCY_LABELS),
+        "cohorts": compute(join_days, checkin_members, checkin_days, day_number(as_of), months),
+    }
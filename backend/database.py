@@ -1,27 +1,135 @@
 import os
-from sqlalchemy import create_engine
+import time
+import uuid
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.pool import QueuePool, NullPool, StaticPool
 from dotenv import load_dotenv
+from instrumentation import POOL_CHECKOUT_WAIT
+import portable
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Production provides a Postgres URL. Tests and local tooling opt in to an
+# in-memory SQLite database with DATABASE_URL=sqlite:// - never by default,
+# so a missing variable can't start the API on a throwaway database.
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL environment variable is not set.")
+    raise RuntimeError("DATABASE_URL is not set (use sqlite:// for an in-memory database)")
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+# Pool settings are per process; multiply by WEB_CONCURRENCY for the total
+# number of Postgres connections a deployment can open.
+#   DB_POOL_MODE=queue      - in-process QueuePool (direct Postgres)
+#   DB_POOL_MODE=pgbouncer  - NullPool, for a PgBouncer in transaction pooling mode
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+if DB_POOL_MODE not in ("queue", "pgbouncer"):
+    raise RuntimeError(f"Unsupported DB_POOL_MODE: {DB_POOL_MODE}")
+
+def engine_options(mode: str = DB_POOL_MODE) -> dict:
+    """create_engine() keyword arguments for a pool mode"""
+    if IS_SQLITE:
+        options = {"connect_args": {"check_same_thread": False}}
+        if make_url(DATABASE_URL).database in (None, "", ":memory:"):
+            # One shared connection, so every session sees the same in-memory database
+            options["poolclass"] = StaticPool
+        return options
+    if mode == "pgbouncer":
+        options = {
+            # PgBouncer owns pooling; holding idle connections here would pin
+            # server connections and defeat transaction pooling.
+            "poolclass": NullPool,
+            # Fresh connection per checkout, so there is nothing stale to ping
+            "pool_pre_ping": False,
+        }
+        # psycopg 3 prepares statements server-side after a few executions, which
+        # breaks when consecutive transactions land on different server connections.
+        # psycopg2 never uses server-side prepared statements.
+        if make_url(DATABASE_URL).get_driver_name() == "psycopg":
+            options["connect_args"] = {"prepare_threshold": None}
+        return options
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,  # Number of connections to maintain
+        "max_overflow": DB_MAX_OVERFLOW,  # Additional connections that can be created
+        "pool_timeout": DB_POOL_TIMEOUT,  # Seconds to wait for a free connection
+        "pool_pre_ping": DB_POOL_PRE_PING,  # Validate connections before use
+        "pool_recycle": DB_POOL_RECYCLE,  # Recycle connections periodically
+    }
+
+def connection_budget(mode: str = DB_POOL_MODE, workers: int = WEB_CONCURRENCY) -> dict:
+    """Maximum Postgres (or PgBouncer client) connections across all workers"""
+    if mode == "pgbouncer":
+        # One connection per in-flight request; PgBouncer caps server connections
+        per_worker = None
+    else:
+        per_worker = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    return {
+        "mode": mode,
+        "workers": workers,
+        "per_worker": per_worker,
+        "total": per_worker * workers if per_worker is not None else None,
+    }
 
 # Database engine with connection pooling
 engine = create_engine(
     DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=20,  # Number of connections to maintain
-    max_overflow=30,  # Additional connections that can be created
-    pool_pre_ping=True,  # Validate connections before use
-    pool_recycle=3600,  # Recycle connections after 1 hour
-    echo=False  # Set to True for debugging
+    echo=False,  # Set to True for debugging
+    **engine_options()
 )
 
+if IS_SQLITE:
+    portable.install_sqlite(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base() 
\ No newline at end of file
+Base = declarative_base()
+
+def create_sqlite_schema(bind=engine):
+    """Build the schema on SQLite from the models; Postgres uses migrations.py"""
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    Base.metadata.create_all(bind)
+    with bind.begin() as conn:
+        for trigger in portable.SQLITE_TRIGGERS:
+            conn.exec_driver_sql(trigger)
+        # Same default location migration 6 creates
+        conn.execute(models.Location.__table__.insert().values(
+            id=uuid.uuid4(), slug="main", name="Main", timezone="America/Toronto"
+        ))
+
+# Connections to open at startup so the first requests don't pay for connect()
+POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", "2"))
+
+def prewarm_pool(count: int = POOL_PREWARM) -> int:
+    """Open `count` pooled connections, validate them and return them to the pool"""
+    if DB_POOL_MODE == "pgbouncer" or IS_SQLITE:
+        return 0
+    connections = []
+    try:
+        for _ in range(count):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
@@ -0,0 +1,123 @@
+"""Member directory snapshots and deltas for kiosk-side barcode validation.
+
+Kiosks download a snapshot of every scannable member (not deleted, has a
+barcode) and then poll for deltas, so a scan resolves to a name locally and
+only the check-in POST reaches the API.
+
+A version is the newest change a kiosk has seen, as microseconds since the
+epoch. Triggers move members.updated_at whenever a directory field changes
+(soft deletes included) and leave a member_tombstones row on hard delete.
+Timestamps are taken before commit, so a slow transaction can land a change
+older than a version already handed out; deltas therefore re-send the last
+DIRECTORY_DELTA_OVERLAP_SECONDS, and kiosks apply upserts and removals by
+member id, which makes repeats harmless.
+
+Snapshots are gzip NDJSON: a {"version", "count"} header line, then one
+{"id", "barcode", "name", "household_id"} line per member. Each worker
+keeps the latest snapshot, so repeat downloads skip the scan and the gzip.
+"""
+import gzip
+import os
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import List, Optional, Tuple
+import pytz
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+import fastjson
+import instrumentation
+import models
+
+DIRECTORY_DELTA_OVERLAP_SECONDS = int(os.getenv("DIRECTORY_DELTA_OVERLAP_SECONDS", "60"))
+# Deltas can't reach further back than this; older kiosks re-download the snapshot
+DIRECTORY_TOMBSTONE_RETENTION_DAYS = int(os.getenv("DIRECTORY_TOMBSTONE_RETENTION_DAYS", "30"))
+DIRECTORY_PRUNE_SECONDS = 3600
+
+MEDIA_TYPE = "application/x-ndjson"
+ENTRY_KEYS = ("id", "barcode", "name", "household_id")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+def to_version(timestamp: Optional[datetime]) -> int:
+    if timestamp is None:
+        return 0
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+def from_version(version: int) -> datetime:
+    return EPOCH + timedelta(microseconds=version)
+
+def oldest_delta_version() -> int:
+    return to_version(datetime.now(pytz.UTC) - timedelta(days=DIRECTORY_TOMBSTONE_RETENTION_DAYS))
+
+def current_version(db: Session) -> int:
+    """Newest member change or hard delete, in one round trip"""
+    latest_member = select(func.max(models.Member.updated_at)).scalar_subquery()
+    latest_tombstone = select(func.max(models.MemberTombstone.deleted_at)).scalar_subquery()
+    return max(to_version(ts) for ts in db.execute(select(latest_member, latest_tombstone)).one())
+
+def entry_columns():
+    return (models.Member.id, models.Member.barcode, models.Member.name, models.Member.household_id)
+
+def _listed():
+    return models.Member.deleted_at.is_(None) & models.Member.barcode.isnot(None)
+
+def encode_snapshot(version: int, rows: List[Tuple]) -> bytes:
+    """gzip NDJSON body for (id, barcode, name, household_id) rows"""
+    lines = [fastjson.dumps({"version": version, "count": len(rows)})]
+    lines.extend(fastjson.dumps(dict(zip(ENTRY_KEYS, row))) for row in rows)
+    lines.append(b"")
+    return gzip.compress(b"\n".join(lines), compresslevel=6, mtime=0)
+
+class MemberDirectory:
+    def __init__(self, engine):
+        self.engine = engine
+        self._snapshot: Tuple[int, Optional[bytes]] = (0, None)
+        self._lock = Lock()
+        self._last_prune = 0.0
+
+    def snapshot(self, db: Session, version: int) -> bytes:
+        """gzip snapshot at `version` (from current_version), built at most once per worker"""
+        with self._lock:
+            cached_version, body = self._snapshot
+        if body is not None and cached_version == version:
+            return body
+        rows = db.execute(select(*entry_columns()).where(_listed())).all()
+        body = encode_snapshot(version, rows)
+        with self._lock:
+            if version >= self._snapshot[0]:
+                self._snapshot = (version, body)
+        return body
+
+    def delta(self, db: Session, since: int) -> dict:
+        """Changes after `since` (with overlap); the returned version is the next `since`"""
+        self._prune_tombstones()
+        cutoff = from_version(since) - timedelta(seconds=DIRECTORY_DELTA_OVERLAP_SECONDS)
+        latest = since
+        upserts, removed = [], []
+        changed = db.execute(
+            select(*entry_columns(), _listed().label("listed"), models.Member.updated_at)
+            .where(models.Member.updated_at > cutoff)
+        )
+        for row in changed:
+            latest = max(latest, to_version(row.updated_at))
+            if row.listed:
+                upserts.append(dict(zip(ENTRY_KEYS, row)))
+            else:
+                removed.append(row.id)
+        tombstones = db.execute(
+            select(models.MemberTombstone.member_id, models.MemberTombstone.deleted_at)
+            .where(models.MemberTombstone.deleted_at > cutoff)
+        )
+        for row in tombstones:
+            latest = max(latest, to_version(row.deleted_at))
+            removed.append(row.member_id)
+        return {"version": latest, "upserts": upserts, "removed": removed}
+
+    def _prune_tombstones(self):
+        if time.monotonic() - self._last_prune < DIRECTORY_PRUNE_SECONDS:
+            return
+        self._last_prune = time.monotonic()
+        cutoff = datetime.now(pytz.UTC) - timedelta(days=DIRECTORY_TOMBSTONE_RETENTION_DAYS)
+        with instrumentation.untracked(), self.engine.begin() as conn:
+            conn.execute(delete(models.MemberTombstone).where(models.MemberTombstone.deleted_at < cutoff))
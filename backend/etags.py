@@ -0,0 +1,79 @@
+"""ETag support for version-stamped resources.
+
+Members and households carry a `version` that database triggers bump on
+every check-in and edit, so an ETag built from (id, version) changes
+exactly when the response would. Handlers check If-None-Match after a
+single indexed version lookup and only build the full response on a miss.
+"""
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+import fastjson
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+# Clients may reuse a response only after revalidating it with us
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(kind: str, key: Any, version: int, *extra: Any) -> str:
+    parts = [kind, str(key), f"v{version}", *(str(e) for e in extra)]
+    return 'W/"' + "-".join(parts) + '"'
+
+def matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already covers `etag` (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def json_response(content: Any, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if isinstance(content, bytes):
+        # Already encoded by the fast JSON path
+        return Response(content=content, media_type=fastjson.MEDIA_TYPE, headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
+class VersionedCache:
+    """Small per-worker LRU of encoded response bodies keyed by ETag.
+
+    Keys embed the version, so entries never need invalidating: a bump
+    simply produces a new key and the old entry ages out.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, etag: str) -> Optional[Any]:
+        with self._lock:
+            content = self._entries.get(etag)
+            if content is not None:
+                self._entries.move_to_end(etag)
+            return content
+
+    def set(self, etag: str, content: Any) -> Any:
+        # Cache final bytes on the fast path so hits skip encoding entirely
+        content = fastjson.dumps(content) if fastjson.FAST_JSON_ENABLED else jsonable_encoder(content)
+        with self._lock:
+            self._entries[etag] = content
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return content
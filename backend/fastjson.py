@@ -0,0 +1,175 @@
+"""Opt-in fast JSON path for large list responses.
+
+With FAST_JSON_ENABLED=true, list endpoints select plain columns instead of
+ORM objects and encode rows straight to bytes with orjson, skipping
+per-row Pydantic validation and jsonable_encoder. Arrays are streamed in
+chunks of FAST_JSON_CHUNK_ROWS, and compressed with brotli or gzip when the
+client accepts it. Each endpoint's fast output matches its default path,
+so clients can't tell which path served them: Pydantic's JSON mode
+(response_model endpoints) writes UTC datetimes with a Z suffix, while
+plain dicts go through jsonable_encoder and datetime.isoformat(), which
+writes +00:00. Endpoints pass the matching options.
+
+Brotli is optional: without the `brotli` package only gzip is offered.
+"""
+import os
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+import models
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "false").lower() == "true"
+FAST_JSON_CHUNK_ROWS = int(os.getenv("FAST_JSON_CHUNK_ROWS", "1000"))
+# Small bodies aren't worth the CPU
+COMPRESS_MIN_BYTES = 1024
+
+# UTC datetimes as Pydantic's JSON mode writes them (Z suffix)...
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+# ...and as datetime.isoformat() does (+00:00)
+ISOFORMAT_OPTIONS = 0
+
+MEDIA_TYPE = "application/json"
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content: Any, option: int = ORJSON_OPTIONS) -> bytes:
+    return orjson.dumps(content, default=_default, option=option)
+
+# Member columns in MemberOut field order
+MEMBER_KEYS = ("email", "name", "active", "id", "household_id", "location_id", "barcode", "created_at", "deleted_at")
+
+def member_select():
+    """SELECT of the MemberOut columns; rows feed member_dict() without touching the ORM"""
+    return select(
+        models.Household.email,
+        models.Member.name,
+        models.Member.active,
+        models.Member.id,
+        models.Member.household_id,
+        models.Member.location_id,
+        models.Member.barcode,
+        models.Member.created_at,
+        models.Member.deleted_at,
+    ).join(models.Household, models.Household.id == models.Member.household_id)
+
+def member_dict(row) -> Dict[str, Any]:
+    """A member_select() row or a loaded Member, shaped like MemberOut"""
+    if isinstance(row, models.Member):
+        return {key: getattr(row, key) for key in MEMBER_KEYS}
+    return dict(zip(MEMBER_KEYS, row))
+
+def encode_array(
+    items: Iterable[Any],
+    chunk_rows: int = FAST_JSON_CHUNK_ROWS,
+    option: int = ORJSON_OPTIONS
+) -> Iterator[bytes]:
+    """Encode a JSON array a chunk of rows at a time"""
+    yield b"["
+    first = True
+    chunk = []
+    for item in items:
+        chunk.append(dumps(item, option))
+        if len(chunk) >= chunk_rows:
+            yield (b"" if first else b",") + b",".join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b"" if first else b",") + b",".join(chunk)
+    yield b"]"
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    header = request.headers.get("accept-encoding", "")
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+def accepts_encoding(request: Request, coding: str) -> bool:
+    accepted = _accepted_encodings(request)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    """Best content coding the client accepts: br, then gzip"""
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepts_encoding(request, coding):
+            return coding
+    return None
+
+class _Compressor:
+    def __init__(self, coding: str):
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=4)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+            self._compress = self._compressor.compress
+            self._flush = self._compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def flush(self) -> bytes:
+        return self._flush()
+
+def compress(coding: str, body: bytes) -> bytes:
+    compressor = _Compressor(coding)
+    return compressor.compress(body) + compressor.flush()
+
+def _compressed_stream(coding: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = _Compressor(coding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_json(request: Request, chunks: Iterator[bytes], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Stream pre-encoded JSON chunks, compressed if the client allows it.
+
+    The generator runs in the threadpool after the handler returns; the DB
+    session stays open until the response is sent, so chunks may read from
+    a streaming result. Request metrics are recorded once the body is sent,
+    so they include those reads.
+    """
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    coding = negotiate_encoding(request)
+    if coding:
+        headers["Content-Encoding"] = coding
+        chunks = _compressed_stream(coding, chunks)
+    return StreamingResponse(chunks, media_type=MEDIA_TYPE, headers=headers)
+
+def json_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encode `content` in one go, compressing bodies over COMPRESS_MIN_BYTES"""
+    body = content if isinstance(content, bytes) else dumps(content)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    coding = negotiate_encoding(request) if len(body) >= COMPRESS_MIN_BYTES else None
+    if coding:
+        headers["Content-Encoding"] = coding
+        body = compress(coding, body)
+    return Response(content=body, media_type=MEDIA_TYPE, headers=headers)
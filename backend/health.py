@@ -0,0 +1,102 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text
+from prometheus_client import Gauge
+import structlog
+
+logger = structlog.get_logger()
+
+# How often the background task runs SELECT 1
+READINESS_INTERVAL = float(os.getenv("READINESS_INTERVAL", "10"))
+# Consecutive failed checks before reporting not ready (ignores transient blips)
+READINESS_FAILURE_THRESHOLD = int(os.getenv("READINESS_FAILURE_THRESHOLD", "3"))
+# Fraction of pool capacity checked out at which the worker stops taking traffic
+POOL_SATURATION_THRESHOLD = float(os.getenv("POOL_SATURATION_THRESHOLD", "0.95"))
+
+POOL_SIZE = Gauge('db_pool_size', 'Configured DB pool size')
+POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'DB connections currently checked out')
+POOL_OVERFLOW = Gauge('db_pool_overflow', 'DB connections open beyond pool_size')
+POOL_SATURATION = Gauge('db_pool_saturation', 'Checked-out connections as a fraction of pool capacity')
+
+def pool_stats(pool) -> dict:
+    """Snapshot of pool usage; pools without a fixed size report zeros"""
+    size = pool.size() if hasattr(pool, "size") else 0
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+    overflow = max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0
+    capacity = size + max(getattr(pool, "_max_overflow", 0), 0)
+    return {
+        "size": size,
+        "checked_out": checked_out,
+        "overflow": overflow,
+        "capacity": capacity,
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+
+class ReadinessProbe:
+    """Periodically refreshed DB check so probes never hold a connection themselves"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.ok = False
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[datetime] = None
+        self.latency_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        POOL_SIZE.set_function(lambda: pool_stats(self.engine.pool)["size"])
+        POOL_CHECKED_OUT.set_function(lambda: pool_stats(self.engine.pool)["checked_out"])
+        POOL_OVERFLOW.set_function(lambda: pool_stats(self.engine.pool)["overflow"])
+        POOL_SATURATION.set_function(lambda: pool_stats(self.engine.pool)["saturation"])
+
+    def check_once(self):
+        start = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            self.ok = True
+            self.consecutive_failures = 0
+            self.last_error = None
+        except Exception as e:
+            self.consecutive_failures += 1
+            self.last_error = str(e)
+            if self.consecutive_failures >= READINESS_FAILURE_THRESHOLD:
+                self.ok = False
+            logger.warning("Readiness check failed", error=str(e), consecutive_failures=self.consecutive_failures)
+        self.latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.checked_at = datetime.now()
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.check_once)
+            await asyncio.sleep(READINESS_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        pool = pool_stats(self.engine.pool)
+        saturated = pool["capacity"] > 0 and pool["saturation"] >= POOL_SATURATION_THRESHOLD
+        return {
+            "ready": self.ok and not saturated,
+            "database": "ok" if self.ok else "unavailable",
+            "checked_at": self.checked_at.isoformat() if self.checked_at else None,
+            "check_latency_ms": self.latency_ms,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "pool": pool,
+            "pool_saturated": saturated,
+        }
@@ -0,0 +1,208 @@
+"""Idempotency-Key support for check-in and registration POSTs.
+
+Kiosks on flaky Wi-Fi retry POSTs. When a request carries an
+Idempotency-Key header, the first attempt claims the key in Postgres
+(shared by all workers) and stores the final response; retries with the
+same key and body are answered from the store without running the
+handler again. A retry that arrives while the first attempt is still
+running gets 409, and reusing a key with a different body gets 422.
+
+An in-progress claim is a lease of IDEMPOTENCY_LEASE_SECONDS. If the
+worker running the first attempt dies (deploy, OOM kill) the claim is
+never completed or released; once the lease runs out, a retry with the
+same body takes the claim over and runs the handler itself.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+import pytz
+from sqlalchemy import Integer, LargeBinary, String, bindparam, text
+from starlette.concurrency import run_in_threadpool
+import structlog
+import instrumentation
+from portable import UTCDateTime
+
+logger = structlog.get_logger()
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Longer than any request may run (pool and admission timeouts are seconds)
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+IDEMPOTENCY_PRUNE_SECONDS = 300
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_PATHS = {
+    "/checkin",
+    "/checkin/by-name",
+    "/checkin-by-barcode",
+    "/family/checkin",
+    "/family/register",
+    "/family/add-members",
+    "/kiosk/checkin",
+    "/member",
+}
+
+CLAIM = text("""
+    INSERT INTO idempotency_keys (key, endpoint, request_hash, created_at)
+    VALUES (:key, :endpoint, :request_hash, :now)
+    ON CONFLICT (key, endpoint) DO NOTHING
+""").bindparams(bindparam("now", type_=UTCDateTime))
+TAKE_OVER = text("""
+    UPDATE idempotency_keys
+    SET created_at = :now
+    WHERE key = :key AND endpoint = :endpoint AND request_hash = :request_hash
+      AND status_code IS NULL AND created_at < :stale_before
+""").bindparams(bindparam("now", type_=UTCDateTime), bindparam("stale_before", type_=UTCDateTime))
+LOOKUP = text("""
+    SELECT request_hash, status_code, content_type, body, created_at
+    FROM idempotency_keys
+    WHERE key = :key AND endpoint = :endpoint
+""").columns(request_hash=String, status_code=Integer, content_type=String, body=LargeBinary, created_at=UTCDateTime)
+COMPLETE = text("""
+    UPDATE idempotency_keys
+    SET status_code = :status_code, content_type = :content_type, body = :body
+    WHERE key = :key AND endpoint = :endpoint
+""")
+RELEASE = text("DELETE FROM idempotency_keys WHERE key = :key AND endpoint = :endpoint")
+PRUNE = text("DELETE FROM idempotency_keys WHERE created_at < :cutoff").bindparams(
+    bindparam("cutoff", type_=UTCDateTime)
+)
+
+class IdempotencyStore:
+    def __init__(self, engine):
+        self.engine = engine
+        self._last_prune = 0.0
+
+    def claim(self, key: str, endpoint: str, request_hash: str) -> Optional[dict]:
+        """Claim the key; return the existing record instead if it is already taken"""
+        now = datetime.now(pytz.UTC)
+        with instrumentation.untracked(), self.engine.begin() as conn:
+            if time.monotonic() - self._last_prune > IDEMPOTENCY_PRUNE_SECONDS:
+                conn.execute(PRUNE, {"cutoff": now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)})
+                self._last_prune = time.monotonic()
+            params = {"key": key, "endpoint": endpoint}
+            if conn.execute(CLAIM, {**params, "request_hash": request_hash, "now": now}).rowcount == 1:
+                return None
+            stale_before = now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+            if conn.execute(TAKE_OVER, {
+                **params, "request_hash": request_hash, "now": now, "stale_before": stale_before
+            }).rowcount == 1:
+                logger.warning("Stale idempotency claim taken over", endpoint=endpoint)
+                return None
+            row = conn.execute(LOOKUP, params).first()
+        if row is None:
+            return None
+        if row.created_at < now - timedelta(hours=IDEMPOTENCY_TTL_HOURS):
+            # Expired but not yet pruned: start over
+            self.release(key, endpoint)
+            return self.claim(key, endpoint, request_hash)
+        return dict(row._mapping)
+
+    def complete(self, key: str, endpoint: str, status_code: int, content_type: Optional[str], body: bytes):
+        with instrumentation.untracked(), self.engine.begin() as conn:
+            conn.execute(COMPLETE, {
+                "key": key, "endpoint": endpoint,
+                "status_code": status_code, "content_type": content_type, "body": body
+            })
+
+    def release(self, key: str, endpoint: str):
+        with instrumentation.untracked(), self.engine.begin() as conn:
+            conn.execute(RELEASE, {"key": key, "endpoint": endpoint})
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware so the request body can be buffered and replayed"""
+
+    def __init__(self, app, store: IdempotencyStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key", b"").decode("latin-1").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, b'{"detail":"Idempotency-Key is too long"}')
+            return
+
+        # Buffer the body so it can be hashed and then handed to the app unchanged
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        request_hash = hashlib.sha256(
+            headers.get(b"x-location", b"") + b"\n" + body
+        ).hexdigest()
+
+        endpoint = scope["path"]
+        existing = await run_in_threadpool(self.store.claim, key, endpoint, request_hash)
+        if existing is not None:
+            if existing["request_hash"] != request_hash:
+                await _send_json(send, 422, b'{"detail":"Idempotency-Key was already used with a different request"}')
+            elif existing["status_code"] is None:
+                await _send_json(send, 409, b'{"detail":"A request with this Idempotency-Key is still in progress"}')
+            else:
+                logger.info("Idempotent replay", endpoint=endpoint, status_code=existing["status_code"])
+                await _send(send, existing["status_code"], existing["content_type"], bytes(existing["body"]), replayed=True)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        content_type = None
+        response_chunks = []
+
+        async def capture_send(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        content_type = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        # Stored bodies are replayed without Content-Encoding, so ask for identity
+        scope = dict(scope, headers=[(name, value) for name, value in scope["headers"] if name != b"accept-encoding"])
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except Exception:
+            await run_in_threadpool(self.store.release, key, endpoint)
+            raise
+
+        if status_code >= 500 or status_code == 429:
+            # Transient failures must stay retryable
+            await run_in_threadpool(self.store.release, key, endpoint)
+        else:
+            await run_in_threadpool(
+                self.store.complete, key, endpoint, status_code, content_type, b"".join(response_chunks)
+            )
+
+async def _send(send, status_code: int, content_type: Optional[str], body: bytes, replayed: bool = False):
+    headers = [(b"content-length", str(len(body)).encode())]
+    if content_type:
+        headers.append((b"content-type", content_type.encode("latin-1")))
+    if replayed:
+        headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_json(send, status_code: int, body: bytes):
+    await _send(send, status_code, "application/json", body)
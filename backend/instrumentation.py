@@ -0,0 +1,185 @@
+import os
+import re
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from prometheus_client import Counter, Histogram
+import structlog
+
+logger = structlog.get_logger()
+
+# Slow query settings
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+# Query budgets: warn by default; strict mode (tests/CI) raises so the request fails
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+# The same statement this many times in one request looks like a loop (N+1)
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", "3"))
+
+# Prometheus metrics
+DB_QUERIES_PER_REQUEST = Histogram(
+    'http_request_db_queries',
+    'SQL statements executed per HTTP request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'http_request_db_seconds',
+    'Total SQL time per HTTP request',
+    ['endpoint']
+)
+
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled DB connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+QUERY_BUDGET_EXCEEDED = Counter(
+    'http_request_query_budget_exceeded_total',
+    'Requests that ran more SQL statements than their endpoint budget',
+    ['endpoint']
+)
+REPEATED_QUERIES = Counter(
+    'http_request_repeated_queries_total',
+    'Requests that ran the same statement shape REPEATED_QUERY_THRESHOLD+ times',
+    ['endpoint']
+)
+
+class QueryStats:
+    """Query count, SQL time and statement shapes accumulated for a single request"""
+    __slots__ = ("count", "duration", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = StatementCounter()
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a request breaks its endpoint's query budget"""
+
+# Mutable stats object for the current request. Handlers and threadpool
+# dependencies run in copies of the middleware's context, so they mutate
+# the same object rather than rebinding the variable.
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def begin_request() -> QueryStats:
+    """Start collecting query stats for the current request"""
+    stats = QueryStats()
+    _current_stats.set(stats)
+    return stats
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+def observe_request(endpoint: str, stats: QueryStats):
+    DB_QUERIES_PER_REQUEST.labels(endpoint=endpoint).observe(stats.count)
+    DB_TIME_PER_REQUEST.labels(endpoint=endpoint).observe(stats.duration)
+
+@contextmanager
+def untracked():
+    """Run infrastructure queries (e.g. idempotency bookkeeping) outside request stats"""
+    token = _current_stats.set(None)
+    try:
+        yield
+    finally:
+        _current_stats.reset(token)
+
+def query_budget(max_queries: int) -> Callable:
+    """Declare the most SQL statements an endpoint may run per request.
+
+    Apply below the route and rate limit decorators so the budget is copied
+    onto the registered endpoint.
+    """
+    def decorator(fn):
+        fn.__query_budget__ = max_queries
+        return fn
+    return decorator
+
+def check_budget(endpoint: str, route_endpoint, stats: QueryStats) -> List[str]:
+    """Problems with this request's queries: over budget or repeated statement shapes"""
+    problems = []
+    budget = getattr(route_endpoint, "__query_budget__", None)
+    if budget is not None and stats.count > budget:
+        QUERY_BUDGET_EXCEEDED.labels(endpoint=endpoint).inc()
+        problems.append(f"{stats.count} queries, budget is {budget}")
+    repeated = [(shape, n) for shape, n in stats.shapes.items() if n >= REPEATED_QUERY_THRESHOLD]
+    if repeated:
+        REPEATED_QUERIES.labels(endpoint=endpoint).inc()
+        for shape, n in repeated:
+            problems.append(f"statement ran {n} times: {shape[:200]}")
+    if problems:
+        logger.warning("Query budget problems", endpoint=endpoint, problems=problems)
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(f"{endpoint}: " + "; ".join(problems))
+    return problems
+
+def server_timing_header(stats: QueryStats, total_seconds: float) -> str:
+    return (
+        f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+        f'total;dur={total_seconds * 1000:.1f}'
+    )
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+# Expanded IN lists differ only in length; count them as one shape
+_IN_LIST_RE = re.compile(r"IN \((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,?)+\)")
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST_RE.sub("IN (...)", " ".join(statement.split()))
+
+def redact_parameters(parameters):
+    """Keep parameter names/positions but never log their values"""
+    if isinstance(parameters, dict):
+        return {key: "?" for key in parameters}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [redact_parameters(p) for p in parameters]
+        return ["?"] * len(parameters)
+    return parameters
+
+def _explain(conn, statement, parameters) -> Optional[str]:
+    # Only plain reads are safe to EXPLAIN; use a separate DBAPI cursor so the
+    # original cursor's result set is left untouched.
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("EXPLAIN " + statement, parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.close()
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+
+def install(engine: Engine):
+    """Attach query counting and slow query logging to the engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            stats.shapes[statement_shape(statement)] += 1
+
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            logger.warning(
+                "Slow query",
+                duration_ms=round(elapsed * 1000, 2),
+                statement=_LITERAL_RE.sub("'?'", statement),
+                parameters=redact_parameters(parameters),
+                plan=_explain(conn, statement, parameters) if SLOW_QUERY_EXPLAIN and not executemany else None
+            )
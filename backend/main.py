@@ -3,22 +3,40 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import func, and_, extract, select, update, delete
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date, timedelta, time
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 import structlog
+import asyncio
 import uuid
 import pytz
 import json
+import gzip
 import os
 import models
 from models import generate_barcode
-from database import engine, SessionLocal
-from typing import List, Dict, Optional
+from database import engine, SessionLocal, IS_SQLITE, prewarm_pool, connection_budget
+import instrumentation
+import health
+import occupancy
+import archive
+import etags
+import fastjson
+import portable
+import outbox
+import idempotency
+import directory
+import admission
+import profiling
+import cohorts
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from time import monotonic
 import jwt
 from pydantic import BaseModel
 
@@ -54,7 +72,6 @@ logger = structlog.get_logger()
 # Prometheus metrics
 REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
 REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration')
-CHECKIN_COUNT = Counter('checkins_total', 'Total check-ins')
 MEMBER_COUNT = Counter('members_total', 'Total members')
 
 # Rate limiting
@@ -72,6 +89,20 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Replay stored responses for retried POSTs carrying an Idempotency-Key.
+# Added first so it runs innermost, after CORS and request logging.
+app.add_middleware(idempotency.IdempotencyMiddleware, store=idempotency.IdempotencyStore(engine))
+
+# Per-priority concurrency limits; check-ins keep reserved slots while
+# reports and exports queue or get 503. Outside idempotency, so shed
+# requests never claim a key.
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware, controller=admission.AdmissionController())
+
+# Armed on demand from /admin/profiler; outside admission so queueing shows up
+profiler = profiling.SamplingProfiler()
+app.add_middleware(profiling.ProfilerMiddleware, profiler=profiler)
+
 # Security middleware
 app.add_middleware(
     TrustedHostMiddleware,
@@ -88,10 +119,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count queries and SQL time per request
+instrumentation.install(engine)
+
 # Custom middleware for logging and metrics
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = datetime.now()
+    query_stats = instrumentation.begin_request()
     
     # Log request
     logger.info(
@@ -103,35 +138,62 @@ async def log_requests(request: Request, call_next):
     
     response = await call_next(request)
     
-    # Calculate duration
-    duration = (datetime.now() - start_time).total_seconds()
+    # Label DB metrics by route template so /member/{member_id}/stats is one series
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", request.url.path)
+    if instrumentation.SERVER_TIMING_ENABLED:
+        # Sent ahead of the body, so a streamed body's queries aren't in it
+        duration = (datetime.now() - start_time).total_seconds()
+        response.headers["Server-Timing"] = instrumentation.server_timing_header(query_stats, duration)
     
-    # Update metrics
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
-        status=response.status_code
-    ).inc()
-    REQUEST_DURATION.observe(duration)
+    def record():
+        duration = (datetime.now() - start_time).total_seconds()
+        
+        # Update metrics
+        REQUEST_COUNT.labels(
+            method=request.method,
+            endpoint=request.url.path,
+            status=response.status_code
+        ).inc()
+        REQUEST_DURATION.observe(duration)
+        instrumentation.observe_request(endpoint, query_stats)
+        instrumentation.check_budget(endpoint, getattr(route, "endpoint", None), query_stats)
+        
+        # Log response
+        logger.info(
+            "Request completed",
+            method=request.method,
+            url=str(request.url),
+            status_code=response.status_code,
+            duration=duration,
+            db_queries=query_stats.count,
+            db_time=round(query_stats.duration, 6)
+        )
     
-    # Log response
-    logger.info(
-        "Request completed",
-        method=request.method,
-        url=str(request.url),
-        status_code=response.status_code,
-        duration=duration
-    )
+    # Streamed bodies (fastjson.stream_json) run their queries while being
+    # sent, so the request is only recorded once the last chunk is out
+    async def body_then_record(body_iterator):
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            record()
+    
+    if instrumentation.QUERY_BUDGET_STRICT:
+        # Strict mode (tests/CI) must fail the request, so buffer the body and
+        # check the budget before the status line goes out
+        body = [chunk async for chunk in response.body_iterator]
+        record()
+        
+        async def buffered():
+            for chunk in body:
+                yield chunk
+        response.body_iterator = buffered()
+        return response
     
+    response.body_iterator = body_then_record(response.body_iterator)
     return response
 
-# Drop and recreate tables only in development
-# if os.getenv("ENVIRONMENT") == "development":
-#     models.Base.metadata.drop_all(bind=engine)
-#     models.Base.metadata.create_all(bind=engine)
-# else:
-    models.Base.metadata.create_all(bind=engine)
-
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -140,51 +202,177 @@ def get_db():
     finally:
         db.close()
 
-# Health check endpoint
-@app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+# Household helpers: families are keyed by household_id, email is only the entry point
+def get_household(db: Session, email: str) -> Optional[models.Household]:
+    return db.query(models.Household).filter(models.Household.email == models.normalize_email(email)).first()
+
+def get_or_create_household(db: Session, email: str) -> models.Household:
+    household = get_household(db, email)
+    if household:
+        return household
+    household = models.Household(email=email)
     try:
-        # Check database connection
-        db.query(models.Member).first()
-        
-        return {
-            "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "database": "ok",
-            "version": "1.0.0"
-        }
-    except Exception as e:
-        logger.error("Health check failed", error=str(e))
+        # Savepoint so a concurrent insert of the same email doesn't abort the request
+        with db.begin_nested():
+            db.add(household)
+    except IntegrityError:
+        household = get_household(db, email)
+    return household
+
+def generate_unique_barcodes(db: Session, count: int) -> List[str]:
+    """`count` barcodes not yet taken, checked with one query per batch"""
+    barcodes: set = set()
+    while len(barcodes) < count:
+        candidates = {generate_barcode() for _ in range(count - len(barcodes))} - barcodes
+        taken = {row.barcode for row in db.query(models.Member.barcode).filter(
+            models.Member.barcode.in_(candidates)
+        )}
+        barcodes |= candidates - taken
+    return list(barcodes)
+
+def record_checkins(db: Session, members: List[models.Member], location: models.Location, source: str) -> List[models.Checkin]:
+    """Add check-ins plus their outbox events; both commit (or roll back) together"""
+    now = datetime.now(pytz.UTC)
+    checkins = [
+        models.Checkin(id=uuid.uuid4(), member_id=member.id, location_id=location.id, timestamp=now)
+        for member in members
+    ]
+    db.add_all(checkins)
+    outbox.emit(db, outbox.CHECKIN_CREATED, [{
+        "checkin_id": str(checkin.id),
+        "member_id": str(checkin.member_id),
+        "location_id": str(location.id),
+        "timestamp": now.isoformat(),
+        "source": source,
+    } for checkin in checkins])
+    return checkins
+
+# Location helpers: the gym is chosen per request by X-Location header or ?location=
+DEFAULT_LOCATION = os.getenv("DEFAULT_LOCATION", "main")
+LOCATION_CACHE_SECONDS = 60
+_location_cache: Dict[str, Tuple[float, models.Location]] = {}
+
+def get_location(request: Request, db: Session = Depends(get_db)) -> models.Location:
+    """Resolve the request's location, cached per worker since locations rarely change"""
+    slug = request.headers.get("X-Location") or request.query_params.get("location") or DEFAULT_LOCATION
+    cached = _location_cache.get(slug)
+    if cached and monotonic() - cached[0] < LOCATION_CACHE_SECONDS:
+        return cached[1]
+    location = db.query(models.Location).filter(models.Location.slug == slug).first()
+    if not location:
+        raise HTTPException(status_code=404, detail=f"Unknown location: {slug}")
+    # Detach so the cached row can be shared across sessions (only id/timezone are read)
+    db.expunge(location)
+    _location_cache[slug] = (monotonic(), location)
+    return location
+
+def current_period(tz) -> Tuple[datetime, bool, datetime, datetime]:
+    """Return (now, is_am, period_start_utc, period_end_utc) for the AM/PM period in `tz`"""
+    now = datetime.now(tz)
+    today = now.date()
+    is_am = now.hour < 12
+    
+    # Define AM/PM period start/end
+    if is_am:
+        period_start = tz.localize(datetime.combine(today, time(0, 0, 0)))
+        period_end = tz.localize(datetime.combine(today, time(11, 59, 59)))
+    else:
+        period_start = tz.localize(datetime.combine(today, time(12, 0, 0)))
+        period_end = tz.localize(datetime.combine(today, time(23, 59, 59)))
+    
+    # Convert to UTC for DB query
+    return now, is_am, period_start.astimezone(pytz.UTC), period_end.astimezone(pytz.UTC)
+
+def local_day_bounds_utc(tz, day: date) -> Tuple[datetime, datetime]:
+    """UTC start/end of a calendar day in `tz`"""
+    start = tz.localize(datetime.combine(day, datetime.min.time()))
+    end = tz.localize(datetime.combine(day, datetime.max.time()))
+    return start.astimezone(pytz.UTC), end.astimezone(pytz.UTC)
+
+# Encoded profile and cohort responses keyed by version ETag
+response_cache = etags.VersionedCache()
+
+# Background DB check shared by the readiness endpoints
+readiness = health.ReadinessProbe(engine)
+
+# Live occupancy shared across workers through Postgres
+occupancy_tracker = occupancy.OccupancyTracker(engine)
+
+# Drains check-in side effects committed to the outbox
+outbox_worker = outbox.OutboxWorker(engine)
+
+# Barcode directory snapshots for kiosks
+member_directory = directory.MemberDirectory(engine)
+
+# Liveness: the process is up and serving; never touches the database
+@app.get("/livez")
+async def liveness_check():
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+# Readiness: cached SELECT 1 result plus pool saturation, no pool checkout
+@app.get("/readyz")
+async def readiness_check():
+    status = readiness.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "unavailable", **status})
+    return {"status": "ready", **status}
+
+# Kept for existing monitors; same cached check as /readyz
+@app.get("/health")
+async def health_check():
+    status = readiness.status()
+    if not status["ready"]:
         return JSONResponse(
             status_code=503,
-            content={"status": "unhealthy", "error": str(e)}
+            content={"status": "unhealthy", "database": status["database"], "error": status["last_error"]}
         )
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "database": "ok",
+        "version": "1.0.0"
+    }
 
 # Metrics endpoint
 @app.get("/metrics")
 async def get_metrics():
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
-# Sample data insertion (run once at startup if no members)
+# Schema changes run via `python manage.py migrate` and sample data via
+# `python manage.py seed`; startup only warms the connection pool.
 @app.on_event("startup")
-async def startup_populate():
-    db = SessionLocal()
+async def startup_warm_pool():
+    budget = connection_budget()
+    logger.info(
+        "Database connection budget",
+        pool_mode=budget["mode"],
+        workers=budget["workers"],
+        connections_per_worker=budget["per_worker"],
+        connections_total=budget["total"]
+    )
     try:
-        if db.query(models.Member).count() == 0:
-            member1 = models.Member(email="john.doe@example.com", name="John Doe")
-            member2 = models.Member(email="jane.smith@example.com", name="Jane Smith")
-            db.add_all([member1, member2])
-            db.commit()
-            logger.info("Sample data inserted")
+        opened = prewarm_pool()
+        logger.info("Connection pool warmed", connections=opened)
     except Exception as e:
-        logger.error("Startup population failed", error=str(e))
-    finally:
-        db.close()
+        logger.error("Connection pool warm-up failed", error=str(e))
+    readiness.start()
+    occupancy_tracker.start()
+    if outbox.OUTBOX_WORKER_ENABLED:
+        outbox_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_readiness():
+    await readiness.stop()
+    await occupancy_tracker.stop()
+    await outbox_worker.stop()
 
 @app.get("/member/{email}", response_model=models.MemberOut)
 @limiter.limit("10/minute")
+@instrumentation.query_budget(2)
 async def get_member(request: Request, email: str, db: Session = Depends(get_db)):
-    member = db.query(models.Member).filter(models.Member.email == email).first()
+    member = db.query(models.Member).join(models.Member.household).options(
+        contains_eager(models.Member.household)
+    ).filter(models.Household.email == models.normalize_email(email)).first()
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     
@@ -194,39 +382,32 @@ async def get_member(request: Request, email: str, db: Session = Depends(get_db)
 
 @app.post("/checkin")
 @limiter.limit("5/minute")
-async def check_in(request: Request, member_data: dict, db: Session = Depends(get_db)):
+@instrumentation.query_budget(7)
+async def check_in(
+    request: Request,
+    member_data: dict,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Handle member check-in (AM/PM logic)"""
     email = member_data.get("email")
     if not email:
         raise HTTPException(status_code=400, detail="Email is required")
 
     # Get member
-    member = db.query(models.Member).filter(models.Member.email == email).first()
+    member = db.query(models.Member).join(models.Member.household).options(
+        contains_eager(models.Member.household)
+    ).filter(models.Household.email == models.normalize_email(email)).first()
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
 
-    # Get Toronto time
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
-    today = now.date()
-    hour = now.hour
-    is_am = hour < 12
-
-    # Define AM/PM period start/end
-    if is_am:
-        period_start = toronto_tz.localize(datetime.combine(today, time(0, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(11, 59, 59)))
-    else:
-        period_start = toronto_tz.localize(datetime.combine(today, time(12, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(23, 59, 59)))
-
-    # Convert to UTC for DB query
-    period_start_utc = period_start.astimezone(pytz.UTC)
-    period_end_utc = period_end.astimezone(pytz.UTC)
+    # Current AM/PM period in the location's timezone
+    _, is_am, period_start_utc, period_end_utc = current_period(pytz.timezone(location.timezone))
 
     # Check if already checked in this period
     existing = db.query(models.Checkin).filter(
         models.Checkin.member_id == member.id,
+        models.Checkin.location_id == location.id,
         models.Checkin.timestamp >= period_start_utc,
         models.Checkin.timestamp <= period_end_utc
     ).first()
@@ -240,14 +421,10 @@ async def check_in(request: Request, member_data: dict, db: Session = Depends(ge
         }
 
     # Create check-in
-    checkin = models.Checkin(member_id=member.id)
-    db.add(checkin)
+    checkin = record_checkins(db, [member], location, "checkin")[0]
     db.commit()
     db.refresh(checkin)
 
-    # Update metrics
-    CHECKIN_COUNT.inc()
-
     logger.info("Check-in successful", member_id=str(member.id), email=email)
 
     return {
@@ -260,7 +437,13 @@ async def check_in(request: Request, member_data: dict, db: Session = Depends(ge
 
 @app.post("/checkin/by-name")
 @limiter.limit("5/minute")
-async def check_in_by_name(request: Request, member_data: dict, db: Session = Depends(get_db)):
+@instrumentation.query_budget(7)
+async def check_in_by_name(
+    request: Request,
+    member_data: dict,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Handle member check-in by full name (case-insensitive, exact match)"""
     name = member_data.get("name")
     if not name:
@@ -271,28 +454,13 @@ async def check_in_by_name(request: Request, member_data: dict, db: Session = De
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
 
-    # Get Toronto time
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
-    today = now.date()
-    hour = now.hour
-    is_am = hour < 12
-
-    # Define AM/PM period start/end
-    if is_am:
-        period_start = toronto_tz.localize(datetime.combine(today, time(0, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(11, 59, 59)))
-    else:
-        period_start = toronto_tz.localize(datetime.combine(today, time(12, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(23, 59, 59)))
-
-    # Convert to UTC for DB query
-    period_start_utc = period_start.astimezone(pytz.UTC)
-    period_end_utc = period_end.astimezone(pytz.UTC)
+    # Current AM/PM period in the location's timezone
+    _, is_am, period_start_utc, period_end_utc = current_period(pytz.timezone(location.timezone))
 
     # Check if already checked in this period
     existing = db.query(models.Checkin).filter(
         models.Checkin.member_id == member.id,
+        models.Checkin.location_id == location.id,
         models.Checkin.timestamp >= period_start_utc,
         models.Checkin.timestamp <= period_end_utc
     ).first()
@@ -307,14 +475,10 @@ async def check_in_by_name(request: Request, member_data: dict, db: Session = De
         }
 
     # Create check-in
-    checkin = models.Checkin(member_id=member.id)
-    db.add(checkin)
+    checkin = record_checkins(db, [member], location, "checkin_by_name")[0]
     db.commit()
     db.refresh(checkin)
 
-    # Update metrics
-    CHECKIN_COUNT.inc()
-
     logger.info("Check-in by name successful", member_id=str(member.id), name=name)
 
     return {
@@ -328,139 +492,253 @@ async def check_in_by_name(request: Request, member_data: dict, db: Session = De
 
 @app.get("/admin/checkins/today")
 @limiter.limit("30/minute")
-async def get_today_checkins(request: Request, db: Session = Depends(get_db)):
-    # Get Toronto timezone
-    toronto_tz = pytz.timezone('America/Toronto')
-    
-    # Get today's date in Toronto
-    today = datetime.now(toronto_tz).date()
-    
-    # Create start and end times in Toronto
-    start = toronto_tz.localize(datetime.combine(today, datetime.min.time()))
-    end = toronto_tz.localize(datetime.combine(today, datetime.max.time()))
+@instrumentation.query_budget(2)
+async def get_today_checkins(
+    request: Request,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    location_tz = pytz.timezone(location.timezone)
+    
+    # Today's bounds in the location's timezone, as UTC for the query
+    start_utc, end_utc = local_day_bounds_utc(location_tz, datetime.now(location_tz).date())
+    
+    if fastjson.FAST_JSON_ENABLED:
+        rows = db.execute(
+            select(models.Checkin.id, models.Household.email, models.Member.name, models.Checkin.timestamp)
+            .join(models.Member, models.Checkin.member_id == models.Member.id)
+            .join(models.Household, models.Household.id == models.Member.household_id)
+            .where(
+                models.Checkin.location_id == location.id,
+                models.Checkin.timestamp >= start_utc,
+                models.Checkin.timestamp <= end_utc
+            )
+            .order_by(models.Checkin.timestamp.desc())
+            .execution_options(yield_per=fastjson.FAST_JSON_CHUNK_ROWS)
+        )
+        return fastjson.stream_json(request, fastjson.encode_array(
+            {"checkin_id": checkin_id, "email": email, "name": name, "timestamp": timestamp.astimezone(location_tz)}
+            for checkin_id, email, name, timestamp in rows
+        ))
     
-    # Convert to UTC for database query
-    start_utc = start.astimezone(pytz.UTC)
-    end_utc = end.astimezone(pytz.UTC)
+    return today_checkins(db, location)
+
+def today_checkins(db: Session, location: models.Location) -> List[dict]:
+    """Today's check-ins at `location`, newest first, with local timestamps"""
+    location_tz = pytz.timezone(location.timezone)
+    start_utc, end_utc = local_day_bounds_utc(location_tz, datetime.now(location_tz).date())
     
     # Use optimized query with joins, order by timestamp descending
     checkins = db.query(models.Checkin, models.Member).join(
         models.Member, models.Checkin.member_id == models.Member.id
     ).filter(
+        models.Checkin.location_id == location.id,
         models.Checkin.timestamp >= start_utc,
         models.Checkin.timestamp <= end_utc
     ).order_by(models.Checkin.timestamp.desc()).all()
     
     result = []
     for checkin, member in checkins:
-        # Convert UTC timestamp to Toronto time
-        toronto_timestamp = checkin.timestamp.astimezone(toronto_tz)
+        # Convert UTC timestamp to the location's local time
+        local_timestamp = checkin.timestamp.astimezone(location_tz)
         result.append({
             "checkin_id": str(checkin.id),
             "email": member.email,
             "name": member.name,
-            "timestamp": toronto_timestamp.isoformat()
+            "timestamp": local_timestamp.isoformat()
         })
     
     return result
 
+RANGE_GROUPINGS = ("day", "week", "month", "year")
+
+# Reports are plain def so FastAPI runs them in the threadpool instead of
+# blocking check-ins on the event loop (same for stats, heatmap and /members)
 @app.get("/admin/checkins/range")
 @limiter.limit("20/minute")
-async def get_checkins_by_range(
+@instrumentation.query_budget(4)
+def get_checkins_by_range(
     request: Request,
     start_date: date,
     end_date: date,
     group_by: str = "day",  # Options: day, week, month, year
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
 ):
-    toronto_tz = pytz.timezone('America/Toronto')
-    
-    # Convert dates to datetime with timezone
-    start = toronto_tz.localize(datetime.combine(start_date, datetime.min.time()))
-    end = toronto_tz.localize(datetime.combine(end_date, datetime.max.time()))
-    
-    # Convert to UTC for query
-    start_utc = start.astimezone(pytz.UTC)
-    end_utc = end.astimezone(pytz.UTC)
-    
-    # Get base query
-    query = db.query(models.Checkin).filter(
+    if group_by not in RANGE_GROUPINGS:
+        raise HTTPException(status_code=400, detail="group_by must be one of: day, week, month, year")
+    return checkins_by_range(db, location, start_date, end_date, group_by)
+
+def checkins_by_range(db: Session, location: models.Location, start_date: date, end_date: date, group_by: str) -> List[dict]:
+    """Check-in counts per local day/week/month/year, live and archived rows combined"""
+    location_tz = pytz.timezone(location.timezone)
+    
+    # Convert local dates to UTC bounds for the query
+    start_utc, _ = local_day_bounds_utc(location_tz, start_date)
+    _, end_utc = local_day_bounds_utc(location_tz, end_date)
+    
+    # Convert timestamps to the location's timezone first, then truncate
+    bucket = portable.local_trunc(group_by, models.Checkin.timestamp, location.timezone).label('date')
+    results = db.query(
+        bucket,
+        func.count().label('count')
+    ).filter(
+        models.Checkin.location_id == location.id,
         models.Checkin.timestamp >= start_utc,
         models.Checkin.timestamp <= end_utc
-    )
+    ).group_by(bucket).all()
     
-    # Add aggregation based on group_by parameter
-    # Convert timestamps to Toronto timezone first, then truncate
-    if group_by == "day":
-        # Group by day with count (convert to Toronto timezone first)
-        results = db.query(
-            func.date_trunc('day', func.timezone('America/Toronto', models.Checkin.timestamp)).label('date'),
-            func.count().label('count')
-        ).filter(
-            models.Checkin.timestamp >= start_utc,
-            models.Checkin.timestamp <= end_utc
-        ).group_by('date').order_by('date').all()
-    elif group_by == "week":
-        results = db.query(
-            func.date_trunc('week', func.timezone('America/Toronto', models.Checkin.timestamp)).label('date'),
-            func.count().label('count')
-        ).filter(
-            models.Checkin.timestamp >= start_utc,
-            models.Checkin.timestamp <= end_utc
-        ).group_by('date').order_by('date').all()
-    elif group_by == "month":
-        results = db.query(
-            func.date_trunc('month', func.timezone('America/Toronto', models.Checkin.timestamp)).label('date'),
-            func.count().label('count')
-        ).filter(
-            models.Checkin.timestamp >= start_utc,
-            models.Checkin.timestamp <= end_utc
-        ).group_by('date').order_by('date').all()
-    elif group_by == "year":
-        results = db.query(
-            func.date_trunc('year', func.timezone('America/Toronto', models.Checkin.timestamp)).label('date'),
-            func.count().label('count')
-        ).filter(
-            models.Checkin.timestamp >= start_utc,
-            models.Checkin.timestamp <= end_utc
-        ).group_by('date').order_by('date').all()
+    # Merge in check-ins that have been moved to cold storage
+    counts = {r.date: r.count for r in results}  # Already naive local time
+    boundary = archive.get_boundary(db)
+    for bucket_start, count in archive.count_by_bucket(
+        boundary, location.id, location.timezone, start_utc, end_utc, group_by
+    ).items():
+        counts[bucket_start] = counts.get(bucket_start, 0) + count
     
     return [{
-        "date": r.date.isoformat(),  # Already in Toronto timezone after func.timezone conversion
-        "count": r.count
-    } for r in results]
+        "date": bucket_start.isoformat(),
+        "count": count
+    } for bucket_start, count in sorted(counts.items())]
 
 @app.get("/admin/checkins/stats")
 @limiter.limit("20/minute")
-async def get_checkin_stats(request: Request, db: Session = Depends(get_db)):
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
-    today = now.date()
-    start = toronto_tz.localize(datetime.combine(today, datetime.min.time()))
-    end = toronto_tz.localize(datetime.combine(today, datetime.max.time()))
-    start_utc = start.astimezone(pytz.UTC)
-    end_utc = end.astimezone(pytz.UTC)
-    checkins_today_count = db.query(models.Checkin).filter(
+@instrumentation.query_budget(8)
+def get_checkin_stats(
+    request: Request,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    return checkin_stats(db, location)
+
+def checkin_stats(db: Session, location: models.Location) -> dict:
+    location_tz = pytz.timezone(location.timezone)
+    now = datetime.now(location_tz)
+    start_utc, end_utc = local_day_bounds_utc(location_tz, now.date())
+    members = db.query(models.Member).filter(models.Member.location_id == location.id)
+    checkins = db.query(models.Checkin).filter(models.Checkin.location_id == location.id)
+    checkins_today_count = checkins.filter(
         models.Checkin.timestamp >= start_utc,
         models.Checkin.timestamp <= end_utc
     ).count()
     stats = {
-        "total_members": db.query(models.Member).count(),
-        "active_members": db.query(models.Member).filter(models.Member.active == True).count(),
-        "total_checkins": db.query(models.Checkin).count(),
+        "total_members": members.count(),
+        "active_members": members.filter(models.Member.active == True).count(),
+        "total_checkins": checkins.count() + archive.count_rows(archive.get_boundary(db), location.id),
         "checkins_today": checkins_today_count,
-        "checkins_this_week": db.query(models.Checkin).filter(
+        "checkins_this_week": checkins.filter(
             models.Checkin.timestamp >= now - timedelta(days=7)
         ).count(),
-        "checkins_this_month": db.query(models.Checkin).filter(
+        "checkins_this_month": checkins.filter(
             models.Checkin.timestamp >= now - timedelta(days=30)
         ).count(),
     }
     return stats
 
+@app.get("/occupancy")
+@limiter.limit("60/minute")
+@instrumentation.query_budget(2)
+def get_occupancy(request: Request, location: models.Location = Depends(get_location)):
+    """Members checked in at this location within the last session window, across all workers.
+
+    Plain def: a stale cache re-reads the buckets, which mustn't block the event loop.
+    """
+    return {"location": location.slug, **occupancy_tracker.current(location.id)}
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+@app.get("/admin/analytics/heatmap")
+@limiter.limit("20/minute")
+@instrumentation.query_budget(3)
+def get_attendance_heatmap(
+    request: Request,
+    start_date: date,
+    end_date: date,
+    include_periods: bool = False,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    """Check-in counts by local weekday and hour-of-day, read from the hourly rollup"""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must be on or after start_date")
+    
+    # Rollup rows are already in the location's wall-clock time, so local date bounds apply directly
+    local_hour = models.CheckinHourlyRollup.local_hour
+    weekday = ((extract('dow', local_hour) + 6) % 7).label('weekday')  # dow has Sunday = 0; make Monday = 0
+    hour = extract('hour', local_hour).label('hour')
+    rows = db.query(
+        weekday,
+        hour,
+        func.sum(models.CheckinHourlyRollup.count).label('count')
+    ).filter(
+        models.CheckinHourlyRollup.location_id == location.id,
+        local_hour >= datetime.combine(start_date, time(0, 0)),
+        local_hour < datetime.combine(end_date + timedelta(days=1), time(0, 0))
+    ).group_by(weekday, hour).all()
+    
+    cells = [{
+        "weekday": int(r.weekday),
+        "weekday_name": WEEKDAY_NAMES[int(r.weekday)],
+        "hour": int(r.hour),
+        "count": int(r.count)
+    } for r in rows if r.count]
+    cells.sort(key=lambda c: (c["weekday"], c["hour"]))
+    
+    result = {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "location": location.slug,
+        "timezone": location.timezone,
+        "total": sum(c["count"] for c in cells),
+        "cells": cells
+    }
+    
+    if include_periods:
+        periods: Dict[tuple, int] = {}
+        for c in cells:
+            key = (c["weekday"], "AM" if c["hour"] < 12 else "PM")
+            periods[key] = periods.get(key, 0) + c["count"]
+        result["periods"] = [{
+            "weekday": weekday_idx,
+            "weekday_name": WEEKDAY_NAMES[weekday_idx],
+            "period": period,
+            "count": count
+        } for (weekday_idx, period), count in sorted(periods.items())]
+    
+    return result
+
+@app.get("/admin/analytics/cohorts")
+@limiter.limit("10/minute")
+@instrumentation.query_budget(5)
+def get_cohort_retention(
+    request: Request,
+    months: int = 12,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    """Retention by month since joining and weekly training frequency, per join-month cohort"""
+    if not 1 <= months <= cohorts.MAX_COHORT_MONTHS:
+        raise HTTPException(status_code=400, detail=f"months must be between 1 and {cohorts.MAX_COHORT_MONTHS}")
+    # Computed at most once per local day; later check-ins show up tomorrow
+    as_of = datetime.now(pytz.timezone(location.timezone)).date()
+    etag = etags.make_etag("cohorts", location.id, cohorts.day_number(as_of), months)
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    cached = response_cache.get(etag)
+    if cached is not None:
+        return etags.json_response(cached, etag)
+    report = cohorts.cohort_report(db, location, as_of, months)
+    return etags.json_response(response_cache.set(etag, report), etag)
+
 @app.post("/member")
 @limiter.limit("10/minute")
-async def create_member(request: Request, member_data: dict, db: Session = Depends(get_db)):
+@instrumentation.query_budget(10)
+async def create_member(
+    request: Request,
+    member_data: dict,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Create a new member"""
     email = member_data.get("email")
     name = member_data.get("name")
@@ -468,9 +746,11 @@ async def create_member(request: Request, member_data: dict, db: Session = Depen
     if not email or not name:
         raise HTTPException(status_code=400, detail="Email and name are required")
     
+    household = get_or_create_household(db, email)
+    
     # Check if member already exists (not soft-deleted)
-    existing = db.query(models.Member).filter(
-        models.Member.email == email,
+    existing = db.query(models.Member.id).filter(
+        models.Member.household_id == household.id,
         models.Member.name == name,
         models.Member.deleted_at.is_(None)
     ).first()
@@ -478,15 +758,8 @@ async def create_member(request: Request, member_data: dict, db: Session = Depen
     if existing:
         raise HTTPException(status_code=409, detail="Member already exists")
     
-    # Generate unique barcode
-    while True:
-        barcode = generate_barcode()
-        # Check if barcode already exists
-        existing_barcode = db.query(models.Member).filter(models.Member.barcode == barcode).first()
-        if not existing_barcode:
-            break
-    
-    member = models.Member(email=email, name=name, barcode=barcode)
+    barcode = generate_unique_barcodes(db, 1)[0]
+    member = models.Member(household=household, location_id=location.id, name=name, barcode=barcode)
     db.add(member)
     db.commit()
     db.refresh(member)
@@ -500,7 +773,13 @@ async def create_member(request: Request, member_data: dict, db: Session = Depen
 
 @app.post("/family/register")
 @limiter.limit("10/minute")
-async def register_family(request: Request, family_data: models.FamilyRegistration, db: Session = Depends(get_db)):
+@instrumentation.query_budget(11)
+async def register_family(
+    request: Request,
+    family_data: models.FamilyRegistration,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Register multiple family members with one email and check them all in"""
     email = family_data.email
     members = family_data.members
@@ -508,76 +787,90 @@ async def register_family(request: Request, family_data: models.FamilyRegistrati
     if not email or not members:
         raise HTTPException(status_code=400, detail="Email and at least one member are required")
     
+    household = get_or_create_household(db, email)
+    
     # Check if any member already exists (not soft-deleted)
-    existing_members = []
-    for member_info in members:
-        existing = db.query(models.Member).filter(
-            models.Member.email == email,
-            models.Member.name == member_info.name,
-            models.Member.deleted_at.is_(None)
-        ).first()
-        if existing:
-            existing_members.append(member_info.name)
+    requested_names = [m.name for m in members]
+    existing_members = [row.name for row in db.query(models.Member.name).filter(
+        models.Member.household_id == household.id,
+        models.Member.name.in_(requested_names),
+        models.Member.deleted_at.is_(None)
+    )]
     
     if existing_members:
         raise HTTPException(status_code=409, detail=f"Members already exist: {', '.join(existing_members)}")
     
-    # Create all family members
+    # Create all family members; ids are generated client-side, so one flush
+    # inserts them all and check-ins can reference them straight away
     created_members = []
-    for member_info in members:
-        # Generate unique barcode for each family member
-        while True:
-            barcode = generate_barcode()
-            # Check if barcode already exists
-            existing_barcode = db.query(models.Member).filter(models.Member.barcode == barcode).first()
-            if not existing_barcode:
-                break
-        
-        member = models.Member(email=email, name=member_info.name, barcode=barcode)
+    for member_info, barcode in zip(members, generate_unique_barcodes(db, len(members))):
+        member = models.Member(household=household, location_id=location.id, name=member_info.name, barcode=barcode)
         db.add(member)
         created_members.append(member)
-    
-    db.commit()
+    db.flush()
     
     # Check in all members
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
-    checkins = []
-    
-    for member in created_members:
-        db.refresh(member)
-        checkin = models.Checkin(member_id=member.id)
-        db.add(checkin)
-        checkins.append(checkin)
-        CHECKIN_COUNT.inc()
-    
-    db.commit()
-    
-    logger.info("Family registered and checked in", email=email, member_count=len(members))
+    checkins = record_checkins(db, created_members, location, "family_register")
     
-    return {
+    # Built before commit so expired members aren't reloaded one by one
+    content = {
         "message": f"Family registered successfully. {len(members)} members checked in.",
-        "members": [models.MemberOut.model_validate(m) for m in created_members],
+        "members": [fastjson.member_dict(m) if fastjson.FAST_JSON_ENABLED else models.MemberOut.model_validate(m)
+                    for m in created_members],
         "checkins": len(checkins),
         "member_ids": [str(m.id) for m in created_members]  # NEW: include member_ids for frontend
     }
+    db.commit()
+    
+    logger.info("Family registered and checked in", email=email, member_count=len(members))
+    
+    if fastjson.FAST_JSON_ENABLED:
+        return fastjson.json_response(request, content)
+    return content
 
 @app.get("/family/members/{email}")
 @limiter.limit("20/minute")
+@instrumentation.query_budget(3)
 async def get_family_members(request: Request, email: str, db: Session = Depends(get_db)):
     """Get all family members by email (including soft-deleted)"""
-    members = db.query(models.Member).filter(
-        models.Member.email == email
-    ).all()
+    # Single indexed lookup decides whether anything changed
+    household = db.query(models.Household.id, models.Household.version).filter(
+        models.Household.email == models.normalize_email(email)
+    ).first()
+    if not household:
+        raise HTTPException(status_code=404, detail="No family members found with this email")
+    
+    etag = etags.make_etag("household", household.id, household.version)
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    cached = response_cache.get(etag)
+    if cached is not None:
+        return etags.json_response(cached, etag)
+    
+    if fastjson.FAST_JSON_ENABLED:
+        members = [fastjson.member_dict(row) for row in db.execute(
+            fastjson.member_select().where(models.Member.household_id == household.id)
+        )]
+    else:
+        members = [models.MemberOut.model_validate(member) for member in db.query(models.Member).filter(
+            models.Member.household_id == household.id
+        )]
     
     if not members:
         raise HTTPException(status_code=404, detail="No family members found with this email")
     
-    return [models.MemberOut.model_validate(member) for member in members]
+    content = response_cache.set(etag, members)
+    return etags.json_response(content, etag)
 
 @app.post("/family/checkin")
 @limiter.limit("5/minute")
-async def family_checkin(request: Request, checkin_data: models.FamilyCheckin, db: Session = Depends(get_db)):
+@instrumentation.query_budget(6)
+async def family_checkin(
+    request: Request,
+    checkin_data: models.FamilyCheckin,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Check in selected family members"""
     email = checkin_data.email
     member_names = checkin_data.member_names
@@ -585,55 +878,45 @@ async def family_checkin(request: Request, checkin_data: models.FamilyCheckin, d
     if not email or not member_names:
         raise HTTPException(status_code=400, detail="Email and member names are required")
     
-    # Get Toronto time for AM/PM logic
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
-    today = now.date()
-    hour = now.hour
-    is_am = hour < 12
+    # Current AM/PM period in the location's timezone
+    _, is_am, period_start_utc, period_end_utc = current_period(pytz.timezone(location.timezone))
     
-    # Define AM/PM period
-    if is_am:
-        period_start = toronto_tz.localize(datetime.combine(today, time(0, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(11, 59, 59)))
-    else:
-        period_start = toronto_tz.localize(datetime.combine(today, time(12, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(23, 59, 59)))
+    household = get_household(db, email)
     
-    # Convert to UTC for DB query
-    period_start_utc = period_start.astimezone(pytz.UTC)
-    period_end_utc = period_end.astimezone(pytz.UTC)
+    # All requested members in one query, then everyone already in this period in another
+    members_by_name = {}
+    if household:
+        for member in db.query(models.Member).filter(
+            models.Member.household_id == household.id,
+            models.Member.name.in_(member_names),
+            models.Member.deleted_at.is_(None)
+        ):
+            members_by_name.setdefault(member.name, member)
+    checked_in_ids = {row.member_id for row in db.query(models.Checkin.member_id).filter(
+        models.Checkin.member_id.in_([m.id for m in members_by_name.values()]),
+        models.Checkin.location_id == location.id,
+        models.Checkin.timestamp >= period_start_utc,
+        models.Checkin.timestamp <= period_end_utc
+    ).distinct()} if members_by_name else set()
     
     results = []
+    to_check_in = []
     for name in member_names:
-        # Get member
-        member = db.query(models.Member).filter(
-            models.Member.email == email,
-            models.Member.name == name,
-            models.Member.deleted_at.is_(None)
-        ).first()
+        member = members_by_name.get(name)
         
         if not member:
             results.append(f"{name}: Member not found")
             continue
         
-        # Check if already checked in this period
-        existing = db.query(models.Checkin).filter(
-            models.Checkin.member_id == member.id,
-            models.Checkin.timestamp >= period_start_utc,
-            models.Checkin.timestamp <= period_end_utc
-        ).first()
-        
-        if existing:
+        if member.id in checked_in_ids:
             results.append(f"{name}: Already checked in this {'AM' if is_am else 'PM'}")
             continue
         
-        # Create check-in
-        checkin = models.Checkin(member_id=member.id)
-        db.add(checkin)
-        CHECKIN_COUNT.inc()
+        to_check_in.append(member)
+        checked_in_ids.add(member.id)
         results.append(f"{name}: Check-in successful")
     
+    record_checkins(db, to_check_in, location, "family_checkin")
     db.commit()
     
     logger.info("Family check-in completed", email=email, members=member_names)
@@ -645,40 +928,38 @@ async def family_checkin(request: Request, checkin_data: models.FamilyCheckin, d
 
 @app.get("/family/checkin-status/{email}")
 @limiter.limit("10/minute")
-async def family_checkin_status(request: Request, email: str, db: Session = Depends(get_db)):
+@instrumentation.query_budget(4)
+async def family_checkin_status(
+    request: Request,
+    email: str,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Return which family members have checked in and which have not for the current day and AM/PM period."""
     # Get all active family members
+    household = get_household(db, email)
     members = db.query(models.Member).filter(
-        models.Member.email == email,
+        models.Member.household_id == household.id,
         models.Member.deleted_at.is_(None)
-    ).all()
+    ).all() if household else []
     if not members:
         raise HTTPException(status_code=404, detail="No family members found with this email")
 
-    # Get Toronto time and AM/PM period
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
+    # Current AM/PM period in the location's timezone
+    now, is_am, period_start_utc, period_end_utc = current_period(pytz.timezone(location.timezone))
     today = now.date()
-    hour = now.hour
-    is_am = hour < 12
-    if is_am:
-        period_start = toronto_tz.localize(datetime.combine(today, time(0, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(11, 59, 59)))
-    else:
-        period_start = toronto_tz.localize(datetime.combine(today, time(12, 0, 0)))
-        period_end = toronto_tz.localize(datetime.combine(today, time(23, 59, 59)))
-    period_start_utc = period_start.astimezone(pytz.UTC)
-    period_end_utc = period_end.astimezone(pytz.UTC)
+
+    checked_in_ids = {row.member_id for row in db.query(models.Checkin.member_id).filter(
+        models.Checkin.member_id.in_([m.id for m in members]),
+        models.Checkin.location_id == location.id,
+        models.Checkin.timestamp >= period_start_utc,
+        models.Checkin.timestamp <= period_end_utc
+    ).distinct()}
 
     checked_in = []
     not_checked_in = []
     for member in members:
-        existing = db.query(models.Checkin).filter(
-            models.Checkin.member_id == member.id,
-            models.Checkin.timestamp >= period_start_utc,
-            models.Checkin.timestamp <= period_end_utc
-        ).first()
-        if existing:
+        if member.id in checked_in_ids:
             checked_in.append(member.name)
         else:
             not_checked_in.append(member.name)
@@ -689,15 +970,211 @@ async def family_checkin_status(request: Request, email: str, db: Session = Depe
         "date": today.isoformat()
     }
 
+@app.post("/kiosk/checkin")
+@limiter.limit("10/minute")
+@instrumentation.query_budget(10)
+async def kiosk_checkin(
+    request: Request,
+    data: models.KioskCheckin,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    """Returning-family kiosk flow in one transaction: find the family by any
+    known name (or email), add the names it doesn't have yet, check everyone in
+    and return the updated family with this period's check-in status."""
+    names = list(dict.fromkeys(n.strip() for n in data.names if n.strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="At least one name is required")
+    keys = {name.lower(): name for name in names}
+    
+    # 1. Resolve the household
+    if data.email:
+        household = get_household(db, data.email)
+    else:
+        # Oldest match of the first entered name that exists decides the family
+        matches = db.query(models.Member).filter(
+            func.lower(func.trim(models.Member.name)).in_(list(keys)),
+            models.Member.deleted_at.is_(None)
+        ).order_by(models.Member.created_at).all()
+        by_name = {}
+        for member in matches:
+            by_name.setdefault(member.name.strip().lower(), member)
+        first = next((by_name[key] for key in keys if key in by_name), None)
+        household = first.household if first else None
+    if not household:
+        raise HTTPException(status_code=404, detail="No existing members found with these names")
+    
+    # 2. Current family, then add the names it doesn't have
+    family = db.query(models.Member).filter(
+        models.Member.household_id == household.id,
+        models.Member.deleted_at.is_(None)
+    ).order_by(models.Member.created_at).all()
+    family_by_key = {m.name.strip().lower(): m for m in family}
+    new_names = [name for key, name in keys.items() if key not in family_by_key]
+    
+    added = []
+    if new_names:
+        for name, barcode in zip(new_names, generate_unique_barcodes(db, len(new_names))):
+            member = models.Member(household=household, location_id=location.id, name=name, barcode=barcode)
+            db.add(member)
+            added.append(member)
+            family_by_key[name.lower()] = member
+        db.flush()
+        MEMBER_COUNT.inc(len(added))
+    
+    # 3. One query for this period's check-ins (new members have none), one batched insert
+    now, is_am, period_start_utc, period_end_utc = current_period(pytz.timezone(location.timezone))
+    already = {row.member_id for row in db.query(models.Checkin.member_id).filter(
+        models.Checkin.member_id.in_([m.id for m in family]),
+        models.Checkin.location_id == location.id,
+        models.Checkin.timestamp >= period_start_utc,
+        models.Checkin.timestamp <= period_end_utc
+    ).distinct()} if family else set()
+    
+    results = []
+    to_check_in = []
+    for key in keys:
+        member = family_by_key[key]
+        if member.id in already:
+            results.append(f"{member.name}: Already checked in this {'AM' if is_am else 'PM'}")
+            continue
+        to_check_in.append(member)
+        already.add(member.id)
+        results.append(f"{member.name}: Check-in successful")
+    record_checkins(db, to_check_in, location, "kiosk")
+    
+    all_members = family + added
+    response = {
+        "message": "Kiosk check-in completed",
+        "email": household.email,
+        "members": [models.MemberOut.model_validate(m) for m in all_members],
+        "added": [m.name for m in added],
+        "results": results,
+        "checked_in": [m.name for m in all_members if m.id in already],
+        "not_checked_in": [m.name for m in all_members if m.id not in already],
+        "period": "AM" if is_am else "PM",
+        "date": now.date().isoformat()
+    }
+    # Serialized before commit so expired rows aren't reloaded one by one
+    db.commit()
+    
+    logger.info("Kiosk check-in completed", email=household.email, names=names, added=response["added"])
+    return response
+
 @app.get("/members")
 @limiter.limit("20/minute")
-async def get_members(request: Request, db: Session = Depends(get_db)):
-    """Get all members ordered by join date"""
-    members = db.query(models.Member).order_by(models.Member.created_at.desc()).all()
+@instrumentation.query_budget(3)
+def get_members(
+    request: Request,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    """Get all members of this location ordered by join date"""
+    if fastjson.FAST_JSON_ENABLED:
+        rows = db.execute(
+            fastjson.member_select()
+            .where(models.Member.location_id == location.id)
+            .order_by(models.Member.created_at.desc())
+            .execution_options(yield_per=fastjson.FAST_JSON_CHUNK_ROWS)
+        )
+        # The default path below returns plain dicts, so datetimes end in +00:00
+        return fastjson.stream_json(request, fastjson.encode_array(
+            (fastjson.member_dict(row) for row in rows), option=fastjson.ISOFORMAT_OPTIONS
+        ))
+    
+    members = db.query(models.Member).filter(
+        models.Member.location_id == location.id
+    ).order_by(models.Member.created_at.desc()).all()
     members_data = [models.MemberOut.model_validate(m).model_dump() for m in members]
     
     return members_data
 
+DASHBOARD_SECTIONS = ("today", "range", "stats", "members")
+# Pooled connections a dashboard request may open beyond its own; admission
+# control counts the request once, so this bounds what it really holds
+DASHBOARD_EXTRA_CONNECTIONS = int(os.getenv("DASHBOARD_EXTRA_CONNECTIONS", "1"))
+
+def run_dashboard_section(loader: Callable[[Session], Any], db: Session) -> Tuple[Any, Optional[str], float]:
+    """(data, error, milliseconds) for one section"""
+    start = monotonic()
+    try:
+        return loader(db), None, (monotonic() - start) * 1000
+    except Exception as e:
+        logger.error("Dashboard section failed", error=str(e))
+        # Leave the session usable for the next section on it
+        db.rollback()
+        return None, str(e), (monotonic() - start) * 1000
+
+def run_dashboard_sections(loaders: List[Callable[[Session], Any]], db: Optional[Session] = None) -> List[Tuple[Any, Optional[str], float]]:
+    """Sections in turn on `db`, or on one session of their own"""
+    session = db or SessionLocal()
+    try:
+        return [run_dashboard_section(loader, session) for loader in loaders]
+    finally:
+        if db is None:
+            session.close()
+
+@app.get("/admin/dashboard")
+@limiter.limit("20/minute")
+@instrumentation.query_budget(14)
+async def get_dashboard(
+    request: Request,
+    sections: str = ",".join(DASHBOARD_SECTIONS),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    group_by: str = "day",
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
+    """Dashboard sections in one response, queried concurrently on up to
+    1 + DASHBOARD_EXTRA_CONNECTIONS connections.
+
+    `sections` picks any of today, range, stats, members; range also needs
+    start_date and end_date. A failing section is reported under `errors`
+    instead of failing the others.
+    """
+    requested = list(dict.fromkeys(name.strip() for name in sections.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in DASHBOARD_SECTIONS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"sections must be a comma-separated subset of: {', '.join(DASHBOARD_SECTIONS)}")
+    if "range" in requested:
+        if start_date is None or end_date is None:
+            raise HTTPException(status_code=400, detail="start_date and end_date are required for the range section")
+        if group_by not in RANGE_GROUPINGS:
+            raise HTTPException(status_code=400, detail="group_by must be one of: day, week, month, year")
+    
+    loaders = {
+        "today": lambda session: today_checkins(session, location),
+        "range": lambda session: checkins_by_range(session, location, start_date, end_date, group_by),
+        "stats": lambda session: checkin_stats(session, location),
+        "members": lambda session: [fastjson.member_dict(row) for row in session.execute(
+            fastjson.member_select()
+            .where(models.Member.location_id == location.id)
+            .order_by(models.Member.created_at.desc())
+        )],
+    }
+    # Every SQLite session shares the one in-memory connection, so one lane there
+    lanes = 1 if IS_SQLITE else min(1 + DASHBOARD_EXTRA_CONNECTIONS, len(requested))
+    lane_sections = [requested[i::lanes] for i in range(lanes)]
+    # The request's session takes the first lane, one fresh session each of the rest
+    lane_results = await asyncio.gather(*(
+        run_in_threadpool(run_dashboard_sections, [loaders[name] for name in names], db if i == 0 else None)
+        for i, names in enumerate(lane_sections)
+    ))
+    results = dict(zip(
+        (name for names in lane_sections for name in names),
+        (result for results in lane_results for result in results)
+    ))
+    
+    content = {"timings_ms": {}, "errors": {}}
+    for name in requested:
+        data, error, elapsed_ms = results[name]
+        content[name] = data
+        content["timings_ms"][name] = round(elapsed_ms, 1)
+        if error is not None:
+            content["errors"][name] = error
+    return fastjson.json_response(request, content)
+
 class MemberUpdate(BaseModel):
     name: str
     email: str
@@ -740,6 +1217,7 @@ def calculate_streak(check_ins: List[datetime]) -> Dict:
 
 @app.get("/member/{member_id}/stats")
 @limiter.limit("30/minute")
+@instrumentation.query_budget(6)
 async def get_member_stats(request: Request, member_id: str, db: Session = Depends(get_db)):
     """Get member statistics including monthly check-ins and streaks"""
     
@@ -747,25 +1225,47 @@ async def get_member_stats(request: Request, member_id: str, db: Session = Depen
     if not is_valid_uuid(member_id):
         raise HTTPException(status_code=400, detail="Invalid member ID format")
     
+    # Single indexed lookup of the versions; the household's covers the email,
+    # and streaks and monthly counts also depend on the local date, so it is
+    # part of the ETag
+    stamp = db.query(
+        models.Member.version, models.Household.version.label("household_version"), models.Location.timezone
+    ).join(
+        models.Household, models.Member.household_id == models.Household.id
+    ).join(
+        models.Location, models.Member.location_id == models.Location.id
+    ).filter(models.Member.id == member_id).first()
+    if not stamp:
+        raise HTTPException(status_code=404, detail="Member not found")
+    
+    # Use the member's home location timezone
+    tz = pytz.timezone(stamp.timezone)
+    now = datetime.now(tz)
+    
+    etag = etags.make_etag("member-stats", member_id, stamp.version, f"h{stamp.household_version}", now.date().isoformat())
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    cached = response_cache.get(etag)
+    if cached is not None:
+        return etags.json_response(cached, etag)
+    
     # Get member
     member = db.query(models.Member).filter(models.Member.id == member_id).first()
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     
-    # Get timezone
-    tz = pytz.timezone('America/Toronto')
-    
     # Calculate start of current month
-    now = datetime.now(tz)
     start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
     # Get all check-ins for streak calculation
     all_check_ins = db.query(models.Checkin.timestamp)\
         .filter(models.Checkin.member_id == member_id)\
+        .order_by(models.Checkin.timestamp)\
         .all()
     
-    # Convert to list of datetime objects
-    check_in_dates = [c.timestamp for c in all_check_ins]
+    # Convert to list of datetime objects, oldest archived check-ins first
+    check_in_dates = archive.member_timestamps(archive.get_boundary(db), member.id)
+    check_in_dates += [c.timestamp for c in all_check_ins]
     
     # Get monthly check-ins count
     monthly_check_ins = db.query(func.count(models.Checkin.id))\
@@ -790,10 +1290,11 @@ async def get_member_stats(request: Request, member_id: str, db: Session = Depen
         "barcode": member.barcode  # Include barcode for display
     }
     
-    return stats 
+    return etags.json_response(response_cache.set(etag, stats), etag)
 
 @app.post("/member/lookup-by-name")
 @limiter.limit("10/minute")
+@instrumentation.query_budget(2)
 async def lookup_member_by_name(request: Request, data: dict = Body(...), db: Session = Depends(get_db)):
     """Look up a member by their name for check-in purposes"""
     
@@ -818,9 +1319,45 @@ async def lookup_member_by_name(request: Request, data: dict = Body(...), db: Se
         "name": member.name
     }
 
+def merge_same_name_members(db: Session, household_id) -> int:
+    """Fold active members of a household who share a name into the oldest one.
+
+    Family and kiosk check-ins pick members by name, so two active members
+    of the same name would leave one unreachable. The others' live
+    check-ins move onto the oldest and they are soft-deleted (restorable,
+    with their archived history), as migration 12 does for merged
+    households. Returns how many were folded.
+    """
+    db.flush()
+    by_name: Dict[str, List[Any]] = {}
+    for row in db.query(models.Member.id, models.Member.name).filter(
+        models.Member.household_id == household_id,
+        models.Member.deleted_at.is_(None)
+    ).order_by(models.Member.created_at, models.Member.id):
+        by_name.setdefault(row.name.strip().lower(), []).append(row.id)
+    
+    duplicates = []
+    for survivor_id, *others in by_name.values():
+        if others:
+            db.execute(
+                update(models.Checkin)
+                .where(models.Checkin.member_id.in_(others))
+                .values(member_id=survivor_id)
+            )
+            duplicates.extend(others)
+    if duplicates:
+        db.execute(
+            update(models.Member)
+            .where(models.Member.id.in_(duplicates))
+            .values(deleted_at=datetime.now(pytz.UTC))
+        )
+        logger.info("Same-name members merged", household_id=str(household_id), merged=len(duplicates))
+    return len(duplicates)
+
 @app.put("/member/{member_id}")
 @limiter.limit("5/minute")
-async def update_member(request: Request, member_id: str, update: models.MemberUpdate, db: Session = Depends(get_db)):
+@instrumentation.query_budget(8)
+async def update_member(request: Request, member_id: str, member_update: models.MemberUpdate, db: Session = Depends(get_db)):
     """Update member information"""
     # Validate UUID format
     if not is_valid_uuid(member_id):
@@ -836,24 +1373,33 @@ async def update_member(request: Request, member_id: str, update: models.MemberU
         raise HTTPException(status_code=404, detail="Member not found")
     
     # Update fields
-    if update.name is not None:
-        setattr(member, 'name', update.name)
+    if member_update.name is not None:
+        setattr(member, 'name', member_update.name)
     
-    if update.email is not None:
-        # If email is being changed, update all family members
+    if member_update.email is not None and models.normalize_email(member_update.email) != member.email:
+        # The email belongs to the household, so one UPDATE covers the whole family
         old_email = member.email
-        new_email = update.email
-        
-        # Update all family members with the same email
-        family_members = db.query(models.Member).filter(
-            models.Member.email == old_email,
-            models.Member.deleted_at.is_(None)
-        ).all()
+        new_email = models.normalize_email(member_update.email)
+        household_id = member.household_id
+        target = get_household(db, new_email)
         
-        for family_member in family_members:
-            setattr(family_member, 'email', new_email)
+        if target is None:
+            db.execute(
+                update(models.Household)
+                .where(models.Household.id == household_id)
+                .values(email=new_email)
+            )
+        else:
+            # Another family already uses this email: merge into it
+            db.execute(
+                update(models.Member)
+                .where(models.Member.household_id == household_id)
+                .values(household_id=target.id)
+            )
+            db.execute(delete(models.Household).where(models.Household.id == household_id))
+            merge_same_name_members(db, target.id)
         
-        logger.info("Family email updated", old_email=old_email, new_email=new_email, member_count=len(family_members))
+        logger.info("Family email updated", old_email=old_email, new_email=new_email, merged=target is not None)
     
     db.commit()
     db.refresh(member)
@@ -864,6 +1410,7 @@ async def update_member(request: Request, member_id: str, update: models.MemberU
 
 @app.delete("/member/{member_id}")
 @limiter.limit("5/minute")
+@instrumentation.query_budget(5)
 async def delete_member(request: Request, member_id: str, db: Session = Depends(get_db)):
     """Hard delete a member"""
     # Validate UUID format
@@ -887,6 +1434,7 @@ async def delete_member(request: Request, member_id: str, db: Session = Depends(
 
 @app.post("/member/{member_id}/restore")
 @limiter.limit("5/minute")
+@instrumentation.query_budget(4)
 async def restore_member(request: Request, member_id: str, db: Session = Depends(get_db)):
     """Restore a soft-deleted member"""
     # Validate UUID format
@@ -912,7 +1460,13 @@ async def restore_member(request: Request, member_id: str, db: Session = Depends
 
 @app.post("/family/add-members")
 @limiter.limit("10/minute")
-async def add_family_members(request: Request, add_data: dict, db: Session = Depends(get_db)):
+@instrumentation.query_budget(9)
+async def add_family_members(
+    request: Request,
+    add_data: dict,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Add new members to an existing family account"""
     email = add_data.get("email")
     new_members = add_data.get("new_members", [])
@@ -921,40 +1475,29 @@ async def add_family_members(request: Request, add_data: dict, db: Session = Dep
         raise HTTPException(status_code=400, detail="Email and new members are required")
     
     # Verify the family exists
-    existing_family = db.query(models.Member).filter(
-        models.Member.email == email,
+    household = get_household(db, email)
+    existing_family = db.query(models.Member.id).filter(
+        models.Member.household_id == household.id,
         models.Member.deleted_at.is_(None)
-    ).first()
+    ).first() if household else None
     
     if not existing_family:
         raise HTTPException(status_code=404, detail="Family not found")
     
-    # Check if any new member already exists with this email
-    existing_new_members = []
-    for member_name in new_members:
-        existing = db.query(models.Member).filter(
-            models.Member.email == email,
-            models.Member.name == member_name,
-            models.Member.deleted_at.is_(None)
-        ).first()
-        if existing:
-            existing_new_members.append(member_name)
+    # Check if any new member already exists in this household
+    existing_new_members = [row.name for row in db.query(models.Member.name).filter(
+        models.Member.household_id == household.id,
+        models.Member.name.in_(new_members),
+        models.Member.deleted_at.is_(None)
+    )]
     
     if existing_new_members:
         raise HTTPException(status_code=409, detail=f"Members already exist in this family: {', '.join(existing_new_members)}")
     
     # Add new family members
     created_members = []
-    for member_name in new_members:
-        # Generate unique barcode for each new family member
-        while True:
-            barcode = generate_barcode()
-            # Check if barcode already exists
-            existing_barcode = db.query(models.Member).filter(models.Member.barcode == barcode).first()
-            if not existing_barcode:
-                break
-        
-        member = models.Member(email=email, name=member_name, barcode=barcode)
+    for member_name, barcode in zip(new_members, generate_unique_barcodes(db, len(new_members))):
+        member = models.Member(household=household, location_id=location.id, name=member_name, barcode=barcode)
         db.add(member)
         created_members.append(member)
         MEMBER_COUNT.inc()
@@ -963,7 +1506,7 @@ async def add_family_members(request: Request, add_data: dict, db: Session = Dep
     
     # Get all family members after addition
     all_family_members = db.query(models.Member).filter(
-        models.Member.email == email,
+        models.Member.household_id == household.id,
         models.Member.deleted_at.is_(None)
     ).all()
     
@@ -977,6 +1520,7 @@ async def add_family_members(request: Request, add_data: dict, db: Session = Dep
 
 @app.get("/member/lookup-by-barcode/{barcode}")
 @limiter.limit("50/minute")  # Higher limit for scanning operations
+@instrumentation.query_budget(2)
 async def lookup_member_by_barcode(request: Request, barcode: str, db: Session = Depends(get_db)):
     """Look up a member by their barcode for scanning check-in"""
     if not barcode:
@@ -997,7 +1541,13 @@ async def lookup_member_by_barcode(request: Request, barcode: str, db: Session =
 
 @app.post("/checkin-by-barcode")
 @limiter.limit("50/minute")  # Higher limit for scanning operations
-async def checkin_by_barcode(request: Request, checkin_data: dict, db: Session = Depends(get_db)):
+@instrumentation.query_budget(7)
+async def checkin_by_barcode(
+    request: Request,
+    checkin_data: dict,
+    db: Session = Depends(get_db),
+    location: models.Location = Depends(get_location)
+):
     """Check in a member using their barcode"""
     barcode = checkin_data.get("barcode")
     
@@ -1013,31 +1563,26 @@ async def checkin_by_barcode(request: Request, checkin_data: dict, db: Session =
     if not member:
         raise HTTPException(status_code=404, detail="Member not found with this barcode")
     
-    # Get timezone for Toronto
-    toronto_tz = pytz.timezone('America/Toronto')
-    now = datetime.now(toronto_tz)
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = start_of_day + timedelta(days=1)
+    # Today in the location's timezone
+    location_tz = pytz.timezone(location.timezone)
+    start_of_day, end_of_day = local_day_bounds_utc(location_tz, datetime.now(location_tz).date())
     
-    # Check if member already checked in today (Toronto time)
+    # Check if member already checked in today at this location
     existing_checkin = db.query(models.Checkin).filter(
         models.Checkin.member_id == member.id,
+        models.Checkin.location_id == location.id,
         models.Checkin.timestamp >= start_of_day,
-        models.Checkin.timestamp < end_of_day
+        models.Checkin.timestamp <= end_of_day
     ).first()
     
     if existing_checkin:
         raise HTTPException(status_code=409, detail=f"{member.name} has already checked in today")
     
     # Create check-in record
-    checkin = models.Checkin(member_id=member.id)
-    db.add(checkin)
+    checkin = record_checkins(db, [member], location, "barcode")[0]
     db.commit()
     db.refresh(checkin)
     
-    # Update metrics
-    CHECKIN_COUNT.inc()
-    
     logger.info("Member checked in by barcode", member_id=str(member.id), barcode=barcode, checkin_id=str(checkin.id))
     
     return {
@@ -1047,6 +1592,35 @@ async def checkin_by_barcode(request: Request, checkin_data: dict, db: Session =
         "timestamp": checkin.timestamp
     }
 
+@app.get("/directory/snapshot")
+@limiter.limit("10/minute")
+@instrumentation.query_budget(2)
+async def directory_snapshot(request: Request, db: Session = Depends(get_db)):
+    """Every scannable member as gzip NDJSON, for kiosks to resolve barcodes locally"""
+    version = directory.current_version(db)
+    etag = etags.make_etag("directory", "snapshot", version)
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+    
+    # A cold build scans every member; keep it off the event loop
+    body = await run_in_threadpool(member_directory.snapshot, db, version)
+    headers = {"ETag": etag, "Cache-Control": etags.CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if fastjson.accepts_encoding(request, "gzip"):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = gzip.decompress(body)
+    return Response(content=body, media_type=directory.MEDIA_TYPE, headers=headers)
+
+@app.get("/directory/delta")
+@limiter.limit("60/minute")
+@instrumentation.query_budget(2)
+async def directory_delta(request: Request, since: int, db: Session = Depends(get_db)):
+    """Directory changes since a snapshot or delta `version`; pass the returned version next time"""
+    if since < directory.oldest_delta_version():
+        raise HTTPException(status_code=410, detail="Version too old; download a new snapshot")
+    
+    return fastjson.json_response(request, member_directory.delta(db, since))
+
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "changeme")
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecretkey")
 JWT_ALGORITHM = "HS256"
@@ -1079,4 +1653,69 @@ def admin_protected(credentials: HTTPAuthorizationCredentials = Depends(security
     token = credentials.credentials
     if not verify_jwt_token(token):
         raise HTTPException(status_code=401, detail="Invalid or missing token")
-    return {"message": "You are an authenticated admin!"} 
\ No newline at end of file
+    return {"message": "You are an authenticated admin!"}
+
+def require_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not verify_jwt_token(credentials.credentials):
+        raise HTTPException(status_code=401, detail="Invalid or missing token")
+
+@app.get("/admin/profiler")
+def profiler_status(_: None = Depends(require_admin)):
+    """Profiler state and the captured profiles, newest first"""
+    return {**profiler.status(), "profiles": profiler.list_profiles()}
+
+@app.post("/admin/profiler")
+def arm_profiler(settings: models.ProfilerArm, _: None = Depends(require_admin)):
+    """Profile the next N requests and/or any request slower than slow_ms"""
+    if not settings.next_requests and settings.slow_ms is None:
+        raise HTTPException(status_code=400, detail="Set next_requests and/or slow_ms")
+    profiler.arm(settings.next_requests, settings.slow_ms, settings.interval_ms, settings.duration_seconds)
+    return profiler.status()
+
+@app.delete("/admin/profiler")
+def disarm_profiler(_: None = Depends(require_admin)):
+    profiler.disarm()
+    return profiler.status()
+
+@app.get("/admin/profiler/profiles/{profile_id}")
+def download_profile(profile_id: str, _: None = Depends(require_admin)):
+    """Folded stacks for flamegraph.pl, speedscope or inferno"""
+    folded = profiler.folded(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=folded,
+        media_type=profiling.FOLDED_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+    )
+
+@app.get("/locations", response_model=List[models.LocationOut])
+@limiter.limit("30/minute")
+@instrumentation.query_budget(2)
+async def list_locations(request: Request, db: Session = Depends(get_db)):
+    """List gyms; kiosks pick one via the X-Location header or ?location="""
+    return db.query(models.Location).order_by(models.Location.name).all()
+
+@app.post("/admin/locations", response_model=models.LocationOut)
+@limiter.limit("10/minute")
+@instrumentation.query_budget(4)
+async def create_location(
+    request: Request,
+    location_data: models.LocationCreate,
+    db: Session = Depends(get_db),
+    _: None = Depends(require_admin)
+):
+    """Create a new gym location with its own timezone"""
+    if location_data.timezone not in pytz.all_timezones_set:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {location_data.timezone}")
+    if db.query(models.Location.id).filter(models.Location.slug == location_data.slug).first():
+        raise HTTPException(status_code=409, detail="Location already exists")
+    
+    location = models.Location(slug=location_data.slug, name=location_data.name, timezone=location_data.timezone)
+    db.add(location)
+    db.commit()
+    db.refresh(location)
+    
+    logger.info("Location created", location_id=str(location.id), slug=location.slug, timezone=location.timezone)
+    
+    return location
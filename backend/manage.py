@@ -0,0 +1,132 @@
+"""Operational commands, run outside the API processes.
+
+    python manage.py migrate   # apply pending schema migrations
+    python manage.py seed      # insert sample members into an empty database
+    python manage.py rebuild-rollups  # recompute analytics rollups from checkins and the archive
+    python manage.py archive   # move old check-ins to Parquet cold storage
+    python manage.py outbox    # deliver pending outbox events (--once to exit when drained)
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+import pytz
+import structlog
+import models
+import migrations
+import archive
+import outbox
+from sqlalchemy import bindparam, text
+from database import engine, SessionLocal, IS_SQLITE, create_sqlite_schema
+from models import generate_barcode
+from portable import GUID
+
+logger = structlog.get_logger()
+
+def cmd_migrate(args):
+    if IS_SQLITE:
+        # Migrations are Postgres SQL; SQLite gets the equivalent schema from the models
+        create_sqlite_schema(engine)
+        print("Created SQLite schema from models")
+        return
+    applied = migrations.migrate(engine)
+    version = migrations.current_version(engine)
+    print(f"Applied {len(applied)} migration(s); schema at version {version}")
+
+def cmd_seed(args):
+    db = SessionLocal()
+    try:
+        if db.query(models.Member.id).first() is not None and not args.force:
+            print("Members already exist; skipping seed (use --force to insert anyway)")
+            return
+        location = db.query(models.Location).filter(models.Location.slug == "main").first()
+        if location is None:
+            location = models.Location(slug="main", name="Main gym", timezone="America/Toronto")
+        household1 = models.Household(email="john.doe@example.com")
+        household2 = models.Household(email="jane.smith@example.com")
+        member1 = models.Member(household=household1, location=location, name="John Doe", barcode=generate_barcode())
+        member2 = models.Member(household=household2, location=location, name="Jane Smith", barcode=generate_barcode())
+        db.add_all([member1, member2])
+        db.commit()
+        logger.info("Sample data inserted")
+        print("Inserted 2 sample members")
+    finally:
+        db.close()
+
+def cmd_rebuild_rollups(args):
+    with engine.begin() as conn:
+        # Lock out concurrent check-ins (and the archive job's delete) so the rebuilt counts match exactly
+        conn.execute(text("LOCK TABLE checkins IN SHARE MODE"))
+        conn.execute(text("TRUNCATE checkin_hourly_rollup"))
+        result = conn.execute(text("""
+            INSERT INTO checkin_hourly_rollup (location_id, local_hour, count)
+            SELECT c.location_id, date_trunc('hour', c.timestamp AT TIME ZONE l.timezone), count(*)
+            FROM checkins c
+            JOIN locations l ON l.id = c.location_id
+            GROUP BY 1, 2
+        """))
+        rows = result.rowcount
+
+        # Archived check-ins left the table without touching the rollup; count them back in
+        boundary = archive.get_boundary(conn)
+        archived = [
+            {"location_id": location.id, "local_hour": hour, "count": count}
+            for location in conn.execute(text("SELECT id, timezone FROM locations").columns(id=GUID))
+            for hour, count in archive.hourly_counts(boundary, location.id, location.timezone).items()
+        ]
+        if archived:
+            # An hour straddling the boundary already has its live rows
+            conn.execute(text("""
+                INSERT INTO checkin_hourly_rollup (location_id, local_hour, count)
+                VALUES (:location_id, :local_hour, :count)
+                ON CONFLICT (location_id, local_hour)
+                DO UPDATE SET count = checkin_hourly_rollup.count + EXCLUDED.count
+            """).bindparams(bindparam("location_id", type_=GUID)), archived)
+    print(f"Rebuilt {rows} hourly rollup rows from checkins and {len(archived)} from the archive")
+
+def cmd_archive(args):
+    cutoff = archive.archive_cutoff()
+    if args.before:
+        cutoff = min(cutoff, datetime.strptime(args.before, "%Y-%m-%d").replace(tzinfo=pytz.UTC))
+    result = archive.run_archive(engine, cutoff)
+    print(f"Archived {result['archived']} check-ins; boundary is {result['boundary'].isoformat()}")
+
+def cmd_outbox(args):
+    worker = outbox.OutboxWorker(engine)
+    if args.once:
+        print(f"Processed {worker.drain()} outbox event(s)")
+        return
+    try:
+        while True:
+            worker.drain()
+            time.sleep(outbox.OUTBOX_POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Muay Thai check-in management commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("migrate", help="Apply pending schema migrations").set_defaults(func=cmd_migrate)
+
+    seed = subparsers.add_parser("seed", help="Insert sample members")
+    seed.add_argument("--force", action="store_true", help="Seed even if members exist")
+    seed.set_defaults(func=cmd_seed)
+
+    subparsers.add_parser(
+        "rebuild-rollups", help="Recompute analytics rollups from checkins and the archive"
+    ).set_defaults(func=cmd_rebuild_rollups)
+
+    archive_parser = subparsers.add_parser("archive", help="Move old check-ins to Parquet cold storage")
+    archive_parser.add_argument("--before", help="Archive only check-ins before this date (YYYY-MM-DD)")
+    archive_parser.set_defaults(func=cmd_archive)
+
+    outbox_parser = subparsers.add_parser("outbox", help="Deliver pending outbox events to consumers")
+    outbox_parser.add_argument("--once", action="store_true", help="Exit once nothing is pending")
+    outbox_parser.set_defaults(func=cmd_outbox)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
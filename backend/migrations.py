@@ -0,0 +1,557 @@
+"""Versioned schema migrations.
+
+Each migration is applied once, in order, inside its own transaction and
+recorded in the schema_migrations table. Run with `python manage.py migrate`
+as a release step; the API never touches the schema on startup.
+"""
+from typing import List
+from sqlalchemy import text
+import structlog
+
+logger = structlog.get_logger()
+
+# Advisory lock key so concurrent deploys never migrate at the same time
+MIGRATION_LOCK_ID = 7420_0001
+
+# Baseline schema. Uses IF NOT EXISTS so databases previously created by
+# metadata.create_all() are adopted without changes.
+INITIAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id UUID PRIMARY KEY,
+    email VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    barcode VARCHAR,
+    active BOOLEAN,
+    deleted_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_members_email ON members (email);
+CREATE INDEX IF NOT EXISTS ix_members_name ON members (name);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_members_barcode ON members (barcode);
+CREATE INDEX IF NOT EXISTS ix_members_active ON members (active);
+CREATE INDEX IF NOT EXISTS ix_members_deleted_at ON members (deleted_at);
+CREATE INDEX IF NOT EXISTS ix_members_created_at ON members (created_at);
+CREATE INDEX IF NOT EXISTS idx_member_email_active ON members (email, active);
+CREATE INDEX IF NOT EXISTS idx_member_created_active ON members (created_at, active);
+CREATE INDEX IF NOT EXISTS idx_member_email_deleted ON members (email, deleted_at);
+
+CREATE TABLE IF NOT EXISTS checkins (
+    id UUID PRIMARY KEY,
+    member_id UUID NOT NULL REFERENCES members (id),
+    timestamp TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_checkins_member_id ON checkins (member_id);
+CREATE INDEX IF NOT EXISTS ix_checkins_timestamp ON checkins (timestamp);
+CREATE INDEX IF NOT EXISTS idx_checkin_member_timestamp ON checkins (member_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_checkin_timestamp_desc ON checkins (timestamp);
+CREATE INDEX IF NOT EXISTS idx_checkin_date ON checkins (timestamp);
+"""
+
+# Replace per-member email strings with a households table
+HOUSEHOLDS = """
+CREATE TABLE IF NOT EXISTS households (
+    id UUID PRIMARY KEY,
+    email VARCHAR NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_households_email ON households (email);
+
+ALTER TABLE members ADD COLUMN IF NOT EXISTS household_id UUID REFERENCES households (id);
+
+INSERT INTO households (id, email, created_at)
+SELECT gen_random_uuid(), email, min(created_at)
+FROM members
+GROUP BY email
+ON CONFLICT (email) DO NOTHING;
+
+UPDATE members m
+SET household_id = h.id
+FROM households h
+WHERE h.email = m.email AND m.household_id IS NULL;
+
+ALTER TABLE members ALTER COLUMN household_id SET NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_members_household_id ON members (household_id);
+CREATE INDEX IF NOT EXISTS idx_member_household_deleted ON members (household_id, deleted_at);
+
+DROP INDEX IF EXISTS idx_member_email_active;
+DROP INDEX IF EXISTS idx_member_email_deleted;
+DROP INDEX IF EXISTS ix_members_email;
+ALTER TABLE members DROP COLUMN IF EXISTS email;
+"""
+
+# Drop duplicate/overlapping indexes and index only active members
+INDEX_AUDIT = """
+DROP INDEX IF EXISTS ix_checkins_timestamp;
+DROP INDEX IF EXISTS idx_checkin_timestamp_desc;
+DROP INDEX IF EXISTS idx_checkin_date;
+DROP INDEX IF EXISTS ix_checkins_member_id;
+CREATE INDEX IF NOT EXISTS idx_checkin_timestamp_brin ON checkins USING brin (timestamp);
+
+DROP INDEX IF EXISTS ix_members_name;
+DROP INDEX IF EXISTS ix_members_active;
+DROP INDEX IF EXISTS ix_members_deleted_at;
+DROP INDEX IF EXISTS idx_member_created_active;
+DROP INDEX IF EXISTS idx_member_household_deleted;
+CREATE INDEX IF NOT EXISTS idx_member_household_name_active
+    ON members (household_id, name) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_member_name_lookup_active
+    ON members (lower(trim(name))) WHERE deleted_at IS NULL;
+
+ANALYZE members;
+ANALYZE checkins;
+"""
+
+# Hourly rollup of check-ins in gym-local time, kept current by a trigger so
+# every insert path (API, imports, manual fixes) is counted exactly once
+HOURLY_ROLLUP = """
+CREATE TABLE IF NOT EXISTS checkin_hourly_rollup (
+    local_hour TIMESTAMP WITHOUT TIME ZONE PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION checkin_hourly_rollup_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO checkin_hourly_rollup (local_hour, count)
+        VALUES (date_trunc('hour', NEW.timestamp AT TIME ZONE 'America/Toronto'), 1)
+        ON CONFLICT (local_hour) DO UPDATE SET count = checkin_hourly_rollup.count + 1;
+        RETURN NEW;
+    END IF;
+    UPDATE checkin_hourly_rollup
+    SET count = count - 1
+    WHERE local_hour = date_trunc('hour', OLD.timestamp AT TIME ZONE 'America/Toronto');
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS checkin_hourly_rollup_trigger ON checkins;
+CREATE TRIGGER checkin_hourly_rollup_trigger
+    AFTER INSERT OR DELETE ON checkins
+    FOR EACH ROW EXECUTE FUNCTION checkin_hourly_rollup_apply();
+
+TRUNCATE checkin_hourly_rollup;
+INSERT INTO checkin_hourly_rollup (local_hour, count)
+SELECT date_trunc('hour', timestamp AT TIME ZONE 'America/Toronto'), count(*)
+FROM checkins
+GROUP BY 1;
+"""
+
+# Per-minute check-in buckets for the live occupancy window
+OCCUPANCY_BUCKETS = """
+CREATE TABLE IF NOT EXISTS occupancy_buckets (
+    bucket_start TIMESTAMP WITH TIME ZONE PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION occupancy_buckets_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO occupancy_buckets (bucket_start, count)
+        VALUES (date_trunc('minute', NEW.timestamp), 1)
+        ON CONFLICT (bucket_start) DO UPDATE SET count = occupancy_buckets.count + 1;
+        RETURN NEW;
+    END IF;
+    UPDATE occupancy_buckets
+    SET count = count - 1
+    WHERE bucket_start = date_trunc('minute', OLD.timestamp);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS occupancy_buckets_trigger ON checkins;
+CREATE TRIGGER occupancy_buckets_trigger
+    AFTER INSERT OR DELETE ON checkins
+    FOR EACH ROW EXECUTE FUNCTION occupancy_buckets_apply();
+
+INSERT INTO occupancy_buckets (bucket_start, count)
+SELECT date_trunc('minute', timestamp), count(*)
+FROM checkins
+WHERE timestamp > now() - interval '24 hours'
+GROUP BY 1
+ON CONFLICT (bucket_start) DO NOTHING;
+"""
+
+# Locations with their own timezone; existing data belongs to the 'main' gym
+LOCATIONS = """
+CREATE TABLE IF NOT EXISTS locations (
+    id UUID PRIMARY KEY,
+    slug VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    timezone VARCHAR NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_locations_slug ON locations (slug);
+INSERT INTO locations (id, slug, name, timezone)
+VALUES (gen_random_uuid(), 'main', 'Main gym', 'America/Toronto')
+ON CONFLICT (slug) DO NOTHING;
+
+ALTER TABLE members ADD COLUMN IF NOT EXISTS location_id UUID REFERENCES locations (id);
+UPDATE members SET location_id = (SELECT id FROM locations WHERE slug = 'main') WHERE location_id IS NULL;
+ALTER TABLE members ALTER COLUMN location_id SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_member_location_created ON members (location_id, created_at);
+
+ALTER TABLE checkins ADD COLUMN IF NOT EXISTS location_id UUID REFERENCES locations (id);
+UPDATE checkins SET location_id = (SELECT id FROM locations WHERE slug = 'main') WHERE location_id IS NULL;
+ALTER TABLE checkins ALTER COLUMN location_id SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_checkin_location_timestamp ON checkins (location_id, timestamp);
+
+ALTER TABLE checkin_hourly_rollup ADD COLUMN IF NOT EXISTS location_id UUID REFERENCES locations (id);
+UPDATE checkin_hourly_rollup SET location_id = (SELECT id FROM locations WHERE slug = 'main') WHERE location_id IS NULL;
+ALTER TABLE checkin_hourly_rollup DROP CONSTRAINT checkin_hourly_rollup_pkey;
+ALTER TABLE checkin_hourly_rollup ADD PRIMARY KEY (location_id, local_hour);
+
+ALTER TABLE occupancy_buckets ADD COLUMN IF NOT EXISTS location_id UUID REFERENCES locations (id);
+UPDATE occupancy_buckets SET location_id = (SELECT id FROM locations WHERE slug = 'main') WHERE location_id IS NULL;
+ALTER TABLE occupancy_buckets DROP CONSTRAINT occupancy_buckets_pkey;
+ALTER TABLE occupancy_buckets ADD PRIMARY KEY (location_id, bucket_start);
+
+CREATE OR REPLACE FUNCTION checkin_hourly_rollup_apply() RETURNS trigger AS $$
+DECLARE
+    tz VARCHAR;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT timezone INTO tz FROM locations WHERE id = NEW.location_id;
+        INSERT INTO checkin_hourly_rollup (location_id, local_hour, count)
+        VALUES (NEW.location_id, date_trunc('hour', NEW.timestamp AT TIME ZONE tz), 1)
+        ON CONFLICT (location_id, local_hour) DO UPDATE SET count = checkin_hourly_rollup.count + 1;
+        RETURN NEW;
+    END IF;
+    SELECT timezone INTO tz FROM locations WHERE id = OLD.location_id;
+    UPDATE checkin_hourly_rollup
+    SET count = count - 1
+    WHERE location_id = OLD.location_id
+      AND local_hour = date_trunc('hour', OLD.timestamp AT TIME ZONE tz);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION occupancy_buckets_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO occupancy_buckets (location_id, bucket_start, count)
+        VALUES (NEW.location_id, date_trunc('minute', NEW.timestamp), 1)
+        ON CONFLICT (location_id, bucket_start) DO UPDATE SET count = occupancy_buckets.count + 1;
+        RETURN NEW;
+    END IF;
+    UPDATE occupancy_buckets
+    SET count = count - 1
+    WHERE location_id = OLD.location_id
+      AND bucket_start = date_trunc('minute', OLD.timestamp);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Archive boundary, and rollup triggers that ignore deletes made by the
+# archive job so heatmap counts keep archived check-ins
+CHECKIN_ARCHIVE = """
+CREATE TABLE IF NOT EXISTS checkin_archive_state (
+    id INTEGER PRIMARY KEY,
+    boundary TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION checkin_hourly_rollup_apply() RETURNS trigger AS $$
+DECLARE
+    tz VARCHAR;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT timezone INTO tz FROM locations WHERE id = NEW.location_id;
+        INSERT INTO checkin_hourly_rollup (location_id, local_hour, count)
+        VALUES (NEW.location_id, date_trunc('hour', NEW.timestamp AT TIME ZONE tz), 1)
+        ON CONFLICT (location_id, local_hour) DO UPDATE SET count = checkin_hourly_rollup.count + 1;
+        RETURN NEW;
+    END IF;
+    IF current_setting('checkins.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    SELECT timezone INTO tz FROM locations WHERE id = OLD.location_id;
+    UPDATE checkin_hourly_rollup
+    SET count = count - 1
+    WHERE location_id = OLD.location_id
+      AND local_hour = date_trunc('hour', OLD.timestamp AT TIME ZONE tz);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION occupancy_buckets_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO occupancy_buckets (location_id, bucket_start, count)
+        VALUES (NEW.location_id, date_trunc('minute', NEW.timestamp), 1)
+        ON CONFLICT (location_id, bucket_start) DO UPDATE SET count = occupancy_buckets.count + 1;
+        RETURN NEW;
+    END IF;
+    IF current_setting('checkins.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    UPDATE occupancy_buckets
+    SET count = count - 1
+    WHERE location_id = OLD.location_id
+      AND bucket_start = date_trunc('minute', OLD.timestamp);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Version stamps for ETags: check-ins and edits bump the member, member
+# edits (not check-ins) and email changes bump the household
+VERSION_STAMPS = """
+ALTER TABLE members ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE households ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION members_bump_version() RETURNS trigger AS $$
+BEGIN
+    IF NEW.version = OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS members_bump_version_trigger ON members;
+CREATE TRIGGER members_bump_version_trigger
+    BEFORE UPDATE ON members
+    FOR EACH ROW EXECUTE FUNCTION members_bump_version();
+
+CREATE OR REPLACE FUNCTION households_bump_version() RETURNS trigger AS $$
+BEGIN
+    IF NEW.version = OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS households_bump_version_trigger ON households;
+CREATE TRIGGER households_bump_version_trigger
+    BEFORE UPDATE ON households
+    FOR EACH ROW EXECUTE FUNCTION households_bump_version();
+
+CREATE OR REPLACE FUNCTION members_bump_household_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        -- Version-only updates come from check-ins and don't change the family list
+        IF TG_OP = 'UPDATE' AND (NEW.household_id, NEW.location_id, NEW.name, NEW.barcode, NEW.active, NEW.deleted_at)
+                IS NOT DISTINCT FROM (OLD.household_id, OLD.location_id, OLD.name, OLD.barcode, OLD.active, OLD.deleted_at) THEN
+            RETURN NEW;
+        END IF;
+        UPDATE households SET version = version + 1 WHERE id = OLD.household_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF TG_OP = 'INSERT' OR NEW.household_id IS DISTINCT FROM OLD.household_id THEN
+            UPDATE households SET version = version + 1 WHERE id = NEW.household_id;
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS members_bump_household_version_trigger ON members;
+CREATE TRIGGER members_bump_household_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON members
+    FOR EACH ROW EXECUTE FUNCTION members_bump_household_version();
+
+CREATE OR REPLACE FUNCTION checkins_bump_member_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND current_setting('checkins.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        UPDATE members SET version = version + 1 WHERE id = NEW.member_id;
+        RETURN NEW;
+    END IF;
+    UPDATE members SET version = version + 1 WHERE id = OLD.member_id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS checkins_bump_member_version_trigger ON checkins;
+CREATE TRIGGER checkins_bump_member_version_trigger
+    AFTER INSERT OR DELETE ON checkins
+    FOR EACH ROW EXECUTE FUNCTION checkins_bump_member_version();
+"""
+
+IDEMPOTENCY_KEYS = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(255) NOT NULL,
+    endpoint VARCHAR NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    content_type VARCHAR,
+    body BYTEA,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (key, endpoint)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at);
+"""
+
+OUTBOX_EVENTS = """
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    processed_at TIMESTAMP WITH TIME ZONE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    delivered_to JSONB,
+    next_attempt_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Workers only ever scan pending events, oldest first
+CREATE INDEX IF NOT EXISTS idx_outbox_events_pending ON outbox_events (id) WHERE processed_at IS NULL;
+"""
+
+# Kiosk directory sync: updated_at moves only when a field kiosks cache
+# changes, and hard deletes leave a tombstone. clock_timestamp() rather than
+# now() so long transactions stamp close to their commit.
+DIRECTORY_SYNC = """
+ALTER TABLE members ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();
+ALTER TABLE members ALTER COLUMN updated_at SET DEFAULT clock_timestamp();
+CREATE INDEX IF NOT EXISTS idx_member_updated_at ON members (updated_at);
+
+CREATE OR REPLACE FUNCTION members_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    IF (NEW.household_id, NEW.name, NEW.barcode, NEW.deleted_at)
+            IS DISTINCT FROM (OLD.household_id, OLD.name, OLD.barcode, OLD.deleted_at) THEN
+        NEW.updated_at := clock_timestamp();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS members_touch_updated_at_trigger ON members;
+CREATE TRIGGER members_touch_updated_at_trigger
+    BEFORE UPDATE ON members
+    FOR EACH ROW EXECUTE FUNCTION members_touch_updated_at();
+
+CREATE TABLE IF NOT EXISTS member_tombstones (
+    member_id UUID PRIMARY KEY,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp()
+);
+CREATE INDEX IF NOT EXISTS ix_member_tombstones_deleted_at ON member_tombstones (deleted_at);
+
+CREATE OR REPLACE FUNCTION members_record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO member_tombstones (member_id) VALUES (OLD.id)
+    ON CONFLICT (member_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS members_record_tombstone_trigger ON members;
+CREATE TRIGGER members_record_tombstone_trigger
+    AFTER DELETE ON members
+    FOR EACH ROW EXECUTE FUNCTION members_record_tombstone();
+"""
+
+# Emails are stored as lower(trim(email)), so the unique index on
+# households.email is the case-insensitive lookup. Households whose emails
+# differ only in case or padding are merged into the oldest one first.
+# Family and kiosk check-ins pick members by name, so a merged household
+# must not end up with two active members of the same name: the oldest is
+# kept, the others' live check-ins move onto it and they are soft-deleted
+# (restorable, with their archived history).
+NORMALIZED_EMAILS = """
+CREATE TEMP TABLE household_merges ON COMMIT DROP AS
+SELECT id, first_value(id) OVER (
+    PARTITION BY lower(trim(email)) ORDER BY created_at NULLS LAST, id
+) AS survivor_id
+FROM households;
+DELETE FROM household_merges WHERE id = survivor_id;
+
+UPDATE members m
+SET household_id = hm.survivor_id
+FROM household_merges hm
+WHERE m.household_id = hm.id;
+
+CREATE TEMP TABLE member_merges ON COMMIT DROP AS
+SELECT id, first_value(id) OVER (
+    PARTITION BY household_id, lower(trim(name)) ORDER BY created_at NULLS LAST, id
+) AS survivor_id
+FROM members
+WHERE deleted_at IS NULL
+  AND household_id IN (SELECT survivor_id FROM household_merges);
+DELETE FROM member_merges WHERE id = survivor_id;
+
+UPDATE checkins c
+SET member_id = mm.survivor_id
+FROM member_merges mm
+WHERE c.member_id = mm.id;
+
+UPDATE members m
+SET deleted_at = now()
+FROM member_merges mm
+WHERE m.id = mm.id;
+
+DELETE FROM households h
+USING household_merges hm
+WHERE h.id = hm.id;
+
+UPDATE households SET email = lower(trim(email)) WHERE email <> lower(trim(email));
+
+ALTER TABLE households DROP CONSTRAINT IF EXISTS households_email_normalized;
+ALTER TABLE households ADD CONSTRAINT households_email_normalized CHECK (email = lower(trim(email)));
+ANALYZE households;
+"""
+
+# (version, name, SQL) in application order. Never edit a released entry;
+# add a new one instead.
+MIGRATIONS = [
+    (1, "initial schema", INITIAL_SCHEMA),
+    (2, "households", HOUSEHOLDS),
+    (3, "index audit", INDEX_AUDIT),
+    (4, "checkin hourly rollup", HOURLY_ROLLUP),
+    (5, "occupancy buckets", OCCUPANCY_BUCKETS),
+    (6, "locations", LOCATIONS),
+    (7, "checkin archive", CHECKIN_ARCHIVE),
+    (8, "version stamps", VERSION_STAMPS),
+    (9, "idempotency keys", IDEMPOTENCY_KEYS),
+    (10, "outbox events", OUTBOX_EVENTS),
+    (11, "directory sync", DIRECTORY_SYNC),
+    (12, "normalized emails", NORMALIZED_EMAILS),
+]
+
+def applied_versions(conn) -> set:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def migrate(engine) -> List[int]:
+    """Apply all pending migrations and return the versions applied"""
+    applied = []
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            with engine.begin() as conn:
+                done = applied_versions(conn)
+            for version, name, sql in MIGRATIONS:
+                if version in done:
+                    continue
+                with engine.begin() as conn:
+                    if callable(sql):
+                        sql(conn)
+                    else:
+                        conn.exec_driver_sql(sql)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                        {"version": version, "name": name}
+                    )
+                logger.info("Migration applied", version=version, name=name)
+                applied.append(version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            lock_conn.commit()
+    return applied
+
+def current_version(engine) -> int:
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return max(done, default=0)
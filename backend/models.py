@@ -1,10 +1,11 @@
 import uuid
 from datetime import datetime
 import pytz
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Index
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
-from pydantic import BaseModel, EmailStr
+from sqlalchemy import Column, String, Text, Boolean, DateTime, Integer, BigInteger, LargeBinary, JSON, ForeignKey, Index, CheckConstraint, func, text
+from portable import GUID, UTCDateTime
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.ext.associationproxy import association_proxy
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from database import Base
 
@@ -14,36 +15,141 @@ def generate_barcode():
     # Generate a 12-digit number starting with 1 (to avoid leading zeros issues)
     return str(random.randint(100000000000, 999999999999))
 
+def normalize_email(email: str) -> str:
+    """Canonical form households are stored and looked up by"""
+    return email.strip().lower()
+
+class Location(Base):
+    """A gym; check-ins, AM/PM periods and admin aggregates are scoped to one"""
+    __tablename__ = "locations"
+    id = Column(GUID, primary_key=True, default=uuid.uuid4)
+    slug = Column(String, nullable=False, unique=True, index=True)
+    name = Column(String, nullable=False)
+    timezone = Column(String, nullable=False, default="America/Toronto")
+    created_at = Column(UTCDateTime, default=lambda: datetime.now(pytz.UTC))
+
+class Household(Base):
+    """A family account; members sharing an email belong to one household"""
+    __tablename__ = "households"
+    id = Column(GUID, primary_key=True, default=uuid.uuid4)
+    email = Column(String, nullable=False, unique=True, index=True)
+    created_at = Column(UTCDateTime, default=lambda: datetime.now(pytz.UTC))
+    # Bumped by triggers whenever the household or any of its members is edited
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    members = relationship("Member", back_populates="household")
+
+    # Emails differing only in case are one family, so the unique index on
+    # the canonical form is also the case-insensitive lookup index
+    __table_args__ = (
+        CheckConstraint("email = lower(trim(email))", name="households_email_normalized"),
+    )
+
+    @validates("email")
+    def _normalize_email(self, key, email):
+        return normalize_email(email)
+
 class Member(Base):
     __tablename__ = "members"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    email = Column(String, nullable=False, index=True)  # Removed unique=True to allow multiple members per email
-    name = Column(String, nullable=False, index=True)
+    id = Column(GUID, primary_key=True, default=uuid.uuid4)
+    household_id = Column(GUID, ForeignKey("households.id"), nullable=False, index=True)
+    location_id = Column(GUID, ForeignKey("locations.id"), nullable=False)  # Home gym
+    name = Column(String, nullable=False)
     barcode = Column(String, nullable=True, unique=True, index=True)  # Unique barcode for scanning
-    active = Column(Boolean, default=True, index=True)
-    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True)  # Soft delete support
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(pytz.UTC), index=True)
+    active = Column(Boolean, default=True)
+    deleted_at = Column(UTCDateTime, nullable=True)  # Soft delete support
+    created_at = Column(UTCDateTime, default=lambda: datetime.now(pytz.UTC), index=True)
+    # Bumped by triggers on every edit and check-in; drives profile ETags
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    # Set by the database on insert and whenever a directory field changes; drives kiosk deltas
+    updated_at = Column(UTCDateTime, nullable=False, server_default=func.now())
     checkins = relationship("Checkin", back_populates="member")
+    # Always joined so member.email never costs an extra query
+    household = relationship("Household", back_populates="members", lazy="joined", innerjoin=True)
+    location = relationship("Location")
+    # Email lives on the household; read-only here
+    email = association_proxy("household", "email")
     
-    # Composite indexes for common queries
+    # Hot lookups only ever want active members, so index just those rows
     __table_args__ = (
-        Index('idx_member_email_active', 'email', 'active'),
-        Index('idx_member_created_active', 'created_at', 'active'),
-        Index('idx_member_email_deleted', 'email', 'deleted_at'),  # For family queries
+        Index('idx_member_household_name_active', 'household_id', 'name',
+              postgresql_where=text('deleted_at IS NULL')),  # Family queries
+        Index('idx_member_name_lookup_active', func.lower(func.trim(name)),
+              postgresql_where=text('deleted_at IS NULL')),  # Lookup by name
+        Index('idx_member_location_created', 'location_id', 'created_at'),  # Per-location listings
+        Index('idx_member_updated_at', 'updated_at'),  # Directory deltas
     )
 
 class Checkin(Base):
     __tablename__ = "checkins"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    member_id = Column(UUID(as_uuid=True), ForeignKey("members.id"), nullable=False, index=True)
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(pytz.UTC), index=True)
+    id = Column(GUID, primary_key=True, default=uuid.uuid4)
+    member_id = Column(GUID, ForeignKey("members.id"), nullable=False)
+    location_id = Column(GUID, ForeignKey("locations.id"), nullable=False)
+    timestamp = Column(UTCDateTime, default=lambda: datetime.now(pytz.UTC))
     member = relationship("Member", back_populates="checkins")
     
-    # Composite indexes for common queries
+    # Checkins are append-only, so timestamp correlates with physical order and a
+    # BRIN index covers range scans at a fraction of a btree's size and write cost.
+    # (member_id, timestamp) also serves member_id-only lookups and the FK.
+    # (location_id, timestamp) keeps per-location ranges independent of other gyms.
     __table_args__ = (
         Index('idx_checkin_member_timestamp', 'member_id', 'timestamp'),
-        Index('idx_checkin_timestamp_desc', 'timestamp', postgresql_using='btree'),
-        Index('idx_checkin_date', 'timestamp', postgresql_using='btree'),
+        Index('idx_checkin_location_timestamp', 'location_id', 'timestamp'),
+        Index('idx_checkin_timestamp_brin', 'timestamp', postgresql_using='brin'),
+    )
+
+class CheckinHourlyRollup(Base):
+    """Check-in counts per gym-local hour, maintained by a trigger on checkins"""
+    __tablename__ = "checkin_hourly_rollup"
+    location_id = Column(GUID, ForeignKey("locations.id"), primary_key=True)
+    local_hour = Column(DateTime(timezone=False), primary_key=True)  # Location wall-clock hour
+    count = Column(Integer, nullable=False, default=0)
+
+class OccupancyBucket(Base):
+    """Check-ins per UTC minute, maintained by a trigger on checkins"""
+    __tablename__ = "occupancy_buckets"
+    location_id = Column(GUID, ForeignKey("locations.id"), primary_key=True)
+    bucket_start = Column(UTCDateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CheckinArchiveState(Base):
+    """Single row: check-ins before `boundary` live in Parquet (see archive.py)"""
+    __tablename__ = "checkin_archive_state"
+    id = Column(Integer, primary_key=True, default=1)
+    boundary = Column(UTCDateTime, nullable=False)
+
+class IdempotencyKey(Base):
+    """Stored response for an Idempotency-Key (see idempotency.py); NULL status means in progress"""
+    __tablename__ = "idempotency_keys"
+    key = Column(String(255), primary_key=True)
+    endpoint = Column(String, primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer)
+    content_type = Column(String)
+    body = Column(LargeBinary)
+    created_at = Column(UTCDateTime, nullable=False, server_default=func.now(), index=True)
+
+class MemberTombstone(Base):
+    """Left behind by a hard-deleted member so directory deltas can report it"""
+    __tablename__ = "member_tombstones"
+    member_id = Column(GUID, primary_key=True)
+    deleted_at = Column(UTCDateTime, nullable=False, server_default=func.now(), index=True)
+
+class OutboxEvent(Base):
+    """Side effect queued in the same transaction as its change (see outbox.py)"""
+    __tablename__ = "outbox_events"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(UTCDateTime, nullable=False, default=lambda: datetime.now(pytz.UTC))
+    processed_at = Column(UTCDateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_error = Column(Text, nullable=True)
+    # Consumers that have taken the event, and when a failed one is next tried
+    delivered_to = Column(JSON, nullable=True)
+    next_attempt_at = Column(UTCDateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_outbox_events_pending', 'id', postgresql_where=text('processed_at IS NULL')),
     )
 
 # Pydantic Schemas
@@ -61,6 +167,8 @@ class MemberUpdate(BaseModel):
 
 class MemberOut(MemberBase):
     id: uuid.UUID
+    household_id: Optional[uuid.UUID] = None
+    location_id: Optional[uuid.UUID] = None
     barcode: Optional[str] = None
     created_at: datetime
     deleted_at: Optional[datetime] = None
@@ -80,6 +188,16 @@ class FamilyCheckin(BaseModel):
     email: str
     member_names: List[str]  # Names of members to check in
 
+class KioskCheckin(BaseModel):
+    names: List[str]  # Everyone at the kiosk; unknown names join the family
+    email: Optional[str] = None  # Skips the name lookup when the kiosk already knows the family
+
+class ProfilerArm(BaseModel):
+    next_requests: int = Field(0, ge=0, le=1000)  # Capture the next N requests whatever their speed
+    slow_ms: Optional[float] = Field(None, gt=0)  # Also keep any request slower than this
+    interval_ms: Optional[float] = Field(None, ge=1, le=1000)
+    duration_seconds: Optional[float] = Field(None, gt=0)  # Capped at PROFILER_MAX_ARMED_SECONDS
+
 class CheckinBase(BaseModel):
     email: str
 
@@ -93,4 +211,18 @@ class CheckinOut(BaseModel):
     member: Optional[MemberOut]
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class LocationCreate(BaseModel):
+    slug: str
+    name: str
+    timezone: str
+
+class LocationOut(BaseModel):
+    id: uuid.UUID
+    slug: str
+    name: str
+    timezone: str
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import pytz
+from sqlalchemy import Integer, String, bindparam, text
+from portable import GUID, UTCDateTime
+from prometheus_client import Gauge
+import structlog
+
+logger = structlog.get_logger()
+
+# A check-in counts as "on the mat" for this long
+OCCUPANCY_SESSION_MINUTES = int(os.getenv("OCCUPANCY_SESSION_MINUTES", "90"))
+# How stale a worker's cached count may get before it re-reads Postgres
+OCCUPANCY_CACHE_SECONDS = float(os.getenv("OCCUPANCY_CACHE_SECONDS", "5"))
+# Buckets older than this are pruned by the background refresh
+OCCUPANCY_RETENTION_HOURS = 24
+
+OCCUPANCY_GAUGE = Gauge('gym_occupancy', 'Members checked in within the current session window', ['location'])
+
+# Per-minute buckets are maintained by a trigger on checkins, so every worker
+# sees the same window and a read touches at most session-length rows per location.
+READ_OCCUPANCY = text("""
+    SELECT l.id, l.slug, COALESCE(sum(b.count), 0) AS occupancy
+    FROM locations l
+    LEFT JOIN occupancy_buckets b
+        ON b.location_id = l.id
+        AND b.bucket_start > :since
+    GROUP BY l.id, l.slug
+""").bindparams(bindparam("since", type_=UTCDateTime)).columns(id=GUID, slug=String, occupancy=Integer)
+PRUNE_BUCKETS = text("""
+    DELETE FROM occupancy_buckets
+    WHERE bucket_start < :before
+""").bindparams(bindparam("before", type_=UTCDateTime))
+
+class OccupancyTracker:
+    """Shared sliding-window occupancy per location with a short per-worker cache"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.counts: Dict[uuid.UUID, int] = {}
+        self.as_of: Optional[datetime] = None
+        self._refreshed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def refresh(self) -> Dict[uuid.UUID, int]:
+        # One query covers every location
+        with self.engine.connect() as conn:
+            rows = conn.execute(READ_OCCUPANCY, {
+                "since": datetime.now(pytz.UTC) - timedelta(minutes=OCCUPANCY_SESSION_MINUTES)
+            }).fetchall()
+        self.counts = {row.id: int(row.occupancy) for row in rows}
+        for row in rows:
+            OCCUPANCY_GAUGE.labels(location=row.slug).set(int(row.occupancy))
+        self.as_of = datetime.now()
+        self._refreshed_at = time.monotonic()
+        return self.counts
+
+    def prune(self):
+        with self.engine.begin() as conn:
+            conn.execute(PRUNE_BUCKETS, {"before": datetime.now(pytz.UTC) - timedelta(hours=OCCUPANCY_RETENTION_HOURS)})
+
+    def current(self, location_id: uuid.UUID) -> dict:
+        if time.monotonic() - self._refreshed_at > OCCUPANCY_CACHE_SECONDS or location_id not in self.counts:
+            self.refresh()
+        return {
+            "occupancy": self.counts.get(location_id, 0),
+            "session_minutes": OCCUPANCY_SESSION_MINUTES,
+            "as_of": self.as_of.isoformat() if self.as_of else None
+        }
+
+    async def _run(self):
+        # Keeps the gauge current between endpoint reads; prunes old buckets hourly
+        last_prune = 0.0
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+                if time.monotonic() - last_prune > 3600:
+                    await asyncio.to_thread(self.prune)
+                    last_prune = time.monotonic()
+            except Exception as e:
+                logger.warning("Occupancy refresh failed", error=str(e))
+            await asyncio.sleep(OCCUPANCY_CACHE_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
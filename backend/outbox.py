@@ -0,0 +1,222 @@
+"""Transactional outbox for check-in side effects.
+
+Handlers call emit() inside the same transaction as the check-in, so an
+event exists exactly when its check-in committed. OutboxWorker drains
+pending events in batches (in-process, and/or `python manage.py outbox`)
+and hands each batch to the enabled consumers. Several workers can run at
+once: on Postgres batches are claimed with FOR UPDATE SKIP LOCKED.
+
+Delivery is at-least-once and tracked per consumer: each event records
+which consumers have taken it, and a retry only goes to the ones that
+raised, so one failing consumer neither blocks nor repeats the others.
+Consumers must still tolerate repeats (a worker can die between a consumer
+returning and the commit). Failed events wait OUTBOX_BACKOFF_SECONDS,
+doubling per attempt up to OUTBOX_BACKOFF_MAX_SECONDS, before the next
+try; events still failing after OUTBOX_MAX_ATTEMPTS are marked processed
+with their last error and logged.
+
+Consumers are plain functions taking a list of event dicts
+({"id", "type", "payload", "created_at"}), registered with @consumer(name)
+and enabled by name in OUTBOX_CONSUMERS.
+"""
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import pytz
+from prometheus_client import Counter, Histogram
+from sqlalchemy import delete, insert, or_
+from sqlalchemy.orm import Session
+import structlog
+import models
+
+logger = structlog.get_logger()
+
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "2"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "300"))
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+OUTBOX_CONSUMERS = [
+    name.strip() for name in os.getenv("OUTBOX_CONSUMERS", "metrics,log,webhook").split(",") if name.strip()
+]
+OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL")
+OUTBOX_WEBHOOK_TIMEOUT = float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "5"))
+
+CHECKIN_CREATED = "checkin.created"
+
+OUTBOX_EVENTS = Counter('outbox_events_total', 'Outbox events handled', ['type', 'outcome'])
+OUTBOX_LAG = Histogram(
+    'outbox_event_lag_seconds',
+    'Time from commit to processing for outbox events',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+CONSUMER_FAILURES = Counter('outbox_consumer_failures_total', 'Outbox consumer batch failures', ['consumer'])
+
+def emit(db: Session, event_type: str, payloads: List[dict]):
+    """Queue one event per payload in the caller's transaction; workers see them once it commits.
+
+    A single executemany INSERT, so batch operations cost one statement
+    however many events they emit.
+    """
+    if payloads:
+        db.execute(insert(models.OutboxEvent), [
+            {"event_type": event_type, "payload": payload} for payload in payloads
+        ])
+
+# Consumer registry: name -> fn(events)
+CONSUMERS: Dict[str, Callable[[List[dict]], None]] = {}
+
+def consumer(name: str) -> Callable:
+    def decorator(fn):
+        CONSUMERS[name] = fn
+        return fn
+    return decorator
+
+def enabled_consumers() -> Dict[str, Callable[[List[dict]], None]]:
+    unknown = [name for name in OUTBOX_CONSUMERS if name not in CONSUMERS]
+    if unknown:
+        logger.warning("Unknown outbox consumers ignored", consumers=unknown)
+    return {name: CONSUMERS[name] for name in OUTBOX_CONSUMERS if name in CONSUMERS}
+
+CHECKIN_COUNT = Counter('checkins_total', 'Total check-ins')
+
+@consumer("metrics")
+def _update_metrics(events: List[dict]):
+    CHECKIN_COUNT.inc(sum(1 for e in events if e["type"] == CHECKIN_CREATED))
+
+@consumer("log")
+def _log_events(events: List[dict]):
+    for event in events:
+        logger.info("Outbox event", event_id=event["id"], event_type=event["type"], **event["payload"])
+
+@consumer("webhook")
+def _post_webhook(events: List[dict]):
+    # Disabled unless a URL is configured
+    if not OUTBOX_WEBHOOK_URL:
+        return
+    request = urllib.request.Request(
+        OUTBOX_WEBHOOK_URL,
+        data=json.dumps({"events": events}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=OUTBOX_WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+def retry_delay(attempts: int) -> timedelta:
+    """Wait before the next try of an event that has failed `attempts` times"""
+    return timedelta(seconds=min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX_SECONDS))
+
+def _as_event(row: models.OutboxEvent) -> dict:
+    return {
+        "id": row.id,
+        "type": row.event_type,
+        "payload": row.payload,
+        "created_at": row.created_at.isoformat(),
+    }
+
+class OutboxWorker:
+    """Drains outbox_events in batches; start()/stop() run it as a background task"""
+
+    def __init__(self, engine, consumers: Optional[Dict[str, Callable[[List[dict]], None]]] = None):
+        self.engine = engine
+        self.consumers = consumers if consumers is not None else enabled_consumers()
+        self._task: Optional[asyncio.Task] = None
+        self.last_batch_ok = True
+
+    def drain_batch(self, limit: int = OUTBOX_BATCH_SIZE) -> int:
+        """Process up to `limit` due events; returns how many were claimed"""
+        now = datetime.now(pytz.UTC)
+        with Session(self.engine) as db, db.begin():
+            rows = db.query(models.OutboxEvent).filter(
+                models.OutboxEvent.processed_at.is_(None),
+                or_(models.OutboxEvent.next_attempt_at.is_(None), models.OutboxEvent.next_attempt_at <= now)
+            ).order_by(models.OutboxEvent.id).limit(limit).with_for_update(skip_locked=True).all()
+            if not rows:
+                return 0
+
+            events = {row.id: _as_event(row) for row in rows}
+            delivered = {row.id: set(row.delivered_to or ()) for row in rows}
+            errors = []
+            for name, handle in self.consumers.items():
+                pending = [row for row in rows if name not in delivered[row.id]]
+                if not pending:
+                    continue
+                try:
+                    handle([events[row.id] for row in pending])
+                except Exception as e:
+                    CONSUMER_FAILURES.labels(consumer=name).inc()
+                    errors.append(f"{name}: {e}")
+                    continue
+                for row in pending:
+                    delivered[row.id].add(name)
+
+            now = datetime.now(pytz.UTC)
+            for row in rows:
+                if delivered[row.id].issuperset(self.consumers):
+                    row.processed_at = now
+                    OUTBOX_EVENTS.labels(type=row.event_type, outcome="processed").inc()
+                    OUTBOX_LAG.observe((now - row.created_at).total_seconds())
+                    continue
+                row.delivered_to = sorted(delivered[row.id])
+                row.attempts += 1
+                row.last_error = "; ".join(errors)[:1000]
+                if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    # Give up so one bad event can't block the queue forever
+                    row.processed_at = now
+                    OUTBOX_EVENTS.labels(type=row.event_type, outcome="failed").inc()
+                    logger.error("Outbox event abandoned", event_id=row.id, event_type=row.event_type, error=row.last_error)
+                else:
+                    row.next_attempt_at = now + retry_delay(row.attempts)
+            if errors:
+                logger.warning("Outbox batch failed", events=len(rows), errors=errors)
+            self.last_batch_ok = not errors
+            return len(rows)
+
+    def drain(self, limit: int = OUTBOX_BATCH_SIZE) -> int:
+        """Process batches until nothing is due or a batch fails"""
+        total = 0
+        while True:
+            claimed = self.drain_batch(limit)
+            total += claimed
+            # A failed batch waits for the next poll rather than retrying hot
+            if claimed < limit or not self.last_batch_ok:
+                return total
+
+    def prune(self) -> int:
+        cutoff = datetime.now(pytz.UTC) - timedelta(hours=OUTBOX_RETENTION_HOURS)
+        with self.engine.begin() as conn:
+            return conn.execute(delete(models.OutboxEvent).where(
+                models.OutboxEvent.processed_at < cutoff
+            )).rowcount
+
+    async def _run(self):
+        last_prune = 0.0
+        while True:
+            try:
+                await asyncio.to_thread(self.drain)
+                if time.monotonic() - last_prune > 3600:
+                    await asyncio.to_thread(self.prune)
+                    last_prune = time.monotonic()
+            except Exception as e:
+                logger.warning("Outbox drain failed", error=str(e))
+            await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
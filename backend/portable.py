@@ -0,0 +1,180 @@
+"""Types and SQL helpers that work on both Postgres and SQLite.
+
+Postgres is the production target; SQLite (usually in-memory) lets the
+whole API run in-process for tests and local tooling. The pieces:
+
+- GUID / UTCDateTime column types: native uuid / timestamptz on Postgres,
+  CHAR(32) / naive-UTC text on SQLite, always uuid.UUID / aware UTC in Python.
+- local_trunc(): a check-in timestamp truncated to a unit of the location's
+  wall-clock time, i.e. date_trunc(unit, timezone(tz, ts)) on Postgres.
+- install_sqlite(): registers the Python functions backing local_trunc on
+  every SQLite connection, and SQLITE_TRIGGERS mirrors the Postgres triggers
+  that maintain versions, directory sync, the hourly rollup and occupancy buckets.
+"""
+import uuid
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import DateTime, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import TypeDecorator, Uuid
+
+# SQLAlchemy's SQLite DateTime storage format; derived rows must match it
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+class GUID(TypeDecorator):
+    """UUID column that also accepts UUID strings as bind values"""
+    impl = Uuid(as_uuid=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value
+
+class UTCDateTime(TypeDecorator):
+    """timestamptz on Postgres; on SQLite stored as naive UTC and read back aware"""
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None and dialect.name == "sqlite":
+            value = value.astimezone(pytz.UTC).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=pytz.UTC)
+        return value
+
+class local_trunc(FunctionElement):
+    """Start of the `unit` (hour/day/week/month/year) containing `timestamp`,
+    as naive wall-clock time in `timezone`"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(local_trunc)
+def _local_trunc_postgresql(element, compiler, **kw):
+    unit, timestamp, timezone = list(element.clauses)
+    return "date_trunc(%s, timezone(%s, %s))" % (
+        compiler.process(unit, **kw), compiler.process(timezone, **kw), compiler.process(timestamp, **kw)
+    )
+
+@compiles(local_trunc, "sqlite")
+def _local_trunc_sqlite(element, compiler, **kw):
+    return "local_trunc(%s)" % compiler.process(element.clauses, **kw)
+
+def _truncate(local: datetime, unit: str) -> datetime:
+    if unit == "minute":
+        return local.replace(second=0, microsecond=0)
+    if unit == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "day":
+        return day
+    if unit == "week":
+        return day - timedelta(days=day.weekday())  # ISO weeks start on Monday, as in date_trunc
+    if unit == "month":
+        return day.replace(day=1)
+    if unit == "year":
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Unsupported unit: {unit}")
+
+def _sqlite_local_trunc(unit, timestamp, timezone):
+    if timestamp is None:
+        return None
+    utc = pytz.UTC.localize(datetime.fromisoformat(timestamp))
+    local = utc.astimezone(pytz.timezone(timezone or "UTC")).replace(tzinfo=None)
+    return _truncate(local, unit).strftime(SQLITE_DATETIME_FORMAT)
+
+def _sqlite_utc_now():
+    # Microsecond precision, unlike CURRENT_TIMESTAMP
+    return datetime.now(pytz.UTC).strftime(SQLITE_DATETIME_FORMAT)
+
+def install_sqlite(engine):
+    """Register local_trunc() and utc_now() on every new SQLite connection"""
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function("local_trunc", 3, _sqlite_local_trunc, deterministic=True)
+        dbapi_connection.create_function("utc_now", 0, _sqlite_utc_now)
+
+# SQLite versions of the Postgres triggers in migrations.py. Check-in
+# timestamps are stored as naive UTC, so minute buckets are plain strftime.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER members_bump_version AFTER UPDATE ON members
+    WHEN NEW.version = OLD.version
+    BEGIN
+        UPDATE members SET version = version + 1 WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER households_bump_version AFTER UPDATE ON households
+    WHEN NEW.version = OLD.version
+    BEGIN
+        UPDATE households SET version = version + 1 WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER members_bump_household_version_insert AFTER INSERT ON members
+    BEGIN
+        UPDATE households SET version = version + 1 WHERE id = NEW.household_id;
+    END
+    """,
+    """
+    CREATE TRIGGER members_bump_household_version_update AFTER UPDATE ON members
+    WHEN NEW.household_id IS NOT OLD.household_id OR NEW.location_id IS NOT OLD.location_id
+        OR NEW.name IS NOT OLD.name OR NEW.barcode IS NOT OLD.barcode
+        OR NEW.active IS NOT OLD.active OR NEW.deleted_at IS NOT OLD.deleted_at
+    BEGIN
+        UPDATE households SET version = version + 1 WHERE id IN (OLD.household_id, NEW.household_id);
+    END
+    """,
+    """
+    CREATE TRIGGER members_bump_household_version_delete AFTER DELETE ON members
+    BEGIN
+        UPDATE households SET version = version + 1 WHERE id = OLD.household_id;
+    END
+    """,
+    """
+    CREATE TRIGGER members_touch_updated_at AFTER UPDATE ON members
+    WHEN NEW.household_id IS NOT OLD.household_id OR NEW.name IS NOT OLD.name
+        OR NEW.barcode IS NOT OLD.barcode OR NEW.deleted_at IS NOT OLD.deleted_at
+    BEGIN
+        UPDATE members SET updated_at = utc_now() WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER members_record_tombstone AFTER DELETE ON members
+    BEGIN
+        INSERT INTO member_tombstones (member_id, deleted_at) VALUES (OLD.id, utc_now())
+        ON CONFLICT (member_id) DO UPDATE SET deleted_at = excluded.deleted_at;
+    END
+    """,
+    """
+    CREATE TRIGGER checkins_apply_insert AFTER INSERT ON checkins
+    BEGIN
+        UPDATE members SET version = version + 1 WHERE id = NEW.member_id;
+        INSERT INTO checkin_hourly_rollup (location_id, local_hour, count)
+        VALUES (NEW.location_id, local_trunc('hour', NEW.timestamp,
+                (SELECT timezone FROM locations WHERE id = NEW.location_id)), 1)
+        ON CONFLICT (location_id, local_hour) DO UPDATE SET count = count + 1;
+        INSERT INTO occupancy_buckets (location_id, bucket_start, count)
+        VALUES (NEW.location_id, strftime('%Y-%m-%d %H:%M:00.000000', NEW.timestamp), 1)
+        ON CONFLICT (location_id, bucket_start) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER checkins_apply_delete AFTER DELETE ON checkins
+    BEGIN
+        UPDATE members SET version = version + 1 WHERE id = OLD.member_id;
+        UPDATE checkin_hourly_rollup SET count = count - 1
+        WHERE location_id = OLD.location_id AND local_hour = local_trunc('hour', OLD.timestamp,
+            (SELECT timezone FROM locations WHERE id = OLD.location_id));
+        UPDATE occupancy_buckets SET count = count - 1
+        WHERE location_id = OLD.location_id
+          AND bucket_start = strftime('%Y-%m-%d %H:%M:00.000000', OLD.timestamp);
+    END
+    """,
+]
@@ -0,0 +1,226 @@
+"""On-demand sampling profiler for production latency spikes.
+
+An admin arms the profiler to capture the next N requests, or every
+request slower than a threshold, for up to PROFILER_MAX_ARMED_SECONDS.
+While a captured request is in flight, a background thread samples the
+stacks of all busy threads every PROFILER_INTERVAL_MS. When the request
+ends, the samples are kept as a profile in a ring buffer of the last
+PROFILER_MAX_PROFILES. Profiles are in folded-stack format ("a;b;c count"
+per line), which flamegraph.pl, speedscope and inferno read directly.
+
+Samples cover the whole process, so requests running at the same time
+show up in each other's profiles. State is per worker: arming reaches
+only the worker that served the admin request.
+
+While disarmed, the middleware does a single attribute check per request
+(see benchmarks/profiler_overhead.py).
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+import pytz
+import structlog
+
+logger = structlog.get_logger()
+
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", "20"))
+# Armed profilers switch themselves off after this long
+PROFILER_MAX_ARMED_SECONDS = float(os.getenv("PROFILER_MAX_ARMED_SECONDS", "600"))
+PROFILER_MAX_DEPTH = 128
+
+# The profiler's own endpoints and probes are never captured
+EXCLUDED_PREFIXES = ("/admin/profiler", "/livez", "/readyz", "/health", "/metrics")
+
+# Leaf frames of threads waiting for work; sampling them only adds noise
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("_asyncio.py", "run"),
+}
+
+FOLDED_MEDIA_TYPE = "text/plain; charset=utf-8"
+
+def fold_stack(frame) -> Optional[str]:
+    """Root-to-leaf "function (file:line)" frames joined by ';', or None if idle"""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+        return None
+    names = []
+    while frame is not None and len(names) < PROFILER_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Capture:
+    """Samples for one in-flight request"""
+    __slots__ = ("method", "path", "forced", "started_at", "start", "samples", "stacks")
+
+    def __init__(self, method: str, path: str, forced: bool):
+        self.method = method
+        self.path = path
+        self.forced = forced  # One of the "next N" requests: kept however fast it was
+        self.started_at = datetime.now(pytz.UTC)
+        self.start = time.perf_counter()
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+class SamplingProfiler:
+    def __init__(self, max_profiles: int = PROFILER_MAX_PROFILES):
+        self.armed = False
+        self.remaining = 0
+        self.slow_ms: Optional[float] = None
+        self.interval = PROFILER_INTERVAL_MS / 1000
+        self.expires_at = 0.0
+        self.profiles: Deque[dict] = deque(maxlen=max_profiles)
+        self._active: Dict[int, Capture] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def arm(self, next_requests: int = 0, slow_ms: Optional[float] = None,
+            interval_ms: Optional[float] = None, duration_seconds: Optional[float] = None):
+        duration = min(duration_seconds or PROFILER_MAX_ARMED_SECONDS, PROFILER_MAX_ARMED_SECONDS)
+        with self._lock:
+            self.remaining = next_requests
+            self.slow_ms = slow_ms
+            self.interval = (interval_ms or PROFILER_INTERVAL_MS) / 1000
+            self.expires_at = time.monotonic() + duration
+            self.armed = next_requests > 0 or slow_ms is not None
+        logger.info("Profiler armed", next_requests=next_requests, slow_ms=slow_ms, seconds=duration)
+
+    def disarm(self):
+        with self._lock:
+            self.armed = False
+            self.remaining = 0
+            self.slow_ms = None
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "armed": self.armed,
+                "next_requests": self.remaining,
+                "slow_ms": self.slow_ms,
+                "interval_ms": self.interval * 1000,
+                "expires_in_seconds": round(max(self.expires_at - time.monotonic(), 0), 1) if self.armed else None,
+                "in_flight": len(self._active),
+            }
+
+    def begin(self, method: str, path: str) -> Optional[Capture]:
+        """Start capturing this request if the profiler wants it"""
+        if path.startswith(EXCLUDED_PREFIXES):
+            return None
+        with self._lock:
+            if not self.armed:
+                return None
+            if time.monotonic() > self.expires_at:
+                self.armed = False
+                return None
+            forced = self.remaining > 0
+            if forced:
+                self.remaining -= 1
+                if self.remaining == 0 and self.slow_ms is None:
+                    self.armed = False
+            capture = Capture(method, path, forced)
+            self._active[id(capture)] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return capture
+
+    def end(self, capture: Capture, status_code: int):
+        duration_ms = (time.perf_counter() - capture.start) * 1000
+        with self._lock:
+            # The sampler only touches captures still in _active, so this one is final
+            self._active.pop(id(capture), None)
+            slow_ms = self.slow_ms
+        if not capture.forced and (slow_ms is None or duration_ms < slow_ms):
+            return
+        profile = {
+            "id": uuid.uuid4().hex,
+            "method": capture.method,
+            "path": capture.path,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 1),
+            "started_at": capture.started_at,
+            "samples": capture.samples,
+            "stacks": capture.stacks,
+        }
+        # Admin reads iterate the ring buffer from the threadpool
+        with self._lock:
+            self.profiles.append(profile)
+        logger.info("Request profiled", path=capture.path, duration_ms=round(duration_ms, 1), samples=capture.samples)
+
+    def _snapshot(self) -> List[dict]:
+        with self._lock:
+            return list(self.profiles)
+
+    def list_profiles(self) -> List[dict]:
+        return [{k: v for k, v in p.items() if k != "stacks"} for p in reversed(self._snapshot())]
+
+    def folded(self, profile_id: str) -> Optional[str]:
+        for profile in self._snapshot():
+            if profile["id"] == profile_id:
+                return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+        return None
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active and not (self.armed and time.monotonic() < self.expires_at):
+                    # The next capture after re-arming starts a new thread
+                    self._thread = None
+                    return
+                captures = list(self._active.values())
+                interval = self.interval
+            if not captures:
+                time.sleep(interval)
+                continue
+            stacks = [
+                stack for thread_id, frame in sys._current_frames().items()
+                if thread_id != me and (stack := fold_stack(frame)) is not None
+            ]
+            with self._lock:
+                for capture in captures:
+                    # Once end() has taken a capture its stacks may be read at any time
+                    if self._active.get(id(capture)) is capture:
+                        capture.samples += 1
+                        capture.stacks.update(stacks)
+            time.sleep(interval)
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware; costs one attribute check while the profiler is disarmed"""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.armed or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        capture = self.profiler.begin(scope["method"], scope["path"])
+        if capture is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def capture_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            self.profiler.end(capture, status_code)
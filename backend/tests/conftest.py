@@ -0,0 +1,96 @@
+"""The whole API on in-memory SQLite, so tests need no Postgres.
+
+    cd backend && python -m pytest
+
+Each test gets a freshly built schema and fresh per-worker caches. Startup
+hooks are not run, so no background task (readiness, occupancy, outbox)
+touches the database behind a test's back.
+"""
+import os
+import sys
+import tempfile
+
+# database.py reads these at import time
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ALLOWED_HOSTS", "testserver")
+os.environ.setdefault("ARCHIVE_DIR", tempfile.mkdtemp(prefix="checkin-archive-"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataclasses import dataclass
+from typing import List, Optional
+import pytest
+from fastapi.testclient import TestClient
+import database
+import directory
+import etags
+import instrumentation
+import main
+import models
+
+# Rate limits are per client IP, and every test request comes from the same one
+main.limiter.enabled = False
+
+@pytest.fixture
+def schema(monkeypatch):
+    database.Base.metadata.drop_all(database.engine)
+    database.create_sqlite_schema()
+    main._location_cache.clear()
+    monkeypatch.setattr(main, "response_cache", etags.VersionedCache())
+    monkeypatch.setattr(main, "member_directory", directory.MemberDirectory(database.engine))
+
+@pytest.fixture
+def db(schema):
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def location(db) -> models.Location:
+    return db.query(models.Location).filter(models.Location.slug == main.DEFAULT_LOCATION).one()
+
+@dataclass
+class BudgetedRequest:
+    endpoint: str
+    queries: int
+    budget: Optional[int]
+    problems: List[str]
+
+@pytest.fixture
+def query_budget(monkeypatch) -> List[BudgetedRequest]:
+    """Every request's query count against its endpoint's declared budget.
+
+    Fails the test if any request ran more statements than its
+    @query_budget allows, or repeated one statement shape
+    REPEATED_QUERY_THRESHOLD+ times.
+    """
+    requests: List[BudgetedRequest] = []
+    check_budget = instrumentation.check_budget
+
+    def record(endpoint, route_endpoint, stats):
+        problems = check_budget(endpoint, route_endpoint, stats)
+        requests.append(BudgetedRequest(
+            endpoint, stats.count, getattr(route_endpoint, "__query_budget__", None), problems
+        ))
+        return problems
+
+    # Collect instead of raising, so the response still reaches the test
+    monkeypatch.setattr(instrumentation, "QUERY_BUDGET_STRICT", False)
+    monkeypatch.setattr(instrumentation, "check_budget", record)
+    yield requests
+    failures = [f"{r.endpoint}: " + "; ".join(r.problems) for r in requests if r.problems]
+    if failures:
+        pytest.fail("Query budget exceeded:\n" + "\n".join(failures), pytrace=False)
+
+@pytest.fixture
+def client(schema, query_budget) -> TestClient:
+    return TestClient(main.app)
+
+@pytest.fixture
+def register(client):
+    """register(email, *names): create a family (which also checks everyone in)"""
+    def register_family(email: str, *names: str) -> dict:
+        response = client.post("/family/register", json={"email": email, "members": [{"name": n} for n in names]})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return register_family
@@ -0,0 +1,162 @@
+from datetime import date, datetime
+import pytz
+import main
+import models
+
+def test_register_family_checks_everyone_in(client, register):
+    body = register("smith@example.com", "Ann Smith", "Bob Smith")
+    assert body["checkins"] == 2
+    assert {m["name"] for m in body["members"]} == {"Ann Smith", "Bob Smith"}
+
+    today = client.get("/admin/checkins/today").json()
+    assert sorted(c["name"] for c in today) == ["Ann Smith", "Bob Smith"]
+
+def test_register_rejects_existing_member(client, register):
+    register("smith@example.com", "Ann Smith")
+    response = client.post("/family/register", json={"email": "smith@example.com", "members": [{"name": "Ann Smith"}]})
+    assert response.status_code == 409
+
+def test_checkin_once_per_period(client):
+    client.post("/member", json={"email": "solo@example.com", "name": "Solo Member"})
+
+    first = client.post("/checkin", json={"email": "solo@example.com"}).json()
+    second = client.post("/checkin", json={"email": "solo@example.com"}).json()
+    assert first["already_checked_in"] is False
+    assert second["already_checked_in"] is True
+    assert client.post("/checkin", json={"email": "nobody@example.com"}).status_code == 404
+
+def test_checkin_by_name_and_barcode(client):
+    member = client.post("/member", json={"email": "solo@example.com", "name": "Solo Member"}).json()
+
+    by_barcode = client.post("/checkin-by-barcode", json={"barcode": member["barcode"]})
+    assert by_barcode.status_code == 200
+    assert client.post("/checkin-by-barcode", json={"barcode": member["barcode"]}).status_code == 409
+    by_name = client.post("/checkin/by-name", json={"name": "  solo member "}).json()
+    assert by_name["already_checked_in"] is True
+    assert client.get(f"/member/lookup-by-barcode/{member['barcode']}").json()["name"] == "Solo Member"
+
+def test_family_checkin_and_status(client, register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+    client.post("/family/add-members", json={"email": "smith@example.com", "new_members": ["Cat Smith"]})
+
+    response = client.post("/family/checkin", json={"email": "smith@example.com", "member_names": ["Ann Smith", "Cat Smith"]})
+    assert response.status_code == 200
+
+    status = client.get("/family/checkin-status/smith@example.com").json()
+    assert sorted(status["checked_in"]) == ["Ann Smith", "Bob Smith", "Cat Smith"]
+    assert status["not_checked_in"] == []
+
+def test_kiosk_adds_unknown_names(client, register):
+    register("smith@example.com", "Ann Smith")
+    response = client.post("/kiosk/checkin", json={"email": "smith@example.com", "names": ["Ann Smith", "Dan Smith"]})
+    assert response.status_code == 200
+    assert response.json()["added"] == ["Dan Smith"]
+    assert len(client.get("/family/members/smith@example.com").json()) == 2
+
+def test_family_members_etag(client, register):
+    register("smith@example.com", "Ann Smith")
+    first = client.get("/family/members/smith@example.com")
+    again = client.get("/family/members/smith@example.com", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+    client.post("/family/add-members", json={"email": "smith@example.com", "new_members": ["Bob Smith"]})
+    changed = client.get("/family/members/smith@example.com", headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+def test_update_member_email_moves_family(client, register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+    register("jones@example.com", "Cy Jones")
+    member_id = client.get("/family/members/smith@example.com").json()[0]["id"]
+
+    renamed = client.put(f"/member/{member_id}", json={"email": "smiths@example.com"})
+    assert renamed.status_code == 200
+    assert len(client.get("/family/members/smiths@example.com").json()) == 2
+
+    merged = client.put(f"/member/{member_id}", json={"email": "jones@example.com"})
+    assert merged.status_code == 200
+    assert len(client.get("/family/members/jones@example.com").json()) == 3
+    assert client.get("/family/members/smiths@example.com").status_code == 404
+
+def test_restore_and_delete(client, db):
+    member = client.post("/member", json={"email": "solo@example.com", "name": "Solo Member"}).json()
+    db.query(models.Member).update({"deleted_at": datetime.now(pytz.UTC)})
+    db.commit()
+
+    assert client.post("/member/lookup-by-name", json={"name": "Solo Member"}).status_code == 404
+    assert client.post(f"/member/{member['id']}/restore").status_code == 200
+    assert client.post("/member/lookup-by-name", json={"name": "Solo Member"}).status_code == 200
+    assert client.delete(f"/member/{member['id']}").status_code == 200
+    assert client.post("/member/lookup-by-name", json={"name": "Solo Member"}).status_code == 404
+
+def test_member_stats(client, register):
+    register("smith@example.com", "Ann Smith")
+    member_id = client.get("/family/members/smith@example.com").json()[0]["id"]
+
+    stats = client.get(f"/member/{member_id}/stats").json()
+    assert len(stats["check_in_dates"]) == 1
+    assert stats["email"] == "smith@example.com"
+
+def test_member_stats_etag_follows_family_email(client, register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+    ann, bob = sorted(client.get("/family/members/smith@example.com").json(), key=lambda m: m["name"])
+    first = client.get(f"/member/{bob['id']}/stats")
+
+    # Changing Ann's email moves the whole family without touching Bob's row
+    client.put(f"/member/{ann['id']}", json={"email": "smiths@example.com"})
+    again = client.get(f"/member/{bob['id']}/stats", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 200
+    assert again.json()["email"] == "smiths@example.com"
+
+def test_admin_reports(client, register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+    today = date.today().isoformat()
+
+    assert client.get("/members").status_code == 200
+    ranges = client.get("/admin/checkins/range", params={"start_date": "2000-01-01", "end_date": "2100-01-01"}).json()
+    assert sum(r["count"] for r in ranges) == 2
+    assert client.get("/admin/checkins/stats").status_code == 200
+    heatmap = client.get("/admin/analytics/heatmap", params={"start_date": "2000-01-01", "end_date": "2100-01-01"}).json()
+    assert heatmap["total"] == 2
+    dashboard = client.get("/admin/dashboard", params={"start_date": today, "end_date": today}).json()
+    assert dashboard["errors"] == {}
+
+def test_unknown_location(client):
+    assert client.get("/members", headers={"X-Location": "nowhere"}).status_code == 404
+
+def test_dashboard_caps_extra_connections(client, register, monkeypatch):
+    register("smith@example.com", "Ann Smith")
+    opened = []
+    session_local = main.SessionLocal
+    def open_session():
+        opened.append(session_local())
+        return opened[-1]
+    monkeypatch.setattr(main, "SessionLocal", open_session)
+    monkeypatch.setattr(main, "IS_SQLITE", False)
+    monkeypatch.setattr(main, "DASHBOARD_EXTRA_CONNECTIONS", 1)
+
+    dashboard = client.get("/admin/dashboard", params={"sections": "today,stats,members"}).json()
+    assert dashboard["errors"] == {}
+    assert [m["name"] for m in dashboard["members"]] == ["Ann Smith"]
+    # The request's own session plus one, not one per extra section
+    assert len(opened) == 2
+
+def test_occupancy(client, register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+    occupancy = client.get("/occupancy").json()
+    assert occupancy["location"] == "main"
+    assert occupancy["occupancy"] == 2
+
+def test_email_merge_folds_same_name_members(client, register, db):
+    register("a@example.com", "John Smith")
+    register("b@example.com", "John Smith ", "Kim Smith")
+    older = client.get("/family/members/a@example.com").json()[0]
+
+    assert client.put(f"/member/{older['id']}", json={"email": "B@example.com"}).status_code == 200
+    family = client.get("/family/members/b@example.com").json()
+    active = [m for m in family if m["deleted_at"] is None]
+    assert sorted(m["name"] for m in active) == ["John Smith", "Kim Smith"]
+    assert older["id"] in {m["id"] for m in active}
+    assert len(family) == 3
+    # The folded member's check-in now belongs to the one that was kept
+    assert db.query(models.Checkin).filter(models.Checkin.member_id == older["id"]).count() == 2
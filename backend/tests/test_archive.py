@@ -0,0 +1,97 @@
+"""Range counts and member history spanning the archive boundary.
+
+Check-ins before the boundary are read from Parquet, later ones from the
+database. Parquet rows at or after the boundary stand for a run whose
+delete never committed: those check-ins are still live and must be
+counted once.
+"""
+import uuid
+from datetime import date, datetime
+import pyarrow as pa
+import pytest
+import pytz
+import archive
+import main
+import models
+
+BOUNDARY = datetime(2025, 6, 15, tzinfo=pytz.UTC)
+
+ARCHIVED = [
+    datetime(2025, 6, 10, 12, 0, tzinfo=pytz.UTC),
+    datetime(2025, 6, 14, 23, 30, tzinfo=pytz.UTC),  # 19:30 on the 14th in Toronto
+]
+LIVE = [
+    datetime(2025, 6, 15, 1, 0, tzinfo=pytz.UTC),  # 21:00 on the 14th in Toronto
+    datetime(2025, 6, 20, 15, 0, tzinfo=pytz.UTC),
+]
+
+@pytest.fixture
+def member(db, location, tmp_path, monkeypatch) -> models.Member:
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    member = models.Member(
+        household=models.Household(email="smith@example.com"), location_id=location.id, name="Ann Smith",
+        created_at=datetime(2025, 1, 1, tzinfo=pytz.UTC)
+    )
+    db.add(member)
+    db.add_all(models.Checkin(member=member, location_id=location.id, timestamp=ts) for ts in LIVE)
+    db.add(models.CheckinArchiveState(boundary=BOUNDARY))
+    db.commit()
+
+    # The first live check-in is also in Parquet, as if its delete had rolled back
+    archived = ARCHIVED + LIVE[:1]
+    archive._write_month(str(location.id), "2025-06", pa.table({
+        "id": [str(uuid.uuid4()) for _ in archived],
+        "member_id": [str(member.id)] * len(archived),
+        "timestamp": archived,
+    }, schema=archive.SCHEMA))
+    return member
+
+def test_count_by_bucket_stops_at_boundary(member, location):
+    counts = archive.count_by_bucket(
+        BOUNDARY, location.id, location.timezone,
+        datetime(2025, 6, 1, tzinfo=pytz.UTC), datetime(2025, 7, 1, tzinfo=pytz.UTC), "day"
+    )
+    assert counts == {datetime(2025, 6, 10, 0, 0): 1, datetime(2025, 6, 14, 0, 0): 1}
+
+def test_count_by_bucket_outside_archive(member, location):
+    after = archive.count_by_bucket(
+        BOUNDARY, location.id, location.timezone,
+        BOUNDARY, datetime(2025, 7, 1, tzinfo=pytz.UTC), "day"
+    )
+    other_location = archive.count_by_bucket(
+        BOUNDARY, uuid.uuid4(), location.timezone,
+        datetime(2025, 6, 1, tzinfo=pytz.UTC), datetime(2025, 7, 1, tzinfo=pytz.UTC), "day"
+    )
+    assert after == {} and other_location == {}
+
+def test_range_merges_archived_and_live_days(member, db, location):
+    rows = main.checkins_by_range(db, location, date(2025, 6, 1), date(2025, 6, 30), "day")
+    assert rows == [
+        {"date": "2025-06-10T00:00:00", "count": 1},
+        {"date": "2025-06-14T00:00:00", "count": 2},  # One archived, one live
+        {"date": "2025-06-20T00:00:00", "count": 1},
+    ]
+
+def test_range_bucket_spanning_boundary(member, db, location):
+    assert main.checkins_by_range(db, location, date(2025, 6, 1), date(2025, 6, 30), "month") == [
+        {"date": "2025-06-01T00:00:00", "count": 4},
+    ]
+    # A range that ends before the boundary reads only the archive
+    assert main.checkins_by_range(db, location, date(2025, 6, 1), date(2025, 6, 12), "month") == [
+        {"date": "2025-06-01T00:00:00", "count": 1},
+    ]
+
+def test_range_endpoint_and_member_history(member, client):
+    ranges = client.get("/admin/checkins/range", params={"start_date": "2025-06-01", "end_date": "2025-06-30", "group_by": "week"})
+    assert sum(r["count"] for r in ranges.json()) == 4
+
+    stats = client.get(f"/member/{member.id}/stats").json()
+    assert len(stats["check_in_dates"]) == 4
+
+def test_hourly_counts_for_rollup_rebuild(member, location):
+    # Local hours, like date_trunc('hour', timestamp AT TIME ZONE timezone)
+    assert archive.hourly_counts(BOUNDARY, location.id, location.timezone) == {
+        datetime(2025, 6, 10, 8, 0): 1,
+        datetime(2025, 6, 14, 19, 0): 1,
+    }
+    assert archive.hourly_counts(None, location.id, location.timezone) == {}
@@ -0,0 +1,38 @@
+import pytest
+import etags
+import fastjson
+import instrumentation
+import main
+
+@pytest.fixture
+def family(register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+
+@pytest.mark.parametrize("path", ["/members", "/family/members/smith@example.com", "/admin/checkins/today"])
+def test_fast_path_matches_default(client, family, monkeypatch, path):
+    default = client.get(path)
+    monkeypatch.setattr(fastjson, "FAST_JSON_ENABLED", True)
+    # Encode afresh rather than replaying the default path's cached body
+    monkeypatch.setattr(main, "response_cache", etags.VersionedCache())
+    fast = client.get(path)
+    assert fast.status_code == 200
+    assert fast.text.count("+00:00") == default.text.count("+00:00")
+    assert fast.json() == default.json()
+
+def test_streamed_body_is_recorded_after_it_is_sent(client, family, monkeypatch):
+    sent = []
+    encode_array = fastjson.encode_array
+    def encode_and_note(*args, **kwargs):
+        yield from encode_array(*args, **kwargs)
+        sent.append(True)
+    recorded = []
+    check_budget = instrumentation.check_budget
+    def note_and_check(endpoint, route_endpoint, stats):
+        recorded.append((endpoint, bool(sent), stats.count))
+        return check_budget(endpoint, route_endpoint, stats)
+    monkeypatch.setattr(fastjson, "FAST_JSON_ENABLED", True)
+    monkeypatch.setattr(fastjson, "encode_array", encode_and_note)
+    monkeypatch.setattr(instrumentation, "check_budget", note_and_check)
+
+    assert len(client.get("/members").json()) == 2
+    assert recorded == [("/members", True, 1)]
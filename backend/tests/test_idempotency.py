@@ -0,0 +1,44 @@
+import hashlib
+from datetime import datetime, timedelta
+import pytest
+import pytz
+import idempotency
+import models
+
+BODY = b'{"email": "solo@example.com"}'
+HEADERS = {"Idempotency-Key": "key-1", "Content-Type": "application/json"}
+
+@pytest.fixture
+def solo(client):
+    client.post("/member", json={"email": "solo@example.com", "name": "Solo Member"})
+
+def leave_claim(db, age: timedelta, body: bytes = BODY):
+    """An unfinished claim, as left by a worker that died mid-request"""
+    db.add(models.IdempotencyKey(
+        key="key-1", endpoint="/checkin",
+        request_hash=hashlib.sha256(b"\n" + body).hexdigest(),
+        created_at=datetime.now(pytz.UTC) - age,
+    ))
+    db.commit()
+
+def test_retry_replays_stored_response(client, solo):
+    first = client.post("/checkin", content=BODY, headers=HEADERS)
+    retry = client.post("/checkin", content=BODY, headers=HEADERS)
+    assert retry.content == first.content
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert client.post("/checkin", content=b'{"email": "other@example.com"}', headers=HEADERS).status_code == 422
+
+def test_claim_in_progress_conflicts(client, db, solo):
+    leave_claim(db, timedelta(seconds=1))
+    assert client.post("/checkin", content=BODY, headers=HEADERS).status_code == 409
+
+def test_stale_claim_is_taken_over(client, db, solo):
+    leave_claim(db, timedelta(seconds=idempotency.IDEMPOTENCY_LEASE_SECONDS + 1))
+    response = client.post("/checkin", content=BODY, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()["already_checked_in"] is False
+    assert client.post("/checkin", content=BODY, headers=HEADERS).headers["idempotent-replayed"] == "true"
+
+def test_stale_claim_for_another_body_conflicts(client, db, solo):
+    leave_claim(db, timedelta(seconds=idempotency.IDEMPOTENCY_LEASE_SECONDS + 1), body=b'{"email": "other@example.com"}')
+    assert client.post("/checkin", content=BODY, headers=HEADERS).status_code == 422
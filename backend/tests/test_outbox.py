@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import pytest
+import pytz
+import database
+import models
+import outbox
+
+class Recorder:
+    """Consumer that records the event ids it was handed, failing while `down`"""
+
+    def __init__(self, down: bool = False):
+        self.down = down
+        self.seen = []
+
+    def __call__(self, events):
+        if self.down:
+            raise ConnectionError("webhook down")
+        self.seen.extend(e["id"] for e in events)
+
+@pytest.fixture
+def events(client, register):
+    register("smith@example.com", "Ann Smith", "Bob Smith")
+    return 2
+
+def make_due(db):
+    db.query(models.OutboxEvent).update({"next_attempt_at": None})
+    db.commit()
+
+def test_failing_consumer_does_not_repeat_the_others(db, events):
+    metrics, webhook = Recorder(), Recorder(down=True)
+    worker = outbox.OutboxWorker(database.engine, {"metrics": metrics, "webhook": webhook})
+
+    assert worker.drain() == events
+    assert worker.last_batch_ok is False
+    rows = db.query(models.OutboxEvent).all()
+    assert all(row.processed_at is None and row.delivered_to == ["metrics"] for row in rows)
+    # Backing off: nothing is due straight away
+    assert worker.drain() == 0
+
+    webhook.down = False
+    make_due(db)
+    assert worker.drain() == events
+    assert len(metrics.seen) == len(webhook.seen) == events
+    db.expire_all()
+    assert all(row.processed_at is not None for row in db.query(models.OutboxEvent))
+
+def test_gives_up_after_max_attempts(db, events, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    worker = outbox.OutboxWorker(database.engine, {"webhook": Recorder(down=True)})
+
+    for attempt in (1, 2):
+        make_due(db)
+        before = datetime.now(pytz.UTC)
+        worker.drain()
+        db.expire_all()
+        row = db.query(models.OutboxEvent).order_by(models.OutboxEvent.id).first()
+        assert row.attempts == attempt and row.processed_at is None
+        assert row.next_attempt_at >= before + outbox.retry_delay(attempt)
+
+    make_due(db)
+    worker.drain()
+    db.expire_all()
+    rows = db.query(models.OutboxEvent).all()
+    assert all(row.attempts == 3 and row.processed_at is not None for row in rows)
+    assert "webhook down" in rows[0].last_error
+
+def test_retry_delay_is_capped():
+    assert outbox.retry_delay(1) == timedelta(seconds=outbox.OUTBOX_BACKOFF_SECONDS)
+    assert outbox.retry_delay(2) == 2 * outbox.retry_delay(1)
+    assert outbox.retry_delay(50) == timedelta(seconds=outbox.OUTBOX_BACKOFF_MAX_SECONDS)
@@ -0,0 +1,42 @@
+import threading
+import time
+import profiling
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def test_ended_capture_stops_changing():
+    profiler = profiling.SamplingProfiler()
+    profiler.arm(next_requests=2, interval_ms=1, duration_seconds=5)
+    done = profiler.begin("GET", "/members")
+    # Keeps the sampler running after the first capture ends
+    still_running = profiler.begin("GET", "/members")
+    busy(0.05)
+    profiler.end(done, 200)
+
+    profile = profiler.profiles[0]
+    stacks, samples = dict(profile["stacks"]), profile["samples"]
+    busy(0.05)
+    assert profile["samples"] == samples > 0
+    assert dict(profile["stacks"]) == stacks
+    assert profiler.folded(profile["id"])
+
+    profiler.end(still_running, 200)
+    assert len(profiler.profiles) == 2
+
+def test_reads_while_profiles_are_added():
+    profiler = profiling.SamplingProfiler(max_profiles=5)
+    profiler.arm(next_requests=2000, interval_ms=1000, duration_seconds=5)
+
+    def profile_requests():
+        for _ in range(2000):
+            profiler.end(profiler.begin("GET", "/members"), 200)
+    writer = threading.Thread(target=profile_requests)
+    writer.start()
+    while writer.is_alive():
+        for profile in profiler.list_profiles():
+            profiler.folded(profile["id"])
+    writer.join()
+    assert len(profiler.list_profiles()) == 5
@@ -0,0 +1,81 @@
+"""Every route with a @query_budget, called with multi-member families so
+per-member query loops (N+1) show up as repeated statements."""
+import json
+from datetime import date, datetime
+import pytest
+import pytz
+from fastapi.testclient import TestClient
+import fastjson
+import instrumentation
+import main
+import models
+
+FAMILY = ("Ann Smith", "Bob Smith", "Cat Smith", "Dan Smith")
+
+def budgeted_paths():
+    return {route.path for route in main.app.routes if getattr(route.endpoint, "__query_budget__", None) is not None}
+
+def test_budgeted_routes_stay_within_budget(client, db, register, query_budget):
+    def call(method, url, **kwargs):
+        response = client.request(method, url, **kwargs)
+        assert response.status_code < 400, (method, url, response.text)
+        return response
+
+    admin = {"Authorization": f"Bearer {main.create_jwt_token()}"}
+    today = date.today().isoformat()
+    register("smith@example.com", *FAMILY)
+    members = call("GET", "/family/members/smith@example.com").json()
+    member_id, barcode = members[0]["id"], members[1]["barcode"]
+    solo = call("POST", "/member", json={"email": "solo@example.com", "name": "Solo Member"}).json()
+    removed = call("POST", "/member", json={"email": "solo@example.com", "name": "Sam Solo"}).json()
+    restored = call("POST", "/member", json={"email": "solo@example.com", "name": "Pat Solo"}).json()
+    call("POST", "/member", json={"email": "lee@example.com", "name": "Lee Jones"})
+    db.query(models.Member).filter(models.Member.id == restored["id"]).update({"deleted_at": datetime.now(pytz.UTC)})
+    db.commit()
+
+    call("GET", "/member/smith@example.com")
+    call("POST", "/checkin", json={"email": "lee@example.com"})
+    call("POST", "/checkin/by-name", json={"name": "Ann Smith"})
+    call("POST", "/family/add-members", json={"email": "smith@example.com", "new_members": ["Eve Smith", "Fay Smith", "Gus Smith"]})
+    call("POST", "/family/checkin", json={"email": "smith@example.com", "member_names": ["Eve Smith", "Fay Smith", "Gus Smith"]})
+    call("GET", "/family/checkin-status/smith@example.com")
+    call("POST", "/kiosk/checkin", json={"names": ["Ann Smith", "Hal Smith", "Ida Smith", "Jo Smith"]})
+    call("GET", f"/member/lookup-by-barcode/{barcode}")
+    call("POST", "/checkin-by-barcode", json={"barcode": solo["barcode"]})
+    call("POST", "/member/lookup-by-name", json={"name": "Bob Smith"})
+    call("GET", f"/member/{member_id}/stats")
+    call("PUT", f"/member/{member_id}", json={"name": "Ann Smythe"})
+    call("POST", f"/member/{restored['id']}/restore")
+    call("DELETE", f"/member/{removed['id']}")
+
+    call("GET", "/members")
+    call("GET", "/occupancy")
+    call("GET", "/admin/checkins/today")
+    call("GET", "/admin/checkins/range", params={"start_date": "2000-01-01", "end_date": today, "group_by": "month"})
+    call("GET", "/admin/checkins/stats")
+    call("GET", "/admin/analytics/heatmap", params={"start_date": today, "end_date": today})
+    call("GET", "/admin/analytics/cohorts")
+    call("GET", "/admin/dashboard", params={"start_date": today, "end_date": today})
+    call("GET", "/locations")
+    call("POST", "/admin/locations", json={"slug": "north", "name": "North", "timezone": "UTC"}, headers=admin)
+
+    snapshot = call("GET", "/directory/snapshot", headers={"Accept-Encoding": "identity"})
+    version = json.loads(snapshot.content.split(b"\n", 1)[0])["version"]
+    call("GET", "/directory/delta", params={"since": version})
+
+    assert budgeted_paths() - {r.endpoint for r in query_budget} == set()
+
+def test_overrun_is_reported(client, query_budget, monkeypatch):
+    monkeypatch.setattr(main.get_members, "__query_budget__", 0)
+    client.get("/members")
+    assert query_budget[-1].problems == [f"{query_budget[-1].queries} queries, budget is 0"]
+    query_budget.clear()  # Don't fail this test for the overrun it provoked
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_strict_overrun_fails_the_request(schema, monkeypatch, streamed):
+    monkeypatch.setattr(main.get_members, "__query_budget__", 0)
+    monkeypatch.setattr(instrumentation, "QUERY_BUDGET_STRICT", True)
+    monkeypatch.setattr(fastjson, "FAST_JSON_ENABLED", streamed)
+    # The overrun must surface as an error response, not after a 200 has gone out
+    response = TestClient(main.app, raise_server_exceptions=False).get("/members")
+    assert response.status_code == 500
@@ -0,0 +1,46 @@
+"""Importing the app and running its startup hooks must do no schema work and
+no table scans; both belong to `manage.py migrate` / `manage.py seed`."""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so the import itself is observed
+BOOT = """
+import asyncio, json
+from sqlalchemy import event, inspect
+import database
+
+statements = []
+
+@event.listens_for(database.engine, "before_cursor_execute")
+def record(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+import main
+
+async def boot():
+    await main.startup_warm_pool()
+    await asyncio.sleep(0.2)  # Let the background tasks make their first pass
+    await main.shutdown_readiness()
+
+asyncio.run(boot())
+print(json.dumps({"statements": statements, "tables": inspect(database.engine).get_table_names()}))
+"""
+
+def test_startup_does_no_schema_work_or_scans():
+    env = {**os.environ, "DATABASE_URL": "sqlite://", "OUTBOX_WORKER_ENABLED": "true"}
+    result = subprocess.run(
+        [sys.executable, "-c", BOOT], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert report["tables"] == []
+    for statement in report["statements"]:
+        words = statement.split()
+        assert words[0].upper() not in ("CREATE", "ALTER", "DROP", "INSERT"), statement
+        assert "members" not in words, statement
+        assert "count(" not in statement.lower(), statement
@@ -53,8 +53,6 @@ function AdminDashboard() {
   useEffect(() => {
     // Set initial date range
     updateDateRange(dateRange);
-    // Fetch today's check-ins
-    fetchTodayCheckins();
   }, []);
 
   useEffect(() => {
@@ -64,12 +62,11 @@ function AdminDashboard() {
   }, [dateRange]);
 
   useEffect(() => {
-    fetchCheckinData();
-    fetchStats();
+    // Range and stats (plus today's list) in one request
+    fetchDashboard();
   }, [startDate, endDate, groupBy]);
 
   useEffect(() => {
-    fetchTodayCheckins(); // initial fetch
     const interval = setInterval(() => {
       fetchTodayCheckins();
     }, 3500); // every 3.5 seconds
@@ -118,27 +115,21 @@ function AdminDashboard() {
     }
   };
 
-  const fetchCheckinData = async () => {
+  const fetchDashboard = async () => {
     try {
       const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
       const response = await fetch(
-        `${API_URL}/admin/checkins/range?start_date=${format(startDate, 'yyyy-MM-dd')}&end_date=${format(endDate, 'yyyy-MM-dd')}&group_by=${groupBy}`
+        `${API_URL}/admin/dashboard?sections=today,range,stats&start_date=${format(startDate, 'yyyy-MM-dd')}&end_date=${format(endDate, 'yyyy-MM-dd')}&group_by=${groupBy}`
       );
       const data = await response.json();
-      setCheckinData(data);
-    } catch (error) {
-      console.error('Error fetching check-in data:', error);
-    }
-  };
-
-  const fetchStats = async () => {
-    try {
-      const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
-      const response = await fetch(`${API_URL}/admin/checkins/stats`);
-      const data = await response.json();
-      setStats(data);
+      if (data.errors && Object.keys(data.errors).length > 0) {
+        console.error('Dashboard sections failed:', data.errors);
+      }
+      if (data.today) setTodayCheckins(data.today);
+      if (data.range) setCheckinData(data.range);
+      if (data.stats) setStats(data.stats);
     } catch (error) {
-      console.error('Error fetching stats:', error);
+      console.error('Error fetching dashboard:', error);
     }
   };
 
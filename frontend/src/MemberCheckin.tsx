@@ -71,6 +71,51 @@ function MemberCheckin() {
     }
   };
 
+  // Returning members: one request resolves the family, adds new names and checks everyone in
+  const kioskCheckIn = async (allNames: string[]) => {
+    const names = allNames.map(name => name.trim());
+    try {
+      const API_URL = getApiUrl();
+      const res = await fetch(`${API_URL}/kiosk/checkin`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ names }),
+      });
+      if (res.status === 404) {
+        setStatus("register");
+        setFormName("");
+        setFamilyNames([]);
+        setMessage("No existing members found with these names. Please register instead.");
+        return;
+      }
+      const data = await res.json();
+      if (!res.ok) {
+        setStatus("error");
+        setMessage(data.detail || "Check-in failed.");
+        return;
+      }
+      const familyMemberNames = data.members.map((m: any) => m.name);
+      // Remember the first entered member who was already registered
+      const known = data.members.filter((m: any) => !data.added.includes(m.name));
+      const firstMember = known.find((m: any) => m.name.toLowerCase() === names[0].toLowerCase()) || known[0] || data.members[0];
+      localStorage.setItem("family_members", JSON.stringify(familyMemberNames));
+      localStorage.setItem("member_email", data.email);
+      localStorage.setItem("member_id", firstMember.id);
+      setMemberEmail(data.email);
+      setFamilyMembers(familyMemberNames);
+      setNotCheckedInMembers(data.not_checked_in || []);
+      setStatus("success");
+      if (familyMemberNames.length > 1) {
+        setMessage("All family members have checked in for this period!");
+      } else {
+        setMessage("Check-in successful! Welcome back.");
+      }
+    } catch {
+      setStatus("error");
+      setMessage("Network error. Please try again.");
+    }
+  };
+
   // On load, if family, fetch check-in status
   useEffect(() => {
     const savedEmail = localStorage.getItem("member_email");
@@ -361,157 +406,7 @@ function MemberCheckin() {
                   }
                   setStatus("loading");
                   setMessage("");
-                  const API_URL = getApiUrl();
-                  
-                  try {
-                    // STEP 1: Check which names exist and which don't
-                    const existingMembers = [];
-                    const newMembers = [];
-                    let familyEmail = null;
-                    
-                    console.log("🔍 STEP 1: Checking each name...");
-                    for (const name of allNames) {
-                      console.log(`🔍 Checking name: "${name.trim()}"`);
-                      try {
-                    const lookupRes = await fetch(`${API_URL}/member/lookup-by-name`, {
-                      method: "POST",
-                      headers: { "Content-Type": "application/json" },
-                          body: JSON.stringify({ name: name.trim() }),
-                        });
-                        if (lookupRes.ok) {
-                          const memberData = await lookupRes.json();
-                          console.log(`✅ Found existing member:`, memberData);
-                          existingMembers.push({
-                            name: name.trim(),
-                            email: memberData.email,
-                            id: memberData.id
-                          });
-                          // Use the first found member's email as the family email
-                          if (!familyEmail) {
-                            familyEmail = memberData.email;
-                            console.log(`📧 Set family email to: ${familyEmail}`);
-                          }
-                        } else {
-                          console.log(`❌ Name not found: "${name.trim()}" - adding to new members`);
-                          newMembers.push(name.trim());
-                        }
-                      } catch (error) {
-                        console.log(`❌ Error looking up "${name.trim()}":`, error);
-                        newMembers.push(name.trim());
-                      }
-                    }
-                    
-                    console.log("🔍 STEP 1 RESULTS:");
-                    console.log("- Existing members:", existingMembers);
-                    console.log("- New members:", newMembers);
-                    console.log("- Family email:", familyEmail);
-                    
-                    // If no existing members found, show error
-                    if (existingMembers.length === 0) {
-                      console.log("❌ No existing members found, redirecting to register");
-                      setStatus("register");
-                      setFormName("");
-                      setFamilyNames([]);
-                      setMessage("No existing members found with these names. Please register instead.");
-                      return;
-                    }
-                    
-                    // STEP 2: Add new members to the existing family (if any)
-                    if (newMembers.length > 0 && familyEmail) {
-                      console.log("🔍 STEP 2: Adding new members to family...");
-                      console.log(`📝 Adding ${newMembers.length} new members to email: ${familyEmail}`);
-                      try {
-                        const addRes = await fetch(`${API_URL}/family/add-members`, {
-                          method: "POST",
-                          headers: { "Content-Type": "application/json" },
-                          body: JSON.stringify({
-                            email: familyEmail,
-                            new_members: newMembers,
-                          }),
-                        });
-                        if (addRes.ok) {
-                          const addResult = await addRes.json();
-                          console.log("✅ Successfully added new members:", addResult);
-                        } else {
-                          const err = await addRes.json();
-                          console.error("❌ Failed to add new members:", err.detail);
-                        }
-                      } catch (error) {
-                        console.error("❌ Error adding new members:", error);
-                      }
-                    } else {
-                      console.log("🔍 STEP 2: Skipped - no new members to add");
-                    }
-                    
-                    // STEP 3: Get updated family info and set up localStorage
-                    console.log("🔍 STEP 3: Getting updated family info...");
-                    try {
-                      const familyRes = await fetch(`${API_URL}/family/members/${encodeURIComponent(familyEmail)}`);
-                      if (familyRes.ok) {
-                        const familyData = await familyRes.json();
-                        const familyMemberNames = familyData.map((m: any) => m.name);
-                        console.log("✅ Updated family members:", familyMemberNames);
-                        
-                        // Set up localStorage
-                          localStorage.setItem("family_members", JSON.stringify(familyMemberNames));
-                        localStorage.setItem("member_email", familyEmail);
-                        localStorage.setItem("member_id", existingMembers[0].id);
-                        setMemberEmail(familyEmail);
-                          setFamilyMembers(familyMemberNames);
-                        console.log("✅ localStorage updated");
-                        
-                        // STEP 4: Check in all entered members using family check-in
-                        // Only check in members that actually exist in the family now
-                        const membersToCheckIn = allNames.filter(name => 
-                           familyMemberNames.some((familyName: string) => 
-                             familyName.toLowerCase().trim() === name.toLowerCase().trim()
-                           )
-                         );
-                        
-                        console.log("🔍 STEP 4: Checking in members...");
-                        console.log("- All entered names:", allNames);
-                        console.log("- Family member names:", familyMemberNames);
-                        console.log("- Members to check in:", membersToCheckIn);
-                        
-                        const familyCheckinRes = await fetch(`${API_URL}/family/checkin`, {
-                      method: "POST",
-                      headers: { "Content-Type": "application/json" },
-                          body: JSON.stringify({
-                            email: familyEmail,
-                            member_names: membersToCheckIn,
-                          }),
-                    });
-                    
-                        if (familyCheckinRes.ok) {
-                          const checkinResult = await familyCheckinRes.json();
-                          console.log("✅ Check-in successful:", checkinResult);
-                      setStatus("success");
-                          if (familyMemberNames.length > 1) {
-                            setMessage("All family members have checked in for this period!");
-                          } else {
-                            setMessage("Check-in successful! Welcome back.");
-                          }
-                        } else {
-                          const err = await familyCheckinRes.json();
-                          console.error("❌ Check-in failed:", err);
-                          setStatus("error");
-                          setMessage(err.detail || "Check-in failed.");
-                        }
-                    } else {
-                        console.error("❌ Failed to load family information");
-                        setStatus("error");
-                        setMessage("Failed to load family information.");
-                      }
-                    } catch (error) {
-                      console.error("❌ Network error loading family information:", error);
-                      setStatus("error");
-                      setMessage("Network error loading family information.");
-                    }
-                  } catch (error) {
-                    console.error("❌ General network error:", error);
-                    setStatus("error");
-                    setMessage("Network error. Please try again.");
-                  }
+                  await kioskCheckIn(allNames);
                 }}
               >
                 <div className="glass-card space-y-6 p-6">
@@ -596,157 +491,7 @@ function MemberCheckin() {
                   }
                   setStatus("loading");
                   setMessage("");
-                  const API_URL = getApiUrl();
-                  
-                  try {
-                    // STEP 1: Check which names exist and which don't
-                    const existingMembers = [];
-                    const newMembers = [];
-                    let familyEmail = null;
-                    
-                    console.log("🔍 STEP 1: Checking each name...");
-                    for (const name of allNames) {
-                      console.log(`🔍 Checking name: "${name.trim()}"`);
-                      try {
-                      const lookupRes = await fetch(`${API_URL}/member/lookup-by-name`, {
-                        method: "POST",
-                        headers: { "Content-Type": "application/json" },
-                          body: JSON.stringify({ name: name.trim() }),
-                      });
-                        if (lookupRes.ok) {
-                          const memberData = await lookupRes.json();
-                          console.log(`✅ Found existing member:`, memberData);
-                          existingMembers.push({
-                            name: name.trim(),
-                            email: memberData.email,
-                            id: memberData.id
-                          });
-                          // Use the first found member's email as the family email
-                          if (!familyEmail) {
-                            familyEmail = memberData.email;
-                            console.log(`📧 Set family email to: ${familyEmail}`);
-                      }
-                        } else {
-                          console.log(`❌ Name not found: "${name.trim()}" - adding to new members`);
-                          newMembers.push(name.trim());
-                        }
-                      } catch (error) {
-                        console.log(`❌ Error looking up "${name.trim()}":`, error);
-                        newMembers.push(name.trim());
-                      }
-                    }
-                    
-                    console.log("🔍 STEP 1 RESULTS:");
-                    console.log("- Existing members:", existingMembers);
-                    console.log("- New members:", newMembers);
-                    console.log("- Family email:", familyEmail);
-                    
-                    // If no existing members found, show error
-                    if (existingMembers.length === 0) {
-                      console.log("❌ No existing members found, redirecting to register");
-                      setStatus("register");
-                      setFormName("");
-                      setFamilyNames([]);
-                      setMessage("No existing members found with these names. Please register instead.");
-                      return;
-                    }
-                    
-                    // STEP 2: Add new members to the existing family (if any)
-                    if (newMembers.length > 0 && familyEmail) {
-                      console.log("🔍 STEP 2: Adding new members to family...");
-                      console.log(`📝 Adding ${newMembers.length} new members to email: ${familyEmail}`);
-                      try {
-                        const addRes = await fetch(`${API_URL}/family/add-members`, {
-                        method: "POST",
-                        headers: { "Content-Type": "application/json" },
-                          body: JSON.stringify({
-                            email: familyEmail,
-                            new_members: newMembers,
-                          }),
-                      });
-                        if (addRes.ok) {
-                          const addResult = await addRes.json();
-                          console.log("✅ Successfully added new members:", addResult);
-                        } else {
-                          const err = await addRes.json();
-                          console.error("❌ Failed to add new members:", err.detail);
-                      }
-                      } catch (error) {
-                        console.error("❌ Error adding new members:", error);
-                    }
-                    } else {
-                      console.log("🔍 STEP 2: Skipped - no new members to add");
-                    }
-                    
-                    // STEP 3: Get updated family info and set up localStorage
-                    console.log("🔍 STEP 3: Getting updated family info...");
-                    try {
-                      const familyRes = await fetch(`${API_URL}/family/members/${encodeURIComponent(familyEmail)}`);
-                      if (familyRes.ok) {
-                        const familyData = await familyRes.json();
-                        const familyMemberNames = familyData.map((m: any) => m.name);
-                        console.log("✅ Updated family members:", familyMemberNames);
-                        
-                        // Set up localStorage
-                        localStorage.setItem("family_members", JSON.stringify(familyMemberNames));
-                        localStorage.setItem("member_email", familyEmail);
-                        localStorage.setItem("member_id", existingMembers[0].id);
-                        setMemberEmail(familyEmail);
-                        setFamilyMembers(familyMemberNames);
-                        console.log("✅ localStorage updated");
-                        
-                        // STEP 4: Check in all entered members using family check-in
-                        // Only check in members that actually exist in the family now
-                        const membersToCheckIn = allNames.filter(name => 
-                           familyMemberNames.some((familyName: string) => 
-                             familyName.toLowerCase().trim() === name.toLowerCase().trim()
-                           )
-                         );
-                        
-                        console.log("🔍 STEP 4: Checking in members...");
-                        console.log("- All entered names:", allNames);
-                        console.log("- Family member names:", familyMemberNames);
-                        console.log("- Members to check in:", membersToCheckIn);
-                        
-                        const familyCheckinRes = await fetch(`${API_URL}/family/checkin`, {
-                          method: "POST",
-                          headers: { "Content-Type": "application/json" },
-                          body: JSON.stringify({
-                            email: familyEmail,
-                            member_names: membersToCheckIn,
-                          }),
-                        });
-                        
-                        if (familyCheckinRes.ok) {
-                          const checkinResult = await familyCheckinRes.json();
-                          console.log("✅ Check-in successful:", checkinResult);
-                          setStatus("success");
-                          if (familyMemberNames.length > 1) {
-                            setMessage("All family members have checked in for this period!");
-                          } else {
-                            setMessage("Check-in successful! Welcome back.");
-                          }
-                        } else {
-                          const err = await familyCheckinRes.json();
-                          console.error("❌ Check-in failed:", err);
-                          setStatus("error");
-                          setMessage(err.detail || "Check-in failed.");
-                    }
-                      } else {
-                        console.error("❌ Failed to load family information");
-                        setStatus("error");
-                        setMessage("Failed to load family information.");
-                  }
-                    } catch (error) {
-                      console.error("❌ Network error loading family information:", error);
-                      setStatus("error");
-                      setMessage("Network error loading family information.");
-                    }
-                  } catch (error) {
-                    console.error("❌ General network error:", error);
-                    setStatus("error");
-                    setMessage("Network error. Please try again.");
-                  }
+                  await kioskCheckIn(allNames);
                 }}
               >
                 <div className="glass-card space-y-6 p-6">